@@ -6,6 +6,11 @@ from ui.transaction_history import TransactionHistory
 from ui.portfolio_view import PortfolioView
 from ui.profit_loss import ProfitLoss
 from ui.charges import Charges
+from ui.trade_import import TradeImport
+from ui.settlement import SettlementView
+from ui.mtm import MarkToMarketView
+from ui.performance import PerformanceView
+from ui.capital_gains import CapitalGainsView
 
 # Initialize database
 db_manager = DatabaseManager()
@@ -60,11 +65,17 @@ page = st.sidebar.radio(
     "Go to",
     [
         "Portfolio Overview",
+        "Performance",
         "Transaction Management",
+        "Trade Import",
         "Transaction History",
+        "All Categories P&L",
         "Equity P&L",
         "F&O Equity P&L",
         "F&O Commodity P&L",
+        "Capital Gains",
+        "F&O MTM",
+        "Expiry Settlement",
         "Charges"
     ]
 )
@@ -78,10 +89,19 @@ if active_account['description']:
 # Render selected page with active account context
 if page == "Portfolio Overview":
     portfolio_view.render(active_account["id"])
+elif page == "Performance":
+    performance_view = PerformanceView(portfolio_manager)
+    performance_view.render(active_account["id"])
 elif page == "Transaction Management":
     transaction_form.render(active_account["id"])
+elif page == "Trade Import":
+    trade_import = TradeImport(db_manager)
+    trade_import.render(active_account["id"])
 elif page == "Transaction History":
     transaction_history.render(active_account["id"])
+elif page == "All Categories P&L":
+    profit_loss = ProfitLoss(db_manager)
+    profit_loss.render_summary(active_account["id"])
 elif page == "Equity P&L":
     profit_loss = ProfitLoss(db_manager)
     profit_loss.render(active_account["id"], "EQUITY")
@@ -91,6 +111,15 @@ elif page == "F&O Equity P&L":
 elif page == "F&O Commodity P&L":
     profit_loss = ProfitLoss(db_manager)
     profit_loss.render(active_account["id"], "F&O COMMODITY")
+elif page == "Capital Gains":
+    capital_gains_view = CapitalGainsView(db_manager)
+    capital_gains_view.render(active_account["id"])
+elif page == "F&O MTM":
+    mtm_view = MarkToMarketView(db_manager)
+    mtm_view.render(active_account["id"])
+elif page == "Expiry Settlement":
+    settlement_view = SettlementView(db_manager)
+    settlement_view.render(active_account["id"])
 elif page == "Charges":
     charges = Charges(db_manager)
     charges.render(active_account["id"])
@@ -0,0 +1,261 @@
+import os
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import BinaryIO, List, Optional, Union
+from .database import DatabaseManager, normalize_symbol
+from .equity_pnl import classify_trades, match_equity_lots
+from .importer import financial_years
+from .prices import EQUITY_SERIES, EOD_SERIES_COLUMNS
+
+# Local file of fair market values on 31-Jan-2018 for grandfathering, read from the working directory
+FMV_FILE = 'fmv_31jan2018.csv'
+
+# FMV file column -> accepted headers (plain names or the NSE bhavcopy of 31-Jan-2018, whose
+# highest price of the day is the FMV)
+FMV_COLUMNS = {
+    'scrip_name': ['scrip_name', 'symbol', 'tckrsymb'],
+    'fmv': ['fmv', 'fmv_31jan2018', 'high', 'hghpric', 'high_price']
+}
+
+# Long-term gains on equity acquired up to this date and sold from 1-Apr-2018 (when section
+# 112A replaced the 10(38) exemption) are grandfathered under section 55(2)(ac)
+GRANDFATHERING_DATE = pd.Timestamp('2018-01-31')
+LTCG_TAXABLE_FROM = pd.Timestamp('2018-04-01')
+
+# Rates by sale date: (in force from, STCG rate u/s 111A, LTCG rate u/s 112A)
+TAX_RATES = [
+    ('2008-04-01', 0.15, 0.0),
+    ('2018-04-01', 0.15, 0.10),
+    ('2024-07-23', 0.20, 0.125)
+]
+
+# Yearly LTCG exemption u/s 112A from the given financial year on. Long-term gains of earlier
+# years were exempt in full under section 10(38).
+LTCG_EXEMPTIONS = [
+    ('2018-2019', 100000.0),
+    ('2024-2025', 125000.0)
+]
+
+SCHEDULE_CG_COLUMNS = [
+    'demat_account_id', 'financial_year', 'stcg_consideration', 'stcg_cost', 'stcg', 'ltcg_consideration',
+    'ltcg_cost', 'ltcg', 'stcl_set_off', 'ltcg_exemption', 'taxable_stcg', 'taxable_ltcg', 'estimated_tax',
+    'stcl_carried_forward', 'ltcl_carried_forward'
+]
+
+SPECULATIVE_COLUMNS = [
+    'demat_account_id', 'financial_year', 'scrip_days', 'buy_value', 'sell_value', 'profit_loss', 'turnover'
+]
+
+SCHEDULE_112A_COLUMNS = [
+    'demat_account_id', 'financial_year', 'scrip_name', 'quantity', 'sale_price', 'consideration',
+    'actual_cost', 'fmv', 'fmv_value', 'cost', 'ltcg'
+]
+
+def read_fmv_file(file: Union[str, BinaryIO]) -> pd.DataFrame:
+    """Read per-share fair market values on 31-Jan-2018; returns scrip_name and fmv"""
+    raw = pd.read_csv(file, dtype=str, skipinitialspace=True)
+    headers = {str(column).strip().lower(): column for column in raw.columns}
+    columns = {}
+    for target, aliases in FMV_COLUMNS.items():
+        source = next((headers[alias] for alias in aliases if alias in headers), None)
+        if source is None:
+            raise ValueError(f"FMV file is missing a '{target}' column (accepted headers: {', '.join(aliases)})")
+        columns[target] = raw[source].str.strip()
+    values = pd.DataFrame(columns)
+
+    series = next((headers[alias] for alias in EOD_SERIES_COLUMNS if alias in headers), None)
+    if series is not None:
+        values = values[raw[series].str.strip().str.upper().isin(EQUITY_SERIES)]
+
+    fmv = pd.to_numeric(values['fmv'].str.replace(',', ''), errors='coerce')
+    invalid = values['scrip_name'].isna() | ~(fmv > 0)
+    if invalid.any():
+        raise ValueError(f"FMV file has a missing symbol or invalid FMV on row(s): "
+                         f"{', '.join(str(row + 2) for row in values.index[invalid][:10])}")
+    return pd.DataFrame({
+        'scrip_name': values['scrip_name'].map(normalize_symbol),
+        'fmv': fmv
+    }).drop_duplicates('scrip_name', keep='last').reset_index(drop=True)
+
+def load_fmv(path: str = FMV_FILE) -> pd.DataFrame:
+    """The local FMV file; a missing file gives no FMVs, so no cost is grandfathered"""
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=['scrip_name', 'fmv'])
+    return read_fmv_file(path)
+
+def ltcg_exemptions(years: pd.Series) -> pd.Series:
+    """LTCG exemption of each financial year; infinite before the first 112A year"""
+    starts = [year for year, _ in LTCG_EXEMPTIONS]
+    amounts = np.array([np.inf] + [amount for _, amount in LTCG_EXEMPTIONS])
+    return pd.Series(amounts[np.searchsorted(starts, years.to_numpy(dtype=str), side='right')], index=years.index)
+
+@dataclass
+class CapitalGainsReport:
+    """Equity capital gains of one or more accounts.
+
+    lots are the matched lots with financial_year, gain_type (STCG/LTCG), consideration,
+    cost (after grandfathering), gain and tax_rate. schedule_cg has one row per account and
+    financial year in the shape of ITR Schedule CG; schedule_112a one row per account, year
+    and scrip of long-term gains in the shape of ITR Schedule 112A. intraday holds the
+    same-day square-offs left out of the lots (see classify_trades) and speculative their
+    yearly totals, which are business income rather than capital gains.
+    """
+    lots: pd.DataFrame
+    schedule_cg: pd.DataFrame
+    schedule_112a: pd.DataFrame
+    intraday: pd.DataFrame
+    speculative: pd.DataFrame
+
+class CapitalGains:
+    """Listed equity capital gains (sections 111A and 112A) by financial year"""
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+
+    def load(self, demat_account_ids: List[int]) -> pd.DataFrame:
+        """Equity transactions of several accounts in one query"""
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            return pd.read_sql_query(
+                '''
+                SELECT t.id, t.demat_account_id, t.instrument_id, t.scrip_name, t.date,
+                       t.transaction_type, t.num_shares, t.amount
+                FROM transactions t
+                WHERE t.demat_account_id IN (SELECT value FROM json_each(?))
+                AND t.transaction_category = 'EQUITY'
+                ''',
+                conn,
+                params=(json.dumps([int(account_id) for account_id in demat_account_ids]),)
+            )
+
+    def sale_years(self) -> List[str]:
+        """Financial years (from the sale dates) with equity sales in any account, latest first"""
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT DISTINCT CAST(substr(date, 1, 4) AS INTEGER) - (CAST(substr(date, 6, 2) AS INTEGER) < 4) AS start_year
+                FROM transactions
+                WHERE transaction_category = 'EQUITY' AND transaction_type IN ('SELL', 'BUYBACK')
+                ORDER BY start_year DESC
+            ''')
+            return [f"{row[0]}-{row[0] + 1}" for row in cursor.fetchall()]
+
+    def report(self, demat_account_ids: List[int], fmv: Optional[pd.DataFrame] = None) -> CapitalGainsReport:
+        """Match every account's lots once and aggregate them into the tax schedules.
+
+        Same-day buys and sells are netted first; only delivery trades are capital gains.
+        fmv defaults to the local FMV file (see load_fmv).
+        """
+        trades = classify_trades(self.load(demat_account_ids))
+        lots = self.tax_lots(match_equity_lots(trades.delivery), load_fmv() if fmv is None else fmv)
+        return CapitalGainsReport(
+            lots, schedule_cg(lots), schedule_112a(lots), trades.intraday, speculative_income(trades.intraday)
+        )
+
+    @staticmethod
+    def tax_lots(matched: pd.DataFrame, fmv: pd.DataFrame) -> pd.DataFrame:
+        """Add financial year, gain type, grandfathered cost, gain and tax rate to matched lots.
+
+        Long-term lots acquired up to 31-Jan-2018 and sold from 1-Apr-2018 are costed at the
+        higher of the actual cost and the lower of the FMV and the sale price.
+        """
+        lots = matched.assign(
+            financial_year=financial_years(pd.to_datetime(matched['sale_date'])),
+            gain_type=np.where(matched['term_type'] == 'LONG TERM', 'LTCG', 'STCG'),
+            fmv=matched['scrip_name'].map(fmv.set_index('scrip_name')['fmv']).astype(float)
+        )
+        grandfathered = ((lots['gain_type'] == 'LTCG') & lots['fmv'].notna()
+                         & (lots['purchase_date'] <= GRANDFATHERING_DATE)
+                         & (lots['sale_date'] >= LTCG_TAXABLE_FROM))
+        unit_cost = np.where(
+            grandfathered,
+            np.maximum(lots['purchase_price'], np.minimum(lots['fmv'], lots['sale_price'])),
+            lots['purchase_price']
+        )
+        lots['fmv'] = lots['fmv'].where(grandfathered)
+        lots['consideration'] = lots['sale_price'] * lots['quantity']
+        lots['actual_cost'] = lots['purchase_price'] * lots['quantity']
+        lots['cost'] = unit_cost * lots['quantity']
+        lots['gain'] = lots['consideration'] - lots['cost']
+
+        rate_dates = pd.to_datetime([start for start, _, _ in TAX_RATES]).to_numpy()
+        period = np.searchsorted(rate_dates, lots['sale_date'].to_numpy(dtype='datetime64[ns]'), side='right') - 1
+        rates = np.array([[stcg, ltcg] for _, stcg, ltcg in TAX_RATES])
+        lots['tax_rate'] = np.where(
+            period < 0, 0.0, rates[np.maximum(period, 0), (lots['gain_type'] == 'LTCG').to_numpy(dtype=int)]
+        )
+        return lots
+
+def schedule_cg(lots: pd.DataFrame) -> pd.DataFrame:
+    """Per account and financial year: gains, set-off, exemption and estimated tax.
+
+    Short-term losses are set off against long-term gains; long-term losses only against
+    long-term gains. The LTCG exemption applies after set-off. Tax is estimated at each
+    section's rates in proportion to the net gains realised while each rate was in force.
+    """
+    if lots.empty:
+        return pd.DataFrame(columns=SCHEDULE_CG_COLUMNS)
+    key = ['demat_account_id', 'financial_year']
+    sections = lots.pivot_table(
+        index=key, columns='gain_type', values=['consideration', 'cost', 'gain'], aggfunc='sum', fill_value=0.0
+    ).reindex(columns=pd.MultiIndex.from_product([['consideration', 'cost', 'gain'], ['STCG', 'LTCG']]), fill_value=0.0)
+    schedule = pd.DataFrame({
+        'stcg_consideration': sections[('consideration', 'STCG')],
+        'stcg_cost': sections[('cost', 'STCG')],
+        'stcg': sections[('gain', 'STCG')],
+        'ltcg_consideration': sections[('consideration', 'LTCG')],
+        'ltcg_cost': sections[('cost', 'LTCG')],
+        'ltcg': sections[('gain', 'LTCG')]
+    })
+    schedule['stcl_set_off'] = np.minimum(np.maximum(-schedule['stcg'], 0), np.maximum(schedule['ltcg'], 0))
+    net_ltcg = schedule['ltcg'] - schedule['stcl_set_off']
+    exemption = ltcg_exemptions(schedule.index.get_level_values('financial_year').to_series(index=schedule.index))
+    schedule['ltcg_exemption'] = np.minimum(np.maximum(net_ltcg, 0), exemption)
+    schedule['taxable_stcg'] = np.maximum(schedule['stcg'], 0)
+    schedule['taxable_ltcg'] = np.maximum(net_ltcg, 0) - schedule['ltcg_exemption']
+    schedule['stcl_carried_forward'] = np.maximum(-schedule['stcg'], 0) - schedule['stcl_set_off']
+    schedule['ltcl_carried_forward'] = np.maximum(-schedule['ltcg'], 0)
+
+    # Effective rate of each section: its rates weighted by the positive net gain per rate
+    by_rate = lots.groupby(key + ['gain_type', 'tax_rate'])['gain'].sum().clip(lower=0).reset_index()
+    by_rate['weighted'] = by_rate['gain'] * by_rate['tax_rate']
+    rate = by_rate.groupby(key + ['gain_type'])[['weighted', 'gain']].sum()
+    rate = (rate['weighted'] / rate['gain'].where(rate['gain'] > 0)).unstack('gain_type')
+    rate = rate.reindex(index=schedule.index, columns=['STCG', 'LTCG']).fillna(0.0)
+    schedule['estimated_tax'] = schedule['taxable_stcg'] * rate['STCG'] + schedule['taxable_ltcg'] * rate['LTCG']
+    return schedule.reset_index()[SCHEDULE_CG_COLUMNS]
+
+def schedule_112a(lots: pd.DataFrame) -> pd.DataFrame:
+    """Long-term gains per account, financial year and scrip, as reported in Schedule 112A"""
+    long_term = lots[lots['gain_type'] == 'LTCG']
+    if long_term.empty:
+        return pd.DataFrame(columns=SCHEDULE_112A_COLUMNS)
+    long_term = long_term.assign(fmv_value=long_term['fmv'] * long_term['quantity'])
+    schedule = long_term.groupby(['demat_account_id', 'financial_year', 'scrip_name']).agg(
+        quantity=('quantity', 'sum'),
+        consideration=('consideration', 'sum'),
+        actual_cost=('actual_cost', 'sum'),
+        fmv=('fmv', 'max'),
+        fmv_value=('fmv_value', 'sum'),
+        cost=('cost', 'sum'),
+        ltcg=('gain', 'sum')
+    ).reset_index()
+    schedule['fmv_value'] = schedule['fmv_value'].where(schedule['fmv'].notna())
+    schedule['sale_price'] = schedule['consideration'] / schedule['quantity']
+    return schedule[SCHEDULE_112A_COLUMNS]
+
+def speculative_income(intraday: pd.DataFrame) -> pd.DataFrame:
+    """Intraday equity trading per account and financial year: values, profit and turnover"""
+    if intraday.empty:
+        return pd.DataFrame(columns=SPECULATIVE_COLUMNS)
+    return intraday.assign(financial_year=financial_years(intraday['date'])).groupby(
+        ['demat_account_id', 'financial_year']
+    ).agg(
+        scrip_days=('quantity', 'size'),
+        buy_value=('buy_value', 'sum'),
+        sell_value=('sell_value', 'sum'),
+        profit_loss=('profit_loss', 'sum'),
+        turnover=('turnover', 'sum')
+    ).reset_index()[SPECULATIVE_COLUMNS]
@@ -0,0 +1,667 @@
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from .database import DatabaseManager
+
+# Charge components in rate-vector order
+CHARGE_TYPES = ['BROKERAGE', 'DP_CHARGES', 'TRANSACTION_CHARGES', 'STT', 'CTT', 'STAMP_CHARGES', 'SEBI', 'IPFT', 'GST']
+
+# Minimum DP charge per equity SELL/BUYBACK (0.04% or ₹20, whichever is higher)
+DP_CHARGES_MINIMUM = 20.0
+
+# Transaction categories as stored on transactions -> category keys used by the charges table
+CHARGE_CATEGORIES = {'EQUITY': 'EQUITY', 'F&O EQUITY': 'F&O_EQUITY', 'F&O COMMODITY': 'F&O_COMMODITY'}
+
+# Transaction types that carry charges; IPO, BONUS, RIGHT and MERGER & ACQUISITION are free
+CHARGED_TRANSACTION_TYPES = ('BUY', 'SELL', 'BUYBACK', 'DEMERGER')
+
+# Instrument types charged at option rates; every other F&O instrument is charged as a future
+OPTION_INSTRUMENT_TYPES = ('CE', 'PE', 'OPT')
+
+# Columns identifying a rate in the charges table, besides its effective dates
+RATE_KEY_COLUMNS = ['charge_type', 'exchange', 'category', 'instrument_type', 'transaction_type']
+
+# Start date given to rates with no known start; they apply to every earlier trade
+EARLIEST_EFFECTIVE_DATE = '1900-01-01'
+
+# Default rates: (charge_type, exchange, category, instrument_type, transaction_type, value)
+DEFAULT_CHARGES = [
+    # Equity NSE charges
+    ('BROKERAGE', 'NSE', 'EQUITY', 'EQUITY', 'BUY', 20.00),  # ₹20 per transaction
+    ('BROKERAGE', 'NSE', 'EQUITY', 'EQUITY', 'SELL', 20.00),  # ₹20 per transaction
+    ('DP_CHARGES', 'NSE', 'EQUITY', 'EQUITY', 'BUY', 0.0004),  # 0.04%
+    ('DP_CHARGES', 'NSE', 'EQUITY', 'EQUITY', 'SELL', 0.0004),  # 0.04%
+    ('TRANSACTION_CHARGES', 'NSE', 'EQUITY', 'EQUITY', 'BUY', 0.0000297),  # 0.00297%
+    ('TRANSACTION_CHARGES', 'NSE', 'EQUITY', 'EQUITY', 'SELL', 0.0000297),  # 0.00297%
+    ('STT', 'NSE', 'EQUITY', 'EQUITY', 'BUY', 0.001),  # 0.1%
+    ('STT', 'NSE', 'EQUITY', 'EQUITY', 'SELL', 0.001),  # 0.1%
+    ('STAMP_CHARGES', 'NSE', 'EQUITY', 'EQUITY', 'BUY', 0.00015),  # 0.015%
+    ('STAMP_CHARGES', 'NSE', 'EQUITY', 'EQUITY', 'SELL', 0.00015),  # 0.015%
+    ('SEBI', 'NSE', 'EQUITY', 'EQUITY', 'BUY', 0.000001),  # 0.0001%
+    ('SEBI', 'NSE', 'EQUITY', 'EQUITY', 'SELL', 0.000001),  # 0.0001%
+    ('IPFT', 'NSE', 'EQUITY', 'EQUITY', 'BUY', 0.000001),  # 0.0001%
+    ('IPFT', 'NSE', 'EQUITY', 'EQUITY', 'SELL', 0.000001),  # 0.0001%
+    ('GST', 'NSE', 'EQUITY', 'EQUITY', 'BUY', 0.18),  # 18%
+    ('GST', 'NSE', 'EQUITY', 'EQUITY', 'SELL', 0.18),  # 18%
+    
+    # Equity BSE charges
+    ('BROKERAGE', 'BSE', 'EQUITY', 'EQUITY', 'BUY', 0.00),  # ₹0 per transaction
+    ('BROKERAGE', 'BSE', 'EQUITY', 'EQUITY', 'SELL', 0.00),  # ₹0 per transaction
+    ('DP_CHARGES', 'BSE', 'EQUITY', 'EQUITY', 'BUY', 0.0004),  # 0.04%
+    ('DP_CHARGES', 'BSE', 'EQUITY', 'EQUITY', 'SELL', 0.0004),  # 0.04%
+    ('TRANSACTION_CHARGES', 'BSE', 'EQUITY', 'EQUITY', 'BUY', 0.0000375),  # 0.00375%
+    ('TRANSACTION_CHARGES', 'BSE', 'EQUITY', 'EQUITY', 'SELL', 0.0000375),  # 0.00375%
+    ('STT', 'BSE', 'EQUITY', 'EQUITY', 'BUY', 0.001),  # 0.1%
+    ('STT', 'BSE', 'EQUITY', 'EQUITY', 'SELL', 0.001),  # 0.1%
+    ('STAMP_CHARGES', 'BSE', 'EQUITY', 'EQUITY', 'BUY', 0.00015),  # 0.015%
+    ('STAMP_CHARGES', 'BSE', 'EQUITY', 'EQUITY', 'SELL', 0.00015),  # 0.015%
+    ('SEBI', 'BSE', 'EQUITY', 'EQUITY', 'BUY', 0.000001),  # 0.0001%
+    ('SEBI', 'BSE', 'EQUITY', 'EQUITY', 'SELL', 0.000001),  # 0.0001%
+    ('IPFT', 'BSE', 'EQUITY', 'EQUITY', 'BUY', 0.0000),  # 0%
+    ('IPFT', 'BSE', 'EQUITY', 'EQUITY', 'SELL', 0.0000),  # 0%
+    ('GST', 'BSE', 'EQUITY', 'EQUITY', 'BUY', 0.18),  # 18%
+    ('GST', 'BSE', 'EQUITY', 'EQUITY', 'SELL', 0.18),  # 18%
+    
+    # F&O Equity NSE charges - Futures
+    ('BROKERAGE', 'NSE', 'F&O_EQUITY', 'FUT', 'BUY', 20.00),  # ₹20 per lot
+    ('BROKERAGE', 'NSE', 'F&O_EQUITY', 'FUT', 'SELL', 20.00),  # ₹20 per lot
+    ('TRANSACTION_CHARGES', 'NSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.0000297),  # 0.00297%
+    ('TRANSACTION_CHARGES', 'NSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.0000297),  # 0.00297%
+    ('STT', 'NSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.001),  # 0.1%
+    ('STT', 'NSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.001),  # 0.1%
+    ('STAMP_CHARGES', 'NSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.00015),  # 0.015%
+    ('STAMP_CHARGES', 'NSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.00015),  # 0.015%
+    ('SEBI', 'NSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.000001),  # 0.0001%
+    ('SEBI', 'NSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.000001),  # 0.0001%
+    ('IPFT', 'NSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.000001),  # 0.0001%
+    ('IPFT', 'NSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.000001),  # 0.0001%
+    ('GST', 'NSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.18),  # 18%
+    ('GST', 'NSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.18),  # 18%
+    
+    # F&O Equity NSE charges - Options
+    ('BROKERAGE', 'NSE', 'F&O_EQUITY', 'OPT', 'BUY', 20.00),  # ₹20 per lot
+    ('BROKERAGE', 'NSE', 'F&O_EQUITY', 'OPT', 'SELL', 20.00),  # ₹20 per lot
+    ('TRANSACTION_CHARGES', 'NSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.0000297),  # 0.00297%
+    ('TRANSACTION_CHARGES', 'NSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.0000297),  # 0.00297%
+    ('STT', 'NSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.001),  # 0.1%
+    ('STT', 'NSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.001),  # 0.1%
+    ('STAMP_CHARGES', 'NSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.00015),  # 0.015%
+    ('STAMP_CHARGES', 'NSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.00015),  # 0.015%
+    ('SEBI', 'NSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.000001),  # 0.0001%
+    ('SEBI', 'NSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.000001),  # 0.0001%
+    ('IPFT', 'NSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.000001),  # 0.0001%
+    ('IPFT', 'NSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.000001),  # 0.0001%
+    ('GST', 'NSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.18),  # 18%
+    ('GST', 'NSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.18),  # 18%
+    
+    # F&O Equity BSE charges - Futures
+    ('BROKERAGE', 'BSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.00),  # ₹0 per lot
+    ('BROKERAGE', 'BSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.00),  # ₹0 per lot
+    ('TRANSACTION_CHARGES', 'BSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.0000375),  # 0.00375%
+    ('TRANSACTION_CHARGES', 'BSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.0000375),  # 0.00375%
+    ('STT', 'BSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.001),  # 0.1%
+    ('STT', 'BSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.001),  # 0.1%
+    ('STAMP_CHARGES', 'BSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.00015),  # 0.015%
+    ('STAMP_CHARGES', 'BSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.00015),  # 0.015%
+    ('SEBI', 'BSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.000001),  # 0.0001%
+    ('SEBI', 'BSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.000001),  # 0.0001%
+    ('IPFT', 'BSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.0000),  # 0%
+    ('IPFT', 'BSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.0000),  # 0%
+    ('GST', 'BSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.18),  # 18%
+    ('GST', 'BSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.18),  # 18%
+    
+    # F&O Equity BSE charges - Options
+    ('BROKERAGE', 'BSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.00),  # ₹0 per lot
+    ('BROKERAGE', 'BSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.00),  # ₹0 per lot
+    ('TRANSACTION_CHARGES', 'BSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.0000375),  # 0.00375%
+    ('TRANSACTION_CHARGES', 'BSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.0000375),  # 0.00375%
+    ('STT', 'BSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.001),  # 0.1%
+    ('STT', 'BSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.001),  # 0.1%
+    ('STAMP_CHARGES', 'BSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.00015),  # 0.015%
+    ('STAMP_CHARGES', 'BSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.00015),  # 0.015%
+    ('SEBI', 'BSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.000001),  # 0.0001%
+    ('SEBI', 'BSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.000001),  # 0.0001%
+    ('IPFT', 'BSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.0000),  # 0%
+    ('IPFT', 'BSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.0000),  # 0%
+    ('GST', 'BSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.18),  # 18%
+    ('GST', 'BSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.18),  # 18%
+    
+    # F&O Commodity MCX charges - Futures
+    ('BROKERAGE', 'MCX', 'F&O_COMMODITY', 'FUT', 'BUY', 20.00),  # ₹20 per lot
+    ('BROKERAGE', 'MCX', 'F&O_COMMODITY', 'FUT', 'SELL', 20.00),  # ₹20 per lot
+    ('TRANSACTION_CHARGES', 'MCX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.0000297),  # 0.00297%
+    ('TRANSACTION_CHARGES', 'MCX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.0000297),  # 0.00297%
+    ('CTT', 'MCX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.001),  # 0.1% (CTT instead of STT)
+    ('CTT', 'MCX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.001),  # 0.1% (CTT instead of STT)
+    ('STAMP_CHARGES', 'MCX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.00015),  # 0.015%
+    ('STAMP_CHARGES', 'MCX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.00015),  # 0.015%
+    ('SEBI', 'MCX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.000001),  # 0.0001%
+    ('SEBI', 'MCX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.000001),  # 0.0001%
+    ('IPFT', 'MCX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.000001),  # 0.0001%
+    ('IPFT', 'MCX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.000001),  # 0.0001%
+    ('GST', 'MCX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.18),  # 18%
+    ('GST', 'MCX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.18),  # 18%
+    
+    # F&O Commodity MCX charges - Options
+    ('BROKERAGE', 'MCX', 'F&O_COMMODITY', 'OPT', 'BUY', 20.00),  # ₹20 per lot
+    ('BROKERAGE', 'MCX', 'F&O_COMMODITY', 'OPT', 'SELL', 20.00),  # ₹20 per lot
+    ('TRANSACTION_CHARGES', 'MCX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.0000297),  # 0.00297%
+    ('TRANSACTION_CHARGES', 'MCX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.0000297),  # 0.00297%
+    ('CTT', 'MCX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.001),  # 0.1% (CTT instead of STT)
+    ('CTT', 'MCX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.001),  # 0.1% (CTT instead of STT)
+    ('STAMP_CHARGES', 'MCX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.00015),  # 0.015%
+    ('STAMP_CHARGES', 'MCX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.00015),  # 0.015%
+    ('SEBI', 'MCX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.000001),  # 0.0001%
+    ('SEBI', 'MCX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.000001),  # 0.0001%
+    ('IPFT', 'MCX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.000001),  # 0.0001%
+    ('IPFT', 'MCX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.000001),  # 0.0001%
+    ('GST', 'MCX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.18),  # 18%
+    ('GST', 'MCX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.18),  # 18%
+    
+    # F&O Commodity NCDEX charges - Futures
+    ('BROKERAGE', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'BUY', 20.00),  # ₹20 per lot
+    ('BROKERAGE', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'SELL', 20.00),  # ₹20 per lot
+    ('TRANSACTION_CHARGES', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.0000297),  # 0.00297%
+    ('TRANSACTION_CHARGES', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.0000297),  # 0.00297%
+    ('CTT', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.001),  # 0.1% (CTT instead of STT)
+    ('CTT', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.001),  # 0.1% (CTT instead of STT)
+    ('STAMP_CHARGES', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.00015),  # 0.015%
+    ('STAMP_CHARGES', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.00015),  # 0.015%
+    ('SEBI', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.000001),  # 0.0001%
+    ('SEBI', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.000001),  # 0.0001%
+    ('IPFT', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.000001),  # 0.0001%
+    ('IPFT', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.000001),  # 0.0001%
+    ('GST', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.18),  # 18%
+    ('GST', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.18),  # 18%
+    
+    # F&O Commodity NCDEX charges - Options
+    ('BROKERAGE', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'BUY', 20.00),  # ₹20 per lot
+    ('BROKERAGE', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'SELL', 20.00),  # ₹20 per lot
+    ('TRANSACTION_CHARGES', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.0000297),  # 0.00297%
+    ('TRANSACTION_CHARGES', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.0000297),  # 0.00297%
+    ('CTT', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.001),  # 0.1% (CTT instead of STT)
+    ('CTT', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.001),  # 0.1% (CTT instead of STT)
+    ('STAMP_CHARGES', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.00015),  # 0.015%
+    ('STAMP_CHARGES', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.00015),  # 0.015%
+    ('SEBI', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.000001),  # 0.0001%
+    ('SEBI', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.000001),  # 0.0001%
+    ('IPFT', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.000001),  # 0.0001%
+    ('IPFT', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.000001),  # 0.0001%
+    ('GST', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.18),  # 18%
+    ('GST', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.18),  # 18%
+]
+
+# Compiled resolvers per database, tagged with the charges data version they were built from
+_resolver_cache: Dict[str, Tuple[int, 'RateResolver']] = {}
+
+_EPOCH = date(1970, 1, 1)
+
+# Segment search keys pack (key id, day) into one integer: key id in the high bits, day in the low 32
+_KEY_STRIDE = 2 ** 32
+_DAY_OFFSET = 2 ** 31
+
+
+def charge_category(transaction_category: Optional[str]) -> Optional[str]:
+    """Map a transaction category ('F&O EQUITY') to its charges-table key ('F&O_EQUITY')"""
+    return CHARGE_CATEGORIES.get(transaction_category, transaction_category)
+
+
+def charge_instrument_type(transaction_category: Optional[str], instrument_type: Optional[str]) -> str:
+    """Map a transaction's instrument type (CE/PE/FUT/None) to its charges-table key (OPT/FUT/EQUITY)"""
+    if charge_category(transaction_category) == 'EQUITY':
+        return 'EQUITY'
+    return 'OPT' if instrument_type in OPTION_INSTRUMENT_TYPES else 'FUT'
+
+
+def day_number(value=None) -> int:
+    """Days since 1970-01-01 for a date, timestamp or ISO date string; None or unparseable means today"""
+    if isinstance(value, datetime):
+        value = value.date()
+    elif isinstance(value, str):
+        try:
+            value = date.fromisoformat(value.strip()[:10])
+        except ValueError:
+            value = None
+    elif not isinstance(value, date):
+        # pandas Timestamp/NaT and anything else
+        value = pd.to_datetime(value, errors='coerce')
+        value = None if pd.isna(value) else value.date()
+    return ((value or date.today()) - _EPOCH).days
+
+
+def day_numbers(values, default: Optional[int] = None) -> np.ndarray:
+    """Vectorized day_number; missing or unparseable values become `default` (today if not given)"""
+    parsed = pd.to_datetime(pd.Series(values, dtype=object), errors='coerce', format='ISO8601')
+    days = parsed.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+    missing = np.isnat(days)
+    days = days.astype(np.int64)
+    days[missing] = day_number() if default is None else default
+    return days
+
+
+class RateResolver:
+    """Precompiled lookup from (category, instrument_type, exchange, transaction_type) and trade date to a rate vector.
+
+    Built once from the charges table. Each key's history is cut into segments at every date on
+    which any of its rates starts or ends, and a lookup bisects the key's segment start dates.
+    Vectors are ordered as CHARGE_TYPES; missing rates are zero. BUYBACK resolves to the SELL rates.
+    """
+
+    def __init__(self, rates: pd.DataFrame):
+        rates = rates.copy()
+        if 'effective_from' not in rates.columns:
+            rates['effective_from'] = None
+        if 'effective_to' not in rates.columns:
+            rates['effective_to'] = None
+        open_end = np.iinfo(np.int64).max
+        rates['start'] = day_numbers(rates['effective_from'], day_number(EARLIEST_EFFECTIVE_DATE))
+        # effective_to is the last day a rate applies; keep an exclusive end day
+        rates['end'] = day_numbers(rates['effective_to'], open_end - 1) + 1
+        rates['value'] = pd.to_numeric(rates['value'], errors='coerce').fillna(0.0)
+        # Later starts overwrite earlier ones below, whatever order the caller's rows come in
+        rates = rates.sort_values('start', kind='stable')
+        positions = {charge_type: position for position, charge_type in enumerate(CHARGE_TYPES)}
+
+        self.keys: List[tuple] = []
+        segment_key_ids, segment_starts, vectors = [], [], []
+        self._segments: Dict[tuple, Tuple[List[int], int]] = {}
+        groups = rates.groupby(['category', 'instrument_type', 'exchange', 'transaction_type'], sort=True)
+        for key_id, (key, group) in enumerate(groups):
+            self.keys.append(key)
+            boundaries = sorted(set(group['start']) | {end for end in group['end'] if end < open_end})
+            self._segments[key] = (boundaries, len(vectors))
+            for boundary in boundaries:
+                vector = np.zeros(len(CHARGE_TYPES))
+                in_force = group[(group['start'] <= boundary) & (group['end'] > boundary)]
+                # On overlapping rows the latest start wins
+                for charge_type, value in zip(in_force['charge_type'], in_force['value']):
+                    if charge_type in positions:
+                        vector[positions[charge_type]] = value
+                segment_key_ids.append(key_id)
+                segment_starts.append(boundary)
+                vectors.append(vector)
+
+        # One extra all-zero row for keys and dates with no configured rates
+        self.matrix = np.vstack(vectors + [np.zeros(len(CHARGE_TYPES))])
+        self._key_ids = {key: key_id for key_id, key in enumerate(self.keys)}
+        self._segment_key_ids = np.array(segment_key_ids, dtype=np.int64)
+        self._segment_index = self._search_keys(self._segment_key_ids, np.array(segment_starts, dtype=np.int64))
+        self._vectors = [tuple(row) for row in self.matrix]
+        self._zero = self._vectors[-1]
+
+    @staticmethod
+    def _search_keys(key_ids: np.ndarray, days: np.ndarray) -> np.ndarray:
+        return key_ids * _KEY_STRIDE + (np.clip(days, -_DAY_OFFSET, _DAY_OFFSET - 1) + _DAY_OFFSET)
+
+    def vector(self, category: str, instrument_type: Optional[str], exchange: str, transaction_type: str,
+               trade_date=None) -> tuple:
+        """Rate vector for one transaction on `trade_date` (today if None); category and
+        instrument_type may be given as stored on transactions"""
+        key = (
+            charge_category(category),
+            charge_instrument_type(category, instrument_type),
+            exchange,
+            'SELL' if transaction_type == 'BUYBACK' else transaction_type
+        )
+        segments = self._segments.get(key)
+        if segments is None:
+            return self._zero
+        starts, first_row = segments
+        position = bisect_right(starts, day_number(trade_date)) - 1
+        return self._vectors[first_row + position] if position >= 0 else self._zero
+
+    def rows_for(self, keys: List[tuple], codes: np.ndarray, days: Optional[np.ndarray] = None) -> np.ndarray:
+        """Row of `matrix` holding the rates for each transaction of a ChargeInputs batch.
+
+        `keys` are the batch's resolver keys, `codes` each row's position in `keys` and `days` each
+        row's trade date as a day number; without days every row is priced at today's rates.
+        """
+        zero_row = len(self.matrix) - 1
+        if days is None:
+            rows = self.rows_for(keys, np.arange(len(keys)), np.full(len(keys), day_number(), dtype=np.int64))
+            return rows[codes]
+        if not len(self._segment_index):
+            return np.full(len(codes), zero_row)
+        key_ids = np.array([self._key_ids.get(key, -1) for key in keys], dtype=np.int64)[codes]
+        positions = np.searchsorted(self._segment_index, self._search_keys(key_ids, days), side='right') - 1
+        found = positions >= 0
+        positions = np.maximum(positions, 0)
+        # A hit must be a segment of the row's own key, not the last segment of the key before it
+        found &= (key_ids >= 0) & (self._segment_key_ids[positions] == key_ids)
+        return np.where(found, positions, zero_row)
+
+
+@dataclass
+class ChargeInputs:
+    """A batch of transactions reduced to what their charges depend on.
+
+    Rows are grouped by their distinct (category, instrument_type, exchange, transaction_type)
+    combination, so rate lookups and string comparisons happen once per combination rather
+    than once per row. A batch can be priced repeatedly under different rate tables.
+    """
+    index: pd.Index
+    amount: np.ndarray
+    # Per row: position in the per-combination arrays below
+    codes: np.ndarray
+    # Per combination: resolver key and the fields the charge rules branch on
+    keys: List[tuple]
+    transaction_types: np.ndarray
+    categories: np.ndarray
+    exchanges: np.ndarray
+    # Per row: trade date as a day number, or None to price everything at today's rates
+    days: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_transactions(cls, transactions: pd.DataFrame) -> 'ChargeInputs':
+        """Build from columns base_amount, transaction_type, exchange, transaction_category, instrument_type
+        and optionally date (the trade date that selects the rates in force)"""
+        columns = ['transaction_category', 'instrument_type', 'exchange', 'transaction_type']
+        combined = np.zeros(len(transactions), dtype=np.int64)
+        uniques = []
+        for column in columns:
+            column_codes, column_uniques = pd.factorize(transactions[column], use_na_sentinel=False)
+            combined = combined * len(column_uniques) + column_codes
+            uniques.append(np.asarray(column_uniques, dtype=object))
+        combinations, codes = np.unique(combined, return_inverse=True)
+
+        # Decode each distinct combination back into its column values
+        values = []
+        for column_uniques in reversed(uniques):
+            values.append(column_uniques[combinations % len(column_uniques)])
+            combinations = combinations // len(column_uniques)
+        transaction_types, exchanges, instrument_types, categories = values
+
+        keys = [
+            (charge_category(category), charge_instrument_type(category, instrument_type), exchange,
+             'SELL' if transaction_type == 'BUYBACK' else transaction_type)
+            for category, instrument_type, exchange, transaction_type
+            in zip(categories, instrument_types, exchanges, transaction_types)
+        ]
+        return cls(
+            index=transactions.index,
+            amount=transactions['base_amount'].to_numpy(dtype=float),
+            codes=codes.reshape(-1),
+            keys=keys,
+            transaction_types=transaction_types,
+            categories=np.array([key[0] for key in keys], dtype=object),
+            exchanges=exchanges,
+            days=day_numbers(transactions['date']) if 'date' in transactions.columns else None
+        )
+
+
+class ChargesEngine:
+    """Charge calculation on top of the charges table, without any UI dependencies"""
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+        self._resolver: Optional[RateResolver] = None
+        self.ensure_charges_table()
+
+    def _create_charges_table(self, cursor: sqlite3.Cursor, name: str = 'charges'):
+        # One row per rate and effective period; effective_to is the last day it applies (NULL: open-ended)
+        cursor.execute(f'''
+            CREATE TABLE {name} (
+                charge_type TEXT,
+                exchange TEXT,
+                category TEXT,
+                instrument_type TEXT,
+                transaction_type TEXT,
+                value REAL,
+                last_updated TIMESTAMP,
+                effective_from DATE NOT NULL DEFAULT '{EARLIEST_EFFECTIVE_DATE}',
+                effective_to DATE,
+                PRIMARY KEY (charge_type, exchange, category, instrument_type, transaction_type, effective_from)
+            )
+        ''')
+
+    def ensure_charges_table(self):
+        """Ensure the charges table exists with correct schema and default values"""
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            cursor = conn.cursor()
+            
+            # Check if table exists
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='charges'")
+            table_exists = cursor.fetchone() is not None
+            
+            if not table_exists:
+                # Create new charges table with exchange and category columns
+                self._create_charges_table(cursor)
+                
+                cursor.executemany('''
+                    INSERT INTO charges (charge_type, exchange, category, instrument_type, transaction_type, value, last_updated)
+                    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ''', DEFAULT_CHARGES)
+                self.db_manager.bump_data_version(cursor, 'charges')
+                
+                conn.commit()
+            else:
+                # Check if new columns exist
+                cursor.execute("PRAGMA table_info(charges)")
+                table_info = cursor.fetchall()
+                columns = {row[1] for row in table_info}
+                primary_key = {row[1] for row in table_info if row[5]}
+                
+                # Already on the current schema; nothing to migrate
+                if primary_key == set(RATE_KEY_COLUMNS) | {'effective_from'}:
+                    return
+                
+                # Add missing columns if needed
+                if 'instrument_type' not in columns:
+                    cursor.execute('ALTER TABLE charges ADD COLUMN instrument_type TEXT DEFAULT "EQUITY"')
+                if 'transaction_type' not in columns:
+                    cursor.execute('ALTER TABLE charges ADD COLUMN transaction_type TEXT DEFAULT "BUY"')
+                
+                # Update existing records to have default values
+                cursor.execute('''
+                    UPDATE charges 
+                    SET instrument_type = "EQUITY", transaction_type = "BUY"
+                    WHERE instrument_type IS NULL OR transaction_type IS NULL
+                ''')
+                
+                # Create a temporary table with the new schema
+                self._create_charges_table(cursor, 'charges_new')
+                
+                # Copy data to new table; existing rates apply to all dates
+                cursor.execute('''
+                    INSERT INTO charges_new (charge_type, exchange, category, instrument_type, transaction_type, value, last_updated)
+                    SELECT charge_type, exchange, category, instrument_type, transaction_type, value, last_updated
+                    FROM charges
+                ''')
+                
+                # Drop old table and rename new one
+                cursor.execute('DROP TABLE charges')
+                cursor.execute('ALTER TABLE charges_new RENAME TO charges')
+                self.db_manager.bump_data_version(cursor, 'charges')
+                
+                conn.commit()
+
+    def rate_table(self) -> pd.DataFrame:
+        """The whole charges table: the rate key columns, value, effective_from and effective_to"""
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            return pd.read_sql_query(
+                f"SELECT {', '.join(RATE_KEY_COLUMNS)}, value, effective_from, effective_to FROM charges "
+                "ORDER BY category, exchange, instrument_type, charge_type, transaction_type, effective_from",
+                conn
+            )
+
+    def set_rates(self, rates: List[tuple], effective_from: date) -> int:
+        """Save a sheet of rates that apply from `effective_from` onwards, in one database transaction.
+
+        `rates` holds (charge_type, exchange, category, instrument_type, transaction_type, value) rows.
+        Only rates that differ from the value in force on that date (zero where none is) are written:
+        their period in force on the date is closed the day before, their later periods are
+        superseded and the new value is upserted. Other keys are left as they are, including their
+        past history and any periods scheduled after the date. The charges data version is bumped
+        once. Returns the number of rates written.
+        """
+        start = effective_from.isoformat()
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            cursor = conn.cursor()
+            
+            # Value in force on the date, per key (the latest start wins, as in RateResolver)
+            cursor.execute(f'''
+                SELECT {', '.join(RATE_KEY_COLUMNS)}, value
+                FROM charges
+                WHERE effective_from <= ? AND (effective_to IS NULL OR effective_to >= ?)
+                ORDER BY effective_from
+            ''', (start, start))
+            in_force: Dict[tuple, float] = {row[:5]: row[5] for row in cursor.fetchall()}
+            
+            changed = [tuple(rate) for rate in rates if rate[5] != in_force.get(tuple(rate[:5]), 0.0)]
+            if not changed:
+                return 0
+            
+            keys = json.dumps([list(rate[:5]) for rate in changed])
+            in_keys = f'''({', '.join(RATE_KEY_COLUMNS)}) IN (
+                SELECT {', '.join(f"json_extract(value, '$[{position}]')" for position in range(len(RATE_KEY_COLUMNS)))}
+                FROM json_each(?)
+            )'''
+            cursor.execute(f'DELETE FROM charges WHERE {in_keys} AND effective_from > ?', (keys, start))
+            cursor.execute(f'''
+                UPDATE charges SET effective_to = ?, last_updated = CURRENT_TIMESTAMP
+                WHERE {in_keys} AND effective_from < ? AND (effective_to IS NULL OR effective_to >= ?)
+            ''', ((effective_from - timedelta(days=1)).isoformat(), keys, start, start))
+            cursor.executemany(f'''
+                INSERT INTO charges ({', '.join(RATE_KEY_COLUMNS)}, value, last_updated, effective_from, effective_to)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?, NULL)
+                ON CONFLICT ({', '.join(RATE_KEY_COLUMNS)}, effective_from) DO UPDATE SET
+                    value = excluded.value, effective_to = NULL, last_updated = excluded.last_updated
+            ''', [rate + (start,) for rate in changed])
+            self.db_manager.bump_data_version(cursor, 'charges')
+            conn.commit()
+        return len(changed)
+
+    @property
+    def resolver(self) -> RateResolver:
+        """Rate resolver for the current charges table, compiled once per charges data version"""
+        if self._resolver is None:
+            version = self.db_manager.get_data_version('charges')
+            cached = _resolver_cache.get(self.db_manager.db_name)
+            if cached is None or cached[0] != version:
+                cached = (version, RateResolver(self.rate_table()))
+                _resolver_cache[self.db_manager.db_name] = cached
+            self._resolver = cached[1]
+        return self._resolver
+
+    def calculate_charges(self, transaction_amount: float, transaction_type: str, exchange: str = 'NSE',
+                          category: str = 'EQUITY', instrument_type: Optional[str] = None,
+                          trade_date=None) -> Tuple[Dict[str, float], float]:
+        """
+        Calculate all applicable charges for a transaction amount based on transaction type, exchange, and category
+        
+        Args:
+            transaction_amount: The gross value of the transaction (price * quantity)
+            transaction_type: Type of transaction (BUY, SELL, IPO, BONUS, RIGHT, BUYBACK, DEMERGER, MERGER)
+            exchange: Exchange where transaction was made (NSE, BSE, MCX, NCDEX)
+            category: Transaction category (EQUITY, F&O EQUITY, F&O COMMODITY; underscore forms also accepted)
+            instrument_type: Instrument type as stored on the transaction (CE, PE, FUT or None for equity)
+            trade_date: Trade date selecting the rates in force (today if None)
+            
+        Returns:
+            Tuple containing:
+            - Dictionary of charges with their amounts
+            - Total charges
+        """
+        charges = dict.fromkeys(CHARGE_TYPES, 0.0)
+        
+        if transaction_type not in CHARGED_TRANSACTION_TYPES:
+            return charges, 0.0
+        
+        brokerage, dp, transaction, stt, ctt, stamp, sebi, ipft, gst = self.resolver.vector(
+            category, instrument_type, exchange, transaction_type, trade_date
+        )
+        is_sell = transaction_type in ('SELL', 'BUYBACK')
+        category = charge_category(category)
+        
+        charges['BROKERAGE'] = brokerage
+        
+        # DP charges (equity only): none on BUY, flat rate on DEMERGER, with a minimum on SELL/BUYBACK
+        if category == 'EQUITY':
+            dp_charge = transaction_amount * dp
+            if transaction_type == 'DEMERGER':
+                charges['DP_CHARGES'] = dp_charge
+            elif is_sell and dp_charge > 0:
+                charges['DP_CHARGES'] = max(dp_charge, DP_CHARGES_MINIMUM)
+        
+        charges['TRANSACTION_CHARGES'] = transaction_amount * transaction
+        
+        # CTT replaces STT for commodities
+        if category == 'F&O_COMMODITY':
+            charges['CTT'] = transaction_amount * ctt
+        else:
+            charges['STT'] = transaction_amount * stt
+        
+        # Stamp duty is only levied on the buyer
+        if not is_sell:
+            charges['STAMP_CHARGES'] = transaction_amount * stamp
+        
+        charges['SEBI'] = transaction_amount * sebi
+        
+        # IPFT (only for NSE)
+        if exchange == 'NSE':
+            charges['IPFT'] = transaction_amount * ipft
+        
+        # GST on brokerage, transaction charges and SEBI fees
+        charges['GST'] = (charges['BROKERAGE'] + charges['TRANSACTION_CHARGES'] + charges['SEBI']) * gst
+        
+        return charges, sum(charges.values())
+
+    def calculate_charges_bulk(self, transactions: pd.DataFrame, resolver: Optional[RateResolver] = None) -> pd.DataFrame:
+        """
+        Vectorized version of calculate_charges for many transactions at once
+        
+        Args:
+            transactions: DataFrame with columns base_amount, transaction_type, exchange,
+                transaction_category and instrument_type, as stored on transactions, and optionally
+                date to price each row at the rates in force on its trade date
+            resolver: Rates to apply instead of the charges table (e.g. a what-if schedule)
+            
+        Returns:
+            DataFrame aligned with the input index with one column per charge type plus TOTAL
+        """
+        return self.compute_charges(ChargeInputs.from_transactions(transactions), resolver)
+
+    def compute_charges(self, inputs: ChargeInputs, resolver: Optional[RateResolver] = None) -> pd.DataFrame:
+        """Charges for a prepared batch; see calculate_charges_bulk"""
+        resolver = resolver or self.resolver
+        codes = inputs.codes
+        amount = inputs.amount
+        rate = dict(zip(CHARGE_TYPES, resolver.matrix[resolver.rows_for(inputs.keys, codes, inputs.days)].T))
+        
+        # Evaluate the rule conditions once per combination, then broadcast to the rows
+        is_buy = (inputs.transaction_types == 'BUY')[codes]
+        is_demerger = (inputs.transaction_types == 'DEMERGER')[codes]
+        is_sell = np.isin(inputs.transaction_types, ['SELL', 'BUYBACK'])[codes]
+        is_charged = is_buy | is_demerger | is_sell
+        is_equity = (inputs.categories == 'EQUITY')[codes]
+        is_commodity = (inputs.categories == 'F&O_COMMODITY')[codes]
+        is_nse = (inputs.exchanges == 'NSE')[codes]
+        
+        charges = pd.DataFrame(index=inputs.index)
+        charges['BROKERAGE'] = np.where(is_charged, rate['BROKERAGE'], 0.0)
+        
+        # DP charges: none on BUY, flat rate on DEMERGER, 0.04% or ₹20 minimum on SELL/BUYBACK (equity only)
+        dp_charge = amount * rate['DP_CHARGES']
+        dp_charge_sell = np.where(dp_charge > 0, np.maximum(dp_charge, DP_CHARGES_MINIMUM), 0.0)
+        charges['DP_CHARGES'] = np.select(
+            [is_equity & is_demerger, is_equity & is_sell],
+            [dp_charge, dp_charge_sell],
+            0.0
+        )
+        
+        charges['TRANSACTION_CHARGES'] = np.where(is_charged, amount * rate['TRANSACTION_CHARGES'], 0.0)
+        charges['STT'] = np.where(is_charged & ~is_commodity, amount * rate['STT'], 0.0)
+        charges['CTT'] = np.where(is_charged & is_commodity, amount * rate['CTT'], 0.0)
+        charges['STAMP_CHARGES'] = np.where(is_buy | is_demerger, amount * rate['STAMP_CHARGES'], 0.0)
+        charges['SEBI'] = np.where(is_charged, amount * rate['SEBI'], 0.0)
+        charges['IPFT'] = np.where(is_charged & is_nse, amount * rate['IPFT'], 0.0)
+        charges['GST'] = (charges['BROKERAGE'] + charges['TRANSACTION_CHARGES'] + charges['SEBI']) * rate['GST']
+        
+        charges['TOTAL'] = charges[CHARGE_TYPES].sum(axis=1)
+        
+        return charges
@@ -1,12 +1,35 @@
+import json
 import sqlite3
+import pandas as pd
 from dataclasses import dataclass
 from datetime import datetime
 from typing import List, Optional
 
+# Trigger statement marking the scrip of a transaction row (NEW or OLD) stale in realized_pnl
+REALIZED_PNL_STALE_UPSERT = '''
+    INSERT INTO realized_pnl_stale (demat_account_id, transaction_category, instrument_id, from_date)
+    SELECT {row}.demat_account_id, {row}.transaction_category, IFNULL({row}.instrument_id, -1), substr({row}.date, 1, 10)
+    WHERE {row}.demat_account_id IS NOT NULL AND {row}.transaction_category IS NOT NULL AND {row}.date IS NOT NULL
+    ON CONFLICT(demat_account_id, transaction_category, instrument_id)
+    DO UPDATE SET from_date = MIN(from_date, excluded.from_date), version = version + 1;
+'''
+
+# Level of the one-time backfills init_db has applied to a database, stored in data_versions
+# under 'schema'. Each backfill is numbered and runs only on databases below its number, so
+# the app's reruns skip the full-table scans once a database is migrated.
+SCHEMA_INSTRUMENTS = 1
+SCHEMA_SERIAL_COUNTERS = 2
+SCHEMA_CHARGE_BREAKDOWNS = 3
+SCHEMA_VERSION = SCHEMA_CHARGE_BREAKDOWNS
+
+def normalize_symbol(symbol: str) -> str:
+    """Canonical form of a scrip symbol: upper case with single inner spaces"""
+    return ' '.join(str(symbol).upper().split())
+
 @dataclass
 class Transaction:
     financial_year: str
-    serial_number: int
+    serial_number: Optional[int]  # None to allocate the next serial on insert
     scrip_name: str
     date: datetime
     num_shares: int
@@ -42,6 +65,7 @@ class DatabaseManager:
             # Create transactions table
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS transactions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
                     financial_year TEXT,
                     serial_number INTEGER,
                     scrip_name TEXT,
@@ -57,9 +81,130 @@ class DatabaseManager:
                     strike_price REAL,
                     old_scrip_name TEXT,
                     exchange TEXT DEFAULT 'NSE',
+                    fingerprint TEXT,
+                    instrument_id INTEGER,
+                    old_instrument_id INTEGER,
+                    FOREIGN KEY (demat_account_id) REFERENCES demat_accounts(id),
+                    FOREIGN KEY (instrument_id) REFERENCES instruments(id),
+                    FOREIGN KEY (old_instrument_id) REFERENCES instruments(id)
+                )
+            """)
+            
+            # Create instruments table (one row per symbol and segment, referenced by transactions)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS instruments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    symbol TEXT NOT NULL,
+                    exchange TEXT,
+                    segment TEXT NOT NULL,
+                    lot_size INTEGER,
+                    isin TEXT,
+                    UNIQUE (symbol, segment)
+                )
+            """)
+            
+            # Create data_versions table (bumped on every write so caches know when to refresh)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS data_versions (
+                    name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            
+            # Create charge_breakdowns table (charges computed for each transaction when it was written)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS charge_breakdowns (
+                    transaction_id INTEGER PRIMARY KEY,
+                    brokerage REAL NOT NULL DEFAULT 0,
+                    dp_charges REAL NOT NULL DEFAULT 0,
+                    transaction_charges REAL NOT NULL DEFAULT 0,
+                    stt REAL NOT NULL DEFAULT 0,
+                    ctt REAL NOT NULL DEFAULT 0,
+                    stamp_charges REAL NOT NULL DEFAULT 0,
+                    sebi REAL NOT NULL DEFAULT 0,
+                    ipft REAL NOT NULL DEFAULT 0,
+                    gst REAL NOT NULL DEFAULT 0,
+                    total_charges REAL NOT NULL DEFAULT 0,
+                    FOREIGN KEY (transaction_id) REFERENCES transactions(id)
+                )
+            """)
+            
+            # Create settlement_prices table (daily futures settlement price per contract, from exchange bhavcopies)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS settlement_prices (
+                    instrument_id INTEGER NOT NULL,
+                    expiry_date DATE NOT NULL,
+                    date DATE NOT NULL,
+                    settlement_price REAL NOT NULL,
+                    PRIMARY KEY (instrument_id, expiry_date, date),
+                    FOREIGN KEY (instrument_id) REFERENCES instruments(id)
+                )
+            """)
+            
+            # Create prices table (end-of-day closing price per instrument and date). Stored
+            # WITHOUT ROWID, so the (instrument_id, date) key is a covering index holding the close:
+            # an instrument's latest closes are read with one index seek and no table lookup.
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS prices (
+                    instrument_id INTEGER NOT NULL,
+                    date DATE NOT NULL,
+                    close REAL NOT NULL,
+                    PRIMARY KEY (instrument_id, date),
+                    FOREIGN KEY (instrument_id) REFERENCES instruments(id)
+                ) WITHOUT ROWID
+            """)
+            
+            # Create realized_pnl table (matched lot pairs per account and scrip, maintained by
+            # models.realized_pnl.RealizedPnL). instrument_id is -1 for trades without an instrument.
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS realized_pnl (
+                    demat_account_id INTEGER NOT NULL,
+                    transaction_category TEXT NOT NULL,
+                    instrument_id INTEGER NOT NULL,
+                    scrip_name TEXT,
+                    expiry_date DATE,
+                    instrument_type TEXT,
+                    strike_price REAL,
+                    position TEXT NOT NULL,
+                    term_type TEXT,
+                    quantity INTEGER NOT NULL,
+                    open_id INTEGER,
+                    open_type TEXT,
+                    open_date DATE,
+                    open_price REAL,
+                    close_id INTEGER,
+                    close_type TEXT,
+                    close_date DATE NOT NULL,
+                    close_price REAL,
+                    profit_loss REAL NOT NULL,
                     FOREIGN KEY (demat_account_id) REFERENCES demat_accounts(id)
                 )
             """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_realized_pnl_scrip
+                ON realized_pnl(demat_account_id, transaction_category, instrument_id, close_date)
+            """)
+            
+            # Create realized_pnl_stale table (scrips whose realized_pnl rows are out of date from
+            # from_date on; filled by triggers on transaction and charge writes, see init_db)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS realized_pnl_stale (
+                    demat_account_id INTEGER NOT NULL,
+                    transaction_category TEXT NOT NULL,
+                    instrument_id INTEGER NOT NULL,
+                    from_date TEXT NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 1,
+                    PRIMARY KEY (demat_account_id, transaction_category, instrument_id)
+                )
+            """)
+            
+            # Create serial_counters table (last serial number handed out per financial year)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS serial_counters (
+                    financial_year TEXT PRIMARY KEY,
+                    last_serial INTEGER NOT NULL DEFAULT 0
+                )
+            """)
             
             conn.commit()
 
@@ -67,6 +212,7 @@ class DatabaseManager:
         # Configure date adapter for SQLite
         sqlite3.register_adapter(datetime, lambda x: x.isoformat())
         sqlite3.register_converter("DATE", lambda x: datetime.fromisoformat(x.decode()))
+        schema = self.get_data_version('schema')
         
         with sqlite3.connect(self.db_name, detect_types=sqlite3.PARSE_DECLTYPES) as conn:
             c = conn.cursor()
@@ -182,19 +328,306 @@ class DatabaseManager:
                     VALUES (?, ?)
                 ''', ("Default Account", "Default demat account for existing transactions"))
             
+            # Give every transaction a stable integer id (older databases only have the implicit rowid)
+            c.execute("PRAGMA table_info(transactions)")
+            columns = [column[1] for column in c.fetchall()]
+            if 'id' not in columns:
+                c.execute('''
+                    CREATE TABLE transactions_new (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        financial_year TEXT,
+                        serial_number INTEGER,
+                        scrip_name TEXT,
+                        date DATE,
+                        num_shares INTEGER,
+                        rate REAL,
+                        amount REAL,
+                        transaction_type TEXT,
+                        demat_account_id INTEGER,
+                        transaction_category TEXT,
+                        expiry_date DATE,
+                        instrument_type TEXT,
+                        strike_price REAL,
+                        old_scrip_name TEXT,
+                        exchange TEXT DEFAULT 'NSE',
+                        FOREIGN KEY (demat_account_id) REFERENCES demat_accounts(id)
+                    )
+                ''')
+                column_list = ', '.join(columns)
+                c.execute(f'''
+                    INSERT INTO transactions_new (id, {column_list})
+                    SELECT rowid, {column_list} FROM transactions
+                ''')
+                c.execute('DROP TABLE transactions')
+                c.execute('ALTER TABLE transactions_new RENAME TO transactions')
+                columns.insert(0, 'id')
+            
+            # Content hash of imported trades; the unique index makes re-imports idempotent.
+            # Manually entered rows keep a NULL fingerprint, which the index does not constrain.
+            if 'fingerprint' not in columns:
+                c.execute('ALTER TABLE transactions ADD COLUMN fingerprint TEXT')
+            c.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_fingerprint ON transactions(fingerprint)')
+            
+            # Reference instruments by integer id instead of repeating free-text scrip names
+            if 'instrument_id' not in columns:
+                c.execute('ALTER TABLE transactions ADD COLUMN instrument_id INTEGER REFERENCES instruments(id)')
+                c.execute('ALTER TABLE transactions ADD COLUMN old_instrument_id INTEGER REFERENCES instruments(id)')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_transactions_account_instrument ON transactions(demat_account_id, instrument_id)')
+            
+            # Expired F&O contracts are looked up per account by expiry date
+            c.execute('CREATE INDEX IF NOT EXISTS idx_transactions_account_expiry ON transactions(demat_account_id, expiry_date)')
+            
+            # Backfill rows written without an instrument (older databases and older code paths).
+            # Case/spacing variants of the same symbol collapse onto one instrument.
+            unresolved = []
+            if schema < SCHEMA_INSTRUMENTS:
+                c.execute('SELECT id, scrip_name, old_scrip_name FROM transactions WHERE instrument_id IS NULL AND scrip_name IS NOT NULL AND transaction_category IS NOT NULL')
+                unresolved = c.fetchall()
+            if unresolved:
+                c.executemany('UPDATE transactions SET scrip_name = ?, old_scrip_name = ? WHERE id = ?', [
+                    (normalize_symbol(scrip_name), normalize_symbol(old_scrip_name) if old_scrip_name else None, transaction_id)
+                    for transaction_id, scrip_name, old_scrip_name in unresolved
+                ])
+                for name_column in ['scrip_name', 'old_scrip_name']:
+                    c.execute(f'''
+                        INSERT INTO instruments (symbol, exchange, segment)
+                        SELECT {name_column}, MIN(exchange), transaction_category
+                        FROM transactions
+                        WHERE instrument_id IS NULL AND {name_column} IS NOT NULL AND transaction_category IS NOT NULL
+                        GROUP BY {name_column}, transaction_category
+                        ON CONFLICT(symbol, segment) DO NOTHING
+                    ''')
+                c.execute('''
+                    UPDATE transactions
+                    SET instrument_id = (
+                            SELECT id FROM instruments
+                            WHERE symbol = transactions.scrip_name AND segment = transactions.transaction_category
+                        ),
+                        old_instrument_id = (
+                            SELECT id FROM instruments
+                            WHERE symbol = transactions.old_scrip_name AND segment = transactions.transaction_category
+                        )
+                    WHERE instrument_id IS NULL
+                ''')
+                self.bump_data_version(c)
+            
+            # Mark a scrip's realized P&L stale from the trade date whenever one of its transactions
+            # or their charges is written, so RealizedPnL.refresh recomputes only those scrips.
+            # Triggers catch every write path; they are (re)created after the migrations above,
+            # which may rebuild the transactions table, and a new ledger starts fully stale.
+            c.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'realized_pnl_stale_insert'")
+            if c.fetchone() is None:
+                for name, event, source in [
+                    ('realized_pnl_stale_insert', 'INSERT ON transactions', ['NEW']),
+                    ('realized_pnl_stale_update', 'UPDATE ON transactions', ['OLD', 'NEW']),
+                    ('realized_pnl_stale_delete', 'DELETE ON transactions', ['OLD'])
+                ]:
+                    c.execute(f"""
+                        CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} BEGIN
+                        {''.join(REALIZED_PNL_STALE_UPSERT.format(row=row) for row in source)}
+                        END
+                    """)
+                c.execute("""
+                    CREATE TRIGGER IF NOT EXISTS realized_pnl_stale_charges AFTER INSERT ON charge_breakdowns BEGIN
+                        INSERT INTO realized_pnl_stale (demat_account_id, transaction_category, instrument_id, from_date)
+                        SELECT t.demat_account_id, t.transaction_category, IFNULL(t.instrument_id, -1), substr(t.date, 1, 10)
+                        FROM transactions t
+                        WHERE t.id = NEW.transaction_id
+                        AND t.demat_account_id IS NOT NULL AND t.transaction_category IS NOT NULL AND t.date IS NOT NULL
+                        ON CONFLICT(demat_account_id, transaction_category, instrument_id)
+                        DO UPDATE SET from_date = MIN(from_date, excluded.from_date), version = version + 1;
+                    END
+                """)
+                c.execute('DELETE FROM realized_pnl')
+                c.execute('''
+                    INSERT INTO realized_pnl_stale (demat_account_id, transaction_category, instrument_id, from_date)
+                    SELECT demat_account_id, transaction_category, IFNULL(instrument_id, -1), MIN(substr(date, 1, 10))
+                    FROM transactions
+                    WHERE demat_account_id IS NOT NULL AND transaction_category IS NOT NULL AND date IS NOT NULL
+                    GROUP BY demat_account_id, transaction_category, IFNULL(instrument_id, -1)
+                    ON CONFLICT(demat_account_id, transaction_category, instrument_id)
+                    DO UPDATE SET from_date = MIN(from_date, excluded.from_date), version = version + 1
+                ''')
+            
+            # Bring the serial counters up to the highest serial stored per financial year
+            # (seeds older databases; writers keep them current from then on)
+            c.execute('CREATE INDEX IF NOT EXISTS idx_transactions_fy_serial ON transactions(financial_year, serial_number)')
+            if schema < SCHEMA_SERIAL_COUNTERS:
+                c.execute('''
+                    INSERT INTO serial_counters (financial_year, last_serial)
+                    SELECT financial_year, MAX(serial_number) FROM transactions
+                    WHERE financial_year IS NOT NULL AND serial_number IS NOT NULL
+                    GROUP BY financial_year
+                    ON CONFLICT(financial_year) DO UPDATE SET last_serial = MAX(last_serial, excluded.last_serial)
+                ''')
+            
+            conn.commit()
+        
+        if schema >= SCHEMA_VERSION:
+            return
+        with sqlite3.connect(self.db_name) as conn:
+            cursor = conn.cursor()
+            # Materialize charges for transactions written before charge_breakdowns existed
+            if schema < SCHEMA_CHARGE_BREAKDOWNS:
+                self._store_charge_breakdowns(cursor, self._charges_engine(), '''
+                    NOT EXISTS (SELECT 1 FROM charge_breakdowns cb WHERE cb.transaction_id = transactions.id)
+                ''')
+            cursor.execute('''
+                INSERT INTO data_versions (name, version) VALUES ('schema', ?)
+                ON CONFLICT(name) DO UPDATE SET version = excluded.version
+            ''', (SCHEMA_VERSION,))
             conn.commit()
 
-    def get_next_serial_number(self, financial_year):
-        """Get the next serial number for a given financial year"""
+    def get_data_version(self, name: str = 'transactions') -> int:
+        """Get the current version counter for a group of tables (used as a cache key)"""
         with sqlite3.connect(self.db_name) as conn:
             cursor = conn.cursor()
+            cursor.execute('SELECT version FROM data_versions WHERE name = ?', (name,))
+            result = cursor.fetchone()
+            return 0 if result is None else result[0]
+
+    def bump_data_version(self, cursor: sqlite3.Cursor, name: str = 'transactions'):
+        """Invalidate caches built on a group of tables, inside the caller's transaction"""
+        cursor.execute('''
+            INSERT INTO data_versions (name, version) VALUES (?, 1)
+            ON CONFLICT(name) DO UPDATE SET version = version + 1
+        ''', (name,))
+
+    def resolve_instrument(self, symbol: str, segment: str, exchange: Optional[str] = None) -> int:
+        """Get the id of the instrument for a symbol in a segment, creating it if needed"""
+        with sqlite3.connect(self.db_name) as conn:
+            instrument_id = self._resolve_instrument(conn.cursor(), symbol, segment, exchange)
+            conn.commit()
+            return instrument_id
+
+    def _resolve_instrument(self, cursor: sqlite3.Cursor, symbol: Optional[str], segment: str,
+                            exchange: Optional[str] = None) -> Optional[int]:
+        if not symbol:
+            return None
+        symbol = normalize_symbol(symbol)
+        cursor.execute('''
+            INSERT INTO instruments (symbol, exchange, segment) VALUES (?, ?, ?)
+            ON CONFLICT(symbol, segment) DO NOTHING
+        ''', (symbol, exchange, segment))
+        cursor.execute('SELECT id FROM instruments WHERE symbol = ? AND segment = ?', (symbol, segment))
+        return cursor.fetchone()[0]
+
+    def _resolve_instruments(self, cursor: sqlite3.Cursor, frame: pd.DataFrame) -> pd.DataFrame:
+        """Normalize scrip names and fill instrument_id/old_instrument_id for a whole batch"""
+        frame = frame.copy()
+        for name_column, id_column in [('scrip_name', 'instrument_id'), ('old_scrip_name', 'old_instrument_id')]:
+            names = frame[name_column].where(frame[name_column].notna(), None)
+            has_name = names.notna()
+            frame[id_column] = None
+            if not has_name.any():
+                continue
+            frame.loc[has_name, name_column] = names[has_name].str.upper().str.split().str.join(' ')
+            keys = frame.loc[has_name, [name_column, 'transaction_category', 'exchange']].drop_duplicates([name_column, 'transaction_category'])
+            keys = keys.astype(object).where(keys.notna(), None)
+            cursor.executemany('''
+                INSERT INTO instruments (symbol, segment, exchange) VALUES (?, ?, ?)
+                ON CONFLICT(symbol, segment) DO NOTHING
+            ''', keys.itertuples(index=False, name=None))
             cursor.execute('''
-                SELECT MAX(serial_number) 
-                FROM transactions 
-                WHERE financial_year = ?
-            ''', (financial_year,))
-            result = cursor.fetchone()[0]
-            return 1 if result is None else result + 1
+                SELECT symbol, segment, id FROM instruments
+                WHERE symbol IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(keys[name_column].tolist()),))
+            ids = {(symbol, segment): instrument_id for symbol, segment, instrument_id in cursor.fetchall()}
+            frame.loc[has_name, id_column] = [
+                ids.get(key) for key in zip(frame.loc[has_name, name_column], frame.loc[has_name, 'transaction_category'])
+            ]
+        return frame
+
+    def get_instruments(self, segment: Optional[str] = None) -> List[dict]:
+        """Get known instruments, optionally limited to one segment"""
+        with sqlite3.connect(self.db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, symbol, exchange, segment, lot_size, isin FROM instruments
+                WHERE ? IS NULL OR segment = ?
+                ORDER BY symbol
+            ''', (segment, segment))
+            return [
+                {"id": row[0], "symbol": row[1], "exchange": row[2], "segment": row[3], "lot_size": row[4], "isin": row[5]}
+                for row in cursor.fetchall()
+            ]
+
+    def _charges_engine(self):
+        # Imported here because models.charges builds on DatabaseManager. Create the engine and
+        # compile its rates before opening a write transaction: both read (and may create) the
+        # charges table on their own connection, which would otherwise block our commit.
+        from .charges import ChargesEngine
+        charges_engine = ChargesEngine(self)
+        charges_engine.resolver
+        return charges_engine
+
+    def _store_charge_breakdowns(self, cursor: sqlite3.Cursor, charges_engine, where: str, params: tuple = ()) -> int:
+        """Compute and store the charge breakdown of the transactions matching `where`.
+
+        Runs inside the caller's database transaction so the breakdown is written together
+        with the transactions it describes. Returns the number of breakdowns written.
+        """
+        from .charges import CHARGE_TYPES
+        cursor.execute(f'''
+            SELECT id, date, num_shares, rate, transaction_type, exchange, transaction_category, instrument_type
+            FROM transactions WHERE {where}
+        ''', params)
+        rows = pd.DataFrame(cursor.fetchall(), columns=[
+            'id', 'date', 'num_shares', 'rate', 'transaction_type', 'exchange', 'transaction_category', 'instrument_type'
+        ])
+        if rows.empty:
+            return 0
+        rows['base_amount'] = pd.to_numeric(rows['num_shares'], errors='coerce') * pd.to_numeric(rows['rate'], errors='coerce')
+        breakdown = charges_engine.calculate_charges_bulk(rows).fillna(0.0)
+        breakdown.insert(0, 'transaction_id', rows['id'])
+        columns = ['transaction_id'] + [charge_type.lower() for charge_type in CHARGE_TYPES] + ['total_charges']
+        cursor.executemany(f'''
+            INSERT OR REPLACE INTO charge_breakdowns ({', '.join(columns)})
+            VALUES ({', '.join('?' * len(columns))})
+        ''', breakdown[['transaction_id'] + CHARGE_TYPES + ['TOTAL']].astype(object).itertuples(index=False, name=None))
+        return len(breakdown)
+
+    def _delete_charge_breakdowns(self, cursor: sqlite3.Cursor, transaction_ids: List[int]):
+        cursor.execute('''
+            DELETE FROM charge_breakdowns
+            WHERE transaction_id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps([int(transaction_id) for transaction_id in transaction_ids]),))
+
+    def get_next_serial_number(self, financial_year):
+        """Get the next serial number for a given financial year without reserving it.
+
+        Only for display; writers allocate with reserve_serial_numbers (or leave serial_number
+        empty) so the number is taken in the same transaction as the insert.
+        """
+        with sqlite3.connect(self.db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT last_serial FROM serial_counters WHERE financial_year = ?', (financial_year,))
+            result = cursor.fetchone()
+            return 1 if result is None else result[0] + 1
+
+    def reserve_serial_numbers(self, financial_year: str, count: int = 1) -> int:
+        """Reserve a contiguous block of `count` serial numbers and return the first one"""
+        with sqlite3.connect(self.db_name) as conn:
+            first_serial = self._reserve_serial_numbers(conn.cursor(), financial_year, count)
+            conn.commit()
+            return first_serial
+
+    def _reserve_serial_numbers(self, cursor: sqlite3.Cursor, financial_year: str, count: int = 1) -> int:
+        # A single upsert both advances the counter and returns it, so concurrent writers
+        # serialize on the row write lock instead of racing on a MAX() read
+        cursor.execute('''
+            INSERT INTO serial_counters (financial_year, last_serial) VALUES (?, ?)
+            ON CONFLICT(financial_year) DO UPDATE SET last_serial = last_serial + excluded.last_serial
+            RETURNING last_serial
+        ''', (financial_year, count))
+        return cursor.fetchone()[0] - count + 1
+
+    def _advance_serial_counter(self, cursor: sqlite3.Cursor, financial_year: str, serial_number: int):
+        """Keep the counter ahead of a serial number that was written explicitly"""
+        cursor.execute('''
+            INSERT INTO serial_counters (financial_year, last_serial) VALUES (?, ?)
+            ON CONFLICT(financial_year) DO UPDATE SET last_serial = MAX(last_serial, excluded.last_serial)
+        ''', (financial_year, serial_number))
 
     def delete_transaction(self, financial_year: str, serial_number: int, scrip_name: str, date: datetime) -> bool:
         try:
@@ -206,17 +639,50 @@ class DatabaseManager:
                     AND serial_number = ? 
                     AND scrip_name = ? 
                     AND date = ?
+                    RETURNING id
                 ''', (financial_year, serial_number, scrip_name, date))
+                deleted_ids = [row[0] for row in c.fetchall()]
+                deleted = len(deleted_ids)
+                if deleted > 0:
+                    self._delete_charge_breakdowns(c, deleted_ids)
+                    self.bump_data_version(c)
                 conn.commit()
-                return c.rowcount > 0
+                return deleted > 0
         except Exception as e:
             print(f"Error deleting transaction: {e}")
             return False
+
+    def delete_transactions(self, transaction_ids: List[int]) -> int:
+        """Delete a batch of transactions by id in a single statement and transaction.
+        
+        Returns the number of rows deleted, or -1 if the delete failed and was rolled back.
+        """
+        if not transaction_ids:
+            return 0
+        try:
+            with sqlite3.connect(self.db_name) as conn:
+                cursor = conn.cursor()
+                # Pass the ids as one JSON array so the statement has a single parameter
+                # regardless of how many rows are selected
+                cursor.execute('''
+                    DELETE FROM transactions
+                    WHERE id IN (SELECT value FROM json_each(?))
+                ''', (json.dumps([int(transaction_id) for transaction_id in transaction_ids]),))
+                deleted = cursor.rowcount
+                if deleted > 0:
+                    self._delete_charge_breakdowns(cursor, transaction_ids)
+                    self.bump_data_version(cursor)
+                conn.commit()
+                return deleted
+        except Exception as e:
+            print(f"Error deleting transactions: {e}")
+            return -1
     
     def update_transaction(self, old_financial_year: str, old_serial_number: int, old_scrip_name: str, 
                           old_date, updated_transaction: Transaction) -> bool:
         """Update an existing transaction in the database"""
         try:
+            charges_engine = self._charges_engine()
             with sqlite3.connect(self.db_name, detect_types=sqlite3.PARSE_DECLTYPES) as conn:
                 cursor = conn.cursor()
                 
@@ -254,20 +720,30 @@ class DatabaseManager:
                     else:
                         updated_expiry_str = str(updated_expiry)
                 
+                # Resolve the (possibly edited) scrip names against the instruments table
+                instrument_id = self._resolve_instrument(
+                    cursor, updated_transaction.scrip_name, updated_transaction.transaction_category, updated_transaction.exchange
+                )
+                old_instrument_id = self._resolve_instrument(
+                    cursor, updated_transaction.old_scrip_name, updated_transaction.transaction_category, updated_transaction.exchange
+                )
+                
                 cursor.execute('''
                     UPDATE transactions 
                     SET financial_year = ?, serial_number = ?, scrip_name = ?, date = ?,
                         num_shares = ?, rate = ?, amount = ?, transaction_type = ?,
                         demat_account_id = ?, transaction_category = ?, expiry_date = ?,
-                        instrument_type = ?, strike_price = ?, old_scrip_name = ?, exchange = ?
+                        instrument_type = ?, strike_price = ?, old_scrip_name = ?, exchange = ?,
+                        instrument_id = ?, old_instrument_id = ?
                     WHERE financial_year = ? 
                     AND serial_number = ? 
                     AND scrip_name = ? 
                     AND date = ?
+                    RETURNING id
                 ''', (
                     updated_transaction.financial_year,
                     updated_transaction.serial_number,
-                    updated_transaction.scrip_name,
+                    normalize_symbol(updated_transaction.scrip_name),
                     updated_date_str,
                     updated_transaction.num_shares,
                     updated_transaction.rate,
@@ -278,15 +754,25 @@ class DatabaseManager:
                     updated_expiry_str,
                     updated_transaction.instrument_type,
                     updated_transaction.strike_price,
-                    updated_transaction.old_scrip_name,
+                    normalize_symbol(updated_transaction.old_scrip_name) if updated_transaction.old_scrip_name else None,
                     updated_transaction.exchange,
+                    instrument_id,
+                    old_instrument_id,
                     old_financial_year,
                     old_serial_number,
                     old_scrip_name,
                     old_date_str
                 ))
+                updated_ids = [row[0] for row in cursor.fetchall()]
+                updated = len(updated_ids)
+                if updated > 0:
+                    self._store_charge_breakdowns(
+                        cursor, charges_engine, 'id IN (SELECT value FROM json_each(?))', (json.dumps(updated_ids),)
+                    )
+                    self._advance_serial_counter(cursor, updated_transaction.financial_year, updated_transaction.serial_number)
+                    self.bump_data_version(cursor)
                 conn.commit()
-                return cursor.rowcount > 0
+                return updated > 0
         except Exception as e:
             print(f"Error updating transaction: {e}")
             return False
@@ -299,19 +785,29 @@ class DatabaseManager:
                        old_scrip_name: str = None) -> bool:
         """Add a new transaction to the database"""
         try:
+            charges_engine = self._charges_engine()
             with sqlite3.connect(self.db_name, detect_types=sqlite3.PARSE_DECLTYPES) as conn:
                 cursor = conn.cursor()
+                instrument_id = self._resolve_instrument(cursor, scrip_name, transaction_category)
+                old_instrument_id = self._resolve_instrument(cursor, old_scrip_name, transaction_category)
+                if serial_number is None:
+                    serial_number = self._reserve_serial_numbers(cursor, financial_year)
+                else:
+                    self._advance_serial_counter(cursor, financial_year, serial_number)
                 cursor.execute('''
                     INSERT INTO transactions (
                         financial_year, serial_number, scrip_name, date,
                         transaction_type, num_shares, rate, amount, demat_account_id,
                         transaction_category, expiry_date, instrument_type, strike_price,
-                        old_scrip_name
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (financial_year, serial_number, scrip_name, date,
+                        old_scrip_name, instrument_id, old_instrument_id
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (financial_year, serial_number, normalize_symbol(scrip_name), date,
                       transaction_type, num_shares, rate, amount, demat_account_id,
                       transaction_category, expiry_date, instrument_type, strike_price,
-                      old_scrip_name))
+                      normalize_symbol(old_scrip_name) if old_scrip_name else None,
+                      instrument_id, old_instrument_id))
+                self._store_charge_breakdowns(cursor, charges_engine, 'id = ?', (cursor.lastrowid,))
+                self.bump_data_version(cursor)
                 conn.commit()
                 return True
         except Exception as e:
@@ -362,10 +858,15 @@ class DatabaseManager:
         try:
             with sqlite3.connect(self.db_name) as conn:
                 cursor = conn.cursor()
-                # First delete associated transactions
+                # First delete associated transactions and their charge breakdowns
+                cursor.execute('''
+                    DELETE FROM charge_breakdowns
+                    WHERE transaction_id IN (SELECT id FROM transactions WHERE demat_account_id = ?)
+                ''', (account_id,))
                 cursor.execute('DELETE FROM transactions WHERE demat_account_id = ?', (account_id,))
                 # Then delete the account
                 cursor.execute('DELETE FROM demat_accounts WHERE id = ?', (account_id,))
+                self.bump_data_version(cursor)
                 conn.commit()
                 return True
         except Exception as e:
@@ -373,20 +874,33 @@ class DatabaseManager:
             return False
 
     def save_transaction(self, transaction: Transaction) -> bool:
+        """Insert one transaction; a missing serial_number is allocated in the same database transaction"""
         try:
+            charges_engine = self._charges_engine()
             with sqlite3.connect(self.db_name) as conn:
                 cursor = conn.cursor()
+                instrument_id = self._resolve_instrument(
+                    cursor, transaction.scrip_name, transaction.transaction_category, transaction.exchange
+                )
+                old_instrument_id = self._resolve_instrument(
+                    cursor, transaction.old_scrip_name, transaction.transaction_category, transaction.exchange
+                )
+                if transaction.serial_number is None:
+                    transaction.serial_number = self._reserve_serial_numbers(cursor, transaction.financial_year)
+                else:
+                    self._advance_serial_counter(cursor, transaction.financial_year, transaction.serial_number)
                 cursor.execute("""
                     INSERT INTO transactions (
                         financial_year, serial_number, scrip_name, date, num_shares,
                         rate, amount, transaction_type, demat_account_id,
                         transaction_category, expiry_date, instrument_type,
-                        strike_price, old_scrip_name, exchange
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        strike_price, old_scrip_name, exchange,
+                        instrument_id, old_instrument_id
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     transaction.financial_year,
                     transaction.serial_number,
-                    transaction.scrip_name,
+                    normalize_symbol(transaction.scrip_name),
                     transaction.date,
                     transaction.num_shares,
                     transaction.rate,
@@ -397,11 +911,192 @@ class DatabaseManager:
                     transaction.expiry_date,
                     transaction.instrument_type,
                     transaction.strike_price,
-                    transaction.old_scrip_name,
-                    transaction.exchange
+                    normalize_symbol(transaction.old_scrip_name) if transaction.old_scrip_name else None,
+                    transaction.exchange,
+                    instrument_id,
+                    old_instrument_id
                 ))
+                self._store_charge_breakdowns(cursor, charges_engine, 'id = ?', (cursor.lastrowid,))
+                self.bump_data_version(cursor)
                 conn.commit()
                 return True
         except Exception as e:
             print(f"Error saving transaction: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    def restate_amounts(self, amounts: pd.DataFrame) -> int:
+        """Overwrite the amount of existing transactions and refresh their charge breakdowns.
+        
+        `amounts` has columns id and amount; all rows are written in one database transaction.
+        Returns the number of transactions updated, or -1 if the update failed.
+        """
+        if amounts.empty:
+            return 0
+        try:
+            charges_engine = self._charges_engine()
+            with sqlite3.connect(self.db_name) as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    'UPDATE transactions SET amount = ? WHERE id = ?',
+                    zip(amounts['amount'].astype(float).tolist(), amounts['id'].astype(int).tolist())
+                )
+                self._store_charge_breakdowns(
+                    cursor, charges_engine, 'id IN (SELECT value FROM json_each(?))',
+                    (json.dumps(amounts['id'].astype(int).tolist()),)
+                )
+                self.bump_data_version(cursor)
+                conn.commit()
+                return len(amounts)
+        except Exception as e:
+            print(f"Error restating transaction amounts: {e}")
+            return -1
+
+    def save_settlement_prices(self, prices: pd.DataFrame) -> int:
+        """Upsert daily futures settlement prices in a single database transaction.
+        
+        `prices` has columns scrip_name, transaction_category, exchange, expiry_date, date and
+        settlement_price; instruments are created for symbols not seen before. A price already
+        stored for the same contract and date is replaced.
+        Returns the number of prices written, or -1 if the write failed.
+        """
+        if prices.empty:
+            return 0
+        try:
+            with sqlite3.connect(self.db_name) as conn:
+                cursor = conn.cursor()
+                frame = self._resolve_instruments(cursor, prices.assign(old_scrip_name=None))
+                cursor.executemany('''
+                    INSERT INTO settlement_prices (instrument_id, expiry_date, date, settlement_price)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(instrument_id, expiry_date, date) DO UPDATE SET settlement_price = excluded.settlement_price
+                ''', zip(
+                    frame['instrument_id'].astype(int).tolist(),
+                    frame['expiry_date'].tolist(),
+                    frame['date'].tolist(),
+                    frame['settlement_price'].astype(float).tolist()
+                ))
+                self.bump_data_version(cursor, 'settlement_prices')
+                conn.commit()
+                return len(frame)
+        except Exception as e:
+            print(f"Error saving settlement prices: {e}")
+            return -1
+
+    def save_prices(self, prices: pd.DataFrame) -> int:
+        """Upsert end-of-day closing prices in a single database transaction.
+        
+        `prices` has columns scrip_name, transaction_category, exchange, date and close;
+        instruments are created for symbols not seen before. A close already stored for the
+        same instrument and date is replaced.
+        Returns the number of prices written, or -1 if the write failed.
+        """
+        if prices.empty:
+            return 0
+        try:
+            with sqlite3.connect(self.db_name) as conn:
+                cursor = conn.cursor()
+                frame = self._resolve_instruments(cursor, prices.assign(old_scrip_name=None))
+                cursor.executemany('''
+                    INSERT INTO prices (instrument_id, date, close) VALUES (?, ?, ?)
+                    ON CONFLICT(instrument_id, date) DO UPDATE SET close = excluded.close
+                ''', zip(
+                    frame['instrument_id'].astype(int).tolist(),
+                    frame['date'].tolist(),
+                    frame['close'].astype(float).tolist()
+                ))
+                self.bump_data_version(cursor, 'prices')
+                conn.commit()
+                return len(frame)
+        except Exception as e:
+            print(f"Error saving prices: {e}")
+            return -1
+
+    def get_existing_fingerprints(self, fingerprints: List[str]) -> set:
+        """Return the subset of the given fingerprints that are already stored"""
+        with sqlite3.connect(self.db_name) as conn:
+            return self._existing_fingerprints(conn.cursor(), fingerprints)
+
+    def _existing_fingerprints(self, cursor: sqlite3.Cursor, fingerprints: List[str]) -> set:
+        # One statement for the whole batch; each value is probed through the unique index
+        cursor.execute('''
+            SELECT fingerprint FROM transactions
+            WHERE fingerprint IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(list(fingerprints)),))
+        return {row[0] for row in cursor.fetchall()}
+
+    def save_transactions(self, transactions: pd.DataFrame, charged: bool = True) -> int:
+        """Bulk-insert a DataFrame of transactions in a single database transaction.
+        
+        The frame uses the transactions table column names. Rows whose fingerprint is already
+        stored (or repeated within the frame) are skipped. Rows without a serial_number are
+        numbered in date order from a block reserved on their financial year's counter.
+        With charged=False the rows are stored with a zero charge breakdown (e.g. expiry
+        settlements, where no order is placed).
+        Returns the number of rows inserted, or -1 if the insert failed.
+        """
+        if transactions.empty:
+            return 0
+        columns = [
+            'financial_year', 'serial_number', 'scrip_name', 'date', 'num_shares',
+            'rate', 'amount', 'transaction_type', 'demat_account_id',
+            'transaction_category', 'expiry_date', 'instrument_type',
+            'strike_price', 'old_scrip_name', 'exchange', 'fingerprint',
+            'instrument_id', 'old_instrument_id'
+        ]
+        try:
+            frame = transactions.reindex(columns=columns)
+            charges_engine = self._charges_engine()
+            with sqlite3.connect(self.db_name) as conn:
+                cursor = conn.cursor()
+                
+                # Drop duplicates of stored trades in one set-based pass before numbering serials
+                fingerprinted = frame['fingerprint'].notna()
+                if fingerprinted.any():
+                    existing = self._existing_fingerprints(cursor, frame.loc[fingerprinted, 'fingerprint'].unique())
+                    duplicate = frame['fingerprint'].isin(existing) | (fingerprinted & frame['fingerprint'].duplicated())
+                    frame = frame[~duplicate]
+                    if frame.empty:
+                        return 0
+                
+                # Number rows without a serial from one reserved block per financial year
+                needs_serial = frame['serial_number'].isna()
+                frame['serial_number'] = frame['serial_number'].astype('Int64')
+                if needs_serial.any():
+                    pending = frame[needs_serial].sort_values('date', kind='stable')
+                    first_serials = {
+                        fy: self._reserve_serial_numbers(cursor, fy, int(count))
+                        for fy, count in pending['financial_year'].value_counts().items()
+                    }
+                    offsets = pending['financial_year'].map(first_serials).astype(int)
+                    frame.loc[pending.index, 'serial_number'] = offsets + pending.groupby('financial_year').cumcount()
+                if (~needs_serial).any():
+                    for fy, serial in frame[~needs_serial].groupby('financial_year')['serial_number'].max().items():
+                        self._advance_serial_counter(cursor, fy, int(serial))
+                
+                frame = self._resolve_instruments(cursor, frame)
+                
+                # Ids are assigned above the current sequence value; this transaction already
+                # holds the write lock, so every row past it is one of ours
+                cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'transactions'")
+                last_id = cursor.fetchone()[0]
+                
+                # Convert to plain Python values (None for missing) for the sqlite3 driver
+                frame = frame.astype(object).where(frame.notna(), None)
+                cursor.executemany(f"""
+                    INSERT OR IGNORE INTO transactions ({', '.join(columns)})
+                    VALUES ({', '.join('?' * len(columns))})
+                """, frame.itertuples(index=False, name=None))
+                inserted = cursor.rowcount
+                if charged:
+                    self._store_charge_breakdowns(cursor, charges_engine, 'id > ?', (last_id,))
+                else:
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO charge_breakdowns (transaction_id)
+                        SELECT id FROM transactions WHERE id > ?
+                    ''', (last_id,))
+                self.bump_data_version(cursor)
+                conn.commit()
+                return inserted
+        except Exception as e:
+            print(f"Error saving transactions: {e}")
+            return -1
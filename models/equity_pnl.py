@@ -0,0 +1,176 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+
+# Transactions that add shares to a holding and those that realize them, matched first-in first-out
+ACQUISITION_TYPES = ['BUY', 'IPO', 'BONUS', 'RIGHT', 'DEMERGER']
+DISPOSAL_TYPES = ['SELL', 'BUYBACK']
+
+MATCHED_LOT_COLUMNS = [
+    'demat_account_id', 'instrument_id', 'scrip_name', 'transaction_type', 'sale_id', 'sale_date', 'sale_price',
+    'purchase_type', 'purchase_id', 'purchase_date', 'purchase_price', 'quantity', 'profit_loss', 'holding_days',
+    'term_type'
+]
+
+INTRADAY_COLUMNS = [
+    'demat_account_id', 'instrument_id', 'scrip_name', 'date', 'quantity', 'buy_price', 'sell_price',
+    'buy_value', 'sell_value', 'profit_loss', 'turnover'
+]
+
+@dataclass
+class TradeClassification:
+    """Equity transactions split into delivery and intraday (speculative) trades.
+
+    delivery has the input columns, with each account, instrument and day that had both buys
+    and sells reduced to one row for its net quantity. intraday has one row per such day:
+    the quantity squared off, average buy and sell prices, their values, profit_loss and
+    turnover (the absolute profit or loss, as counted for a tax audit).
+    """
+    delivery: pd.DataFrame
+    intraday: pd.DataFrame
+
+def classify_trades(transactions: pd.DataFrame) -> TradeClassification:
+    """Net same-day BUY and SELL trades of a scrip before delivery matching.
+
+    Shares bought and sold on the same day by the same account are intraday, whatever the
+    order of the trades; only the net quantity is delivery. The net row takes the average
+    price of its side, and its id and other columns from that side's first trade. One
+    grouped pass over the whole history; days with trades on one side only are untouched.
+    """
+    trades = transactions[transactions['transaction_type'].isin(['BUY', 'SELL'])]
+    key = [trades['demat_account_id'], trades['instrument_id'].fillna(-1), trades['date'].astype(str).str[:10]]
+    mixed = trades.groupby(key)['transaction_type'].transform('nunique') == 2
+    if not mixed.any():
+        return TradeClassification(transactions, pd.DataFrame(columns=INTRADAY_COLUMNS))
+
+    mixed_trades = trades[mixed]
+    sides = mixed_trades.assign(
+        day=mixed_trades['date'].astype(str).str[:10],
+        instrument=mixed_trades['instrument_id'].fillna(-1),
+        row=mixed_trades.index
+    ).sort_values('id' if 'id' in mixed_trades.columns else 'row', kind='stable').groupby(
+        ['demat_account_id', 'instrument', 'day', 'transaction_type']
+    ).agg(row=('row', 'first'), shares=('num_shares', 'sum'), amount=('amount', 'sum')).unstack('transaction_type')
+
+    bought, sold = sides[('shares', 'BUY')], sides[('shares', 'SELL')]
+    buy_price = sides[('amount', 'BUY')] / bought
+    sell_price = sides[('amount', 'SELL')] / sold
+    squared_off = np.minimum(bought, sold)
+    intraday = pd.DataFrame({
+        'demat_account_id': sides.index.get_level_values('demat_account_id'),
+        'instrument_id': transactions.loc[sides[('row', 'BUY')], 'instrument_id'].to_numpy(),
+        'scrip_name': transactions.loc[sides[('row', 'BUY')], 'scrip_name'].to_numpy(),
+        'date': pd.to_datetime(sides.index.get_level_values('day')),
+        'quantity': squared_off.to_numpy(),
+        'buy_price': buy_price.to_numpy(),
+        'sell_price': sell_price.to_numpy()
+    })
+    intraday['buy_value'] = intraday['buy_price'] * intraday['quantity']
+    intraday['sell_value'] = intraday['sell_price'] * intraday['quantity']
+    intraday['profit_loss'] = intraday['sell_value'] - intraday['buy_value']
+    intraday['turnover'] = intraday['profit_loss'].abs()
+    intraday = intraday[intraday['quantity'] > 0]
+
+    # The net quantity stays on the side that traded more, at that side's average price
+    net = bought - sold
+    long_net, short_net = net > 0, net < 0
+    net_rows = transactions.loc[np.concatenate([
+        sides.loc[long_net, ('row', 'BUY')].to_numpy(), sides.loc[short_net, ('row', 'SELL')].to_numpy()
+    ])].copy()
+    net_rows['num_shares'] = np.concatenate([net[long_net].to_numpy(), -net[short_net].to_numpy()])
+    net_rows['amount'] = net_rows['num_shares'] * np.concatenate([
+        buy_price[long_net].to_numpy(), sell_price[short_net].to_numpy()
+    ])
+    delivery = pd.concat([transactions.drop(mixed_trades.index), net_rows]).sort_index()
+    return TradeClassification(delivery, intraday[INTRADAY_COLUMNS])
+
+def long_term(purchase_dates: pd.Series, sale_dates: pd.Series) -> pd.Series:
+    """Listed equity held for more than twelve months is a long-term capital asset"""
+    return sale_dates > purchase_dates + pd.DateOffset(years=1)
+
+def match_equity_lots(transactions: pd.DataFrame) -> pd.DataFrame:
+    """Match equity disposals (SELL, BUYBACK) against acquisitions first-in first-out.
+
+    `transactions` has the transactions table columns (id, demat_account_id, instrument_id,
+    scrip_name, date, transaction_type, num_shares, amount). Each account and instrument is a
+    separate queue; acquisitions dated on or before a disposal are eligible, and each share
+    is matched at most once. Shares sold beyond what was acquired are left unmatched.
+    Prices are per-share stored amounts, so buys include their charges and sells are net
+    of them.
+
+    No per-trade loop: within a queue, acquisitions cover consecutive intervals of the
+    cumulative acquired quantity and disposals consecutive intervals of the cumulative
+    matched quantity, and a matched lot is the overlap of one of each. All queues are laid
+    on one number line and the overlaps found with two binary searches.
+    """
+    rows = transactions[transactions['transaction_type'].isin(ACQUISITION_TYPES + DISPOSAL_TYPES)]
+    if rows.empty:
+        return pd.DataFrame(columns=MATCHED_LOT_COLUMNS)
+
+    rows = rows.assign(
+        instrument_id=rows['instrument_id'].fillna(-1).astype(int),
+        day=pd.to_datetime(rows['date'].astype(str).str[:10]),
+        # Same-day acquisitions come before disposals
+        disposal=rows['transaction_type'].isin(DISPOSAL_TYPES)
+    )
+    order = ['demat_account_id', 'instrument_id', 'day', 'disposal'] + (['id'] if 'id' in rows.columns else [])
+    rows = rows.sort_values(order, kind='stable').reset_index(drop=True)
+    queue = rows.groupby(['demat_account_id', 'instrument_id'], sort=False).ngroup().to_numpy()
+    disposal = rows['disposal'].to_numpy()
+    quantity = rows['num_shares'].fillna(0).to_numpy(dtype=np.int64)
+    amount = rows['amount'].to_numpy(dtype=float)
+    price = np.divide(amount, quantity, out=np.zeros(len(rows)), where=quantity != 0)
+
+    acquired = np.where(disposal, 0, quantity)
+    sold = np.where(disposal, quantity, 0)
+    acquired_to_date = pd.Series(acquired).groupby(queue).cumsum().to_numpy()
+    sold_to_date = pd.Series(sold).groupby(queue).cumsum().to_numpy()
+
+    # Matched quantity to date: m_j = min(m_{j-1} + sold_j, acquired_j). Written as
+    # m_j = sold_to_date_j + e_j, the shortfall e_j is a running minimum of
+    # min(0, acquired - sold to date) over the queue's disposals.
+    shortfall = np.where(disposal, acquired_to_date - sold_to_date, np.iinfo(np.int64).max)
+    shortfall = np.minimum(pd.Series(shortfall).groupby(queue).cummin().to_numpy(), 0)
+    matched_end = sold_to_date + shortfall
+    # Each disposal starts where the queue's previous disposal ended
+    matched_to_date = pd.Series(np.where(disposal, matched_end, np.nan)).groupby(queue).ffill()
+    matched_start = matched_to_date.groupby(queue).shift().fillna(0).to_numpy(dtype=np.int64)
+
+    # Lay every queue end to end on one line, offset by the shares acquired in earlier queues
+    queue_totals = np.bincount(queue, weights=acquired).astype(np.int64)
+    offset = (np.cumsum(queue_totals) - queue_totals)[queue]
+    lots = np.flatnonzero(~disposal)
+    lot_start = offset[lots] + acquired_to_date[lots] - acquired[lots]
+    lot_end = offset[lots] + acquired_to_date[lots]
+    sales = np.flatnonzero(disposal & (matched_end > matched_start))
+    sale_start = offset[sales] + matched_start[sales]
+    sale_end = offset[sales] + matched_end[sales]
+
+    first = np.searchsorted(lot_end, sale_start, side='right')
+    last = np.searchsorted(lot_start, sale_end, side='left')
+    counts = last - first
+    sale = np.repeat(sales, counts)
+    lot = np.repeat(first, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    matched = (np.minimum(np.repeat(sale_end, counts), lot_end[lot])
+               - np.maximum(np.repeat(sale_start, counts), lot_start[lot]))
+    keep = matched > 0
+    sale, purchase, matched = sale[keep], lots[lot[keep]], matched[keep]
+
+    result = pd.DataFrame({
+        'demat_account_id': rows['demat_account_id'].to_numpy()[sale],
+        'instrument_id': rows['instrument_id'].to_numpy()[sale],
+        'scrip_name': rows['scrip_name'].to_numpy()[sale],
+        'transaction_type': rows['transaction_type'].to_numpy()[sale],
+        'sale_id': rows['id'].to_numpy()[sale] if 'id' in rows.columns else sale,
+        'sale_date': rows['day'].to_numpy()[sale],
+        'sale_price': price[sale],
+        'purchase_type': rows['transaction_type'].to_numpy()[purchase],
+        'purchase_id': rows['id'].to_numpy()[purchase] if 'id' in rows.columns else purchase,
+        'purchase_date': rows['day'].to_numpy()[purchase],
+        'purchase_price': price[purchase],
+        'quantity': matched
+    })
+    result['profit_loss'] = (result['sale_price'] - result['purchase_price']) * result['quantity']
+    result['holding_days'] = (result['sale_date'] - result['purchase_date']).dt.days
+    result['term_type'] = np.where(long_term(result['purchase_date'], result['sale_date']), 'LONG TERM', 'SHORT TERM')
+    return result
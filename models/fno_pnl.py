@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+from collections import deque
+from dataclasses import dataclass
+
+# Columns identifying an F&O contract; futures have no strike price
+CONTRACT_COLUMNS = ['instrument_id', 'expiry_date', 'instrument_type', 'strike_price', 'transaction_category']
+
+# Contract details carried on matched trades and open lots
+CONTRACT_DETAIL_COLUMNS = ['instrument_id', 'scrip_name', 'expiry_date', 'instrument_type', 'strike_price',
+                           'transaction_category']
+
+MATCHED_TRADE_COLUMNS = CONTRACT_DETAIL_COLUMNS + [
+    'position', 'quantity', 'open_id', 'open_date', 'open_price', 'close_id', 'close_date', 'close_price', 'profit_loss'
+]
+
+OPEN_LOT_COLUMNS = CONTRACT_DETAIL_COLUMNS + ['position', 'quantity', 'open_date', 'open_price']
+
+
+@dataclass
+class FifoResult:
+    """Outcome of FIFO matching: closed lots and lots still open.
+
+    Prices are charge-adjusted premiums per unit (buys include their charges, sells are net
+    of them). `position` is LONG for lots opened by a buy and SHORT for lots opened by a sell.
+    """
+    matched: pd.DataFrame
+    open_lots: pd.DataFrame
+
+
+def fifo_match(transactions: pd.DataFrame) -> FifoResult:
+    """Match F&O buys and sells first-in first-out within each contract.
+
+    `transactions` needs the CONTRACT_COLUMNS plus scrip_name, date, transaction_type,
+    num_shares, rate and charges (the stored charge total per trade); an id column, when
+    present, orders trades on the same date. Each contract keeps a queue of open long lots
+    and one of open short lots: a buy first covers the oldest shorts and opens a long lot
+    with the rest, and a sell does the opposite. Trades are sorted once and walked in a
+    single pass; prices and contract details are gathered in bulk afterwards.
+    """
+    trades = transactions[transactions['transaction_type'].isin(['BUY', 'SELL'])]
+    if trades.empty:
+        return FifoResult(pd.DataFrame(columns=MATCHED_TRADE_COLUMNS), pd.DataFrame(columns=OPEN_LOT_COLUMNS))
+
+    contract = trades.groupby(CONTRACT_COLUMNS, dropna=False, sort=False).ngroup()
+    order = ['_contract', 'date'] + (['id'] if 'id' in trades.columns else [])
+    trades = trades.assign(_contract=contract).sort_values(order, kind='stable').reset_index(drop=True)
+
+    is_buy = (trades['transaction_type'] == 'BUY').to_numpy()
+    quantity = trades['num_shares'].to_numpy()
+    per_unit_charges = trades['charges'].to_numpy(dtype=float) / np.where(quantity == 0, 1, quantity)
+    price = trades['rate'].to_numpy(dtype=float) + np.where(is_buy, per_unit_charges, -per_unit_charges)
+
+    # One pass over the sorted trades; a lot is [row that opened it, quantity still open]
+    open_rows, close_rows, matched_quantity = [], [], []
+    lot_rows, lot_quantity = [], []
+    longs, shorts = deque(), deque()
+    current = None
+    for row, (contract_id, buy, units) in enumerate(zip(trades['_contract'].tolist(), is_buy.tolist(), quantity.tolist())):
+        if contract_id != current:
+            for lot in [*longs, *shorts]:
+                lot_rows.append(lot[0])
+                lot_quantity.append(lot[1])
+            longs.clear()
+            shorts.clear()
+            current = contract_id
+        opposite, same = (shorts, longs) if buy else (longs, shorts)
+        while units > 0 and opposite:
+            lot = opposite[0]
+            closed = min(units, lot[1])
+            open_rows.append(lot[0])
+            close_rows.append(row)
+            matched_quantity.append(closed)
+            units -= closed
+            lot[1] -= closed
+            if lot[1] == 0:
+                opposite.popleft()
+        if units > 0:
+            same.append([row, units])
+    for lot in [*longs, *shorts]:
+        lot_rows.append(lot[0])
+        lot_quantity.append(lot[1])
+
+    def lots(rows: list, units: list) -> pd.DataFrame:
+        rows = np.array(rows, dtype=int)
+        frame = trades.loc[rows, CONTRACT_DETAIL_COLUMNS].reset_index(drop=True)
+        frame['position'] = np.where(is_buy[rows], 'LONG', 'SHORT')
+        frame['quantity'] = np.array(units, dtype=quantity.dtype)
+        frame['open_date'] = trades['date'].to_numpy()[rows]
+        frame['open_price'] = price[rows]
+        return frame
+
+    matched = lots(open_rows, matched_quantity)
+    close = np.array(close_rows, dtype=int)
+    # The opening and closing trades' ids (their sorted rows when there is no id column)
+    trade_ids = trades['id'].to_numpy() if 'id' in trades.columns else np.arange(len(trades))
+    matched.insert(matched.columns.get_loc('open_date'), 'open_id', trade_ids[np.array(open_rows, dtype=int)])
+    matched['close_id'] = trade_ids[close]
+    matched['close_date'] = trades['date'].to_numpy()[close]
+    matched['close_price'] = price[close]
+    direction = np.where(matched['position'] == 'LONG', 1.0, -1.0)
+    matched['profit_loss'] = (matched['close_price'] - matched['open_price']) * direction * matched['quantity']
+
+    return FifoResult(matched, lots(lot_rows, lot_quantity))
+
+
+def open_contracts(open_lots: pd.DataFrame) -> pd.DataFrame:
+    """Net open position per contract from open lots: signed quantity (negative for
+    shorts), average open price and the earliest open date"""
+    if open_lots.empty:
+        return pd.DataFrame(columns=OPEN_LOT_COLUMNS)
+    lots = open_lots.assign(cost=open_lots['quantity'] * open_lots['open_price'])
+    positions = lots.groupby(CONTRACT_DETAIL_COLUMNS + ['position'], dropna=False, sort=True).agg(
+        quantity=('quantity', 'sum'),
+        open_date=('open_date', 'min'),
+        cost=('cost', 'sum')
+    ).reset_index()
+    positions['open_price'] = positions['cost'] / positions['quantity']
+    positions.loc[positions['position'] == 'SHORT', 'quantity'] *= -1
+    return positions.drop(columns='cost')
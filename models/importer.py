@@ -0,0 +1,279 @@
+import re
+import hashlib
+import pandas as pd
+from dataclasses import dataclass, field
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from .database import DatabaseManager
+from .charges import ChargesEngine
+
+# Number of tradebook rows normalized, charged and written per database transaction
+CHUNK_SIZE = 5000
+
+# Fields a tradebook must provide for a row to be importable
+REQUIRED_FIELDS = ['date', 'scrip_name', 'transaction_type', 'num_shares', 'rate']
+OPTIONAL_FIELDS = ['exchange', 'transaction_category', 'expiry_date', 'instrument_type', 'strike_price', 'trade_id']
+
+# F&O trading symbols such as NIFTY24JUN22000CE, BANKNIFTY24JUNFUT or NIFTY2461322000PE
+CONTRACT_SYMBOL_PATTERN = re.compile(
+    r'^(?P<underlying>.+?)(?P<expiry>\d{2}(?:[A-Z]{3}|[1-9OND]\d{2}))(?P<strike>\d+(?:\.\d+)?)?(?P<instrument>CE|PE|FUT)$'
+)
+
+@dataclass(frozen=True)
+class BrokerProfile:
+    """Describes how a broker's tradebook/contract-note export maps onto transaction fields"""
+    name: str
+    # Transaction field -> column header in the broker file (matched case-insensitively)
+    columns: Dict[str, str]
+    # Broker value (upper-cased) -> BUY/SELL/...
+    transaction_types: Dict[str, str] = field(default_factory=dict)
+    # Broker segment value (upper-cased) -> EQUITY / F&O EQUITY / F&O COMMODITY
+    categories: Dict[str, str] = field(default_factory=dict)
+    # Broker exchange value (upper-cased) -> NSE/BSE/MCX/NCDEX
+    exchanges: Dict[str, str] = field(default_factory=dict)
+    dayfirst: bool = False
+    # Derive underlying, instrument type and strike from F&O trading symbols
+    parse_contract_symbols: bool = False
+
+BROKER_PROFILES: Dict[str, BrokerProfile] = {
+    'Generic CSV': BrokerProfile(
+        name='Generic CSV',
+        columns={
+            'date': 'date',
+            'scrip_name': 'scrip_name',
+            'transaction_type': 'transaction_type',
+            'num_shares': 'num_shares',
+            'rate': 'rate',
+            'exchange': 'exchange',
+            'transaction_category': 'transaction_category',
+            'expiry_date': 'expiry_date',
+            'instrument_type': 'instrument_type',
+            'strike_price': 'strike_price',
+            'trade_id': 'trade_id'
+        },
+        transaction_types={'B': 'BUY', 'S': 'SELL'}
+    ),
+    'Zerodha Tradebook': BrokerProfile(
+        name='Zerodha Tradebook',
+        columns={
+            'date': 'trade_date',
+            'scrip_name': 'symbol',
+            'transaction_type': 'trade_type',
+            'num_shares': 'quantity',
+            'rate': 'price',
+            'exchange': 'exchange',
+            'transaction_category': 'segment',
+            'expiry_date': 'expiry_date',
+            'trade_id': 'trade_id'
+        },
+        categories={'EQ': 'EQUITY', 'FO': 'F&O EQUITY', 'COM': 'F&O COMMODITY', 'MCX': 'F&O COMMODITY'},
+        exchanges={'NFO': 'NSE', 'BFO': 'BSE'},
+        parse_contract_symbols=True
+    ),
+}
+
+@dataclass
+class ImportResult:
+    rows_read: int = 0
+    rows_imported: int = 0
+    rows_rejected: int = 0
+    # Rows skipped because the same trade is already stored
+    rows_duplicate: int = 0
+    # Rejected rows with the 1-based source row number and the reason
+    errors: List[dict] = field(default_factory=list)
+    # First normalized rows (dry run only)
+    preview: Optional[pd.DataFrame] = None
+
+def financial_years(dates: pd.Series) -> pd.Series:
+    """Vectorized financial year (April to March) for a Series of datetimes, e.g. '2024-2025'"""
+    start_year = dates.dt.year - (dates.dt.month < 4).astype(int)
+    return start_year.astype(str) + '-' + (start_year + 1).astype(str)
+
+class TradebookImporter:
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+        self.charges = ChargesEngine(db_manager)
+
+    def iter_chunks(self, file: BinaryIO, file_name: str) -> Iterator[pd.DataFrame]:
+        """Stream a CSV/XLSX tradebook as DataFrame chunks of raw text values"""
+        if file_name.lower().endswith(('.xlsx', '.xls')):
+            # Excel files cannot be streamed by pandas; read once and slice into chunks
+            try:
+                sheet = pd.read_excel(file, dtype=str)
+            except ImportError as e:
+                raise ValueError("Reading Excel tradebooks needs the 'openpyxl' package. Install it or export the file as CSV.") from e
+            for start in range(0, len(sheet), CHUNK_SIZE):
+                yield sheet.iloc[start:start + CHUNK_SIZE]
+        else:
+            yield from pd.read_csv(file, dtype=str, chunksize=CHUNK_SIZE, skipinitialspace=True)
+
+    def normalize_chunk(self, chunk: pd.DataFrame, profile: BrokerProfile, demat_account_id: int) -> Tuple[pd.DataFrame, List[dict]]:
+        """Map one raw chunk onto transaction columns, compute charges and amounts.
+
+        Returns the importable rows (transactions table columns plus source_row) and a list of
+        rejected rows with reasons.
+        """
+        # Match broker headers case-insensitively
+        headers = {str(column).strip().lower(): column for column in chunk.columns}
+        missing = [profile.columns[f] for f in REQUIRED_FIELDS if profile.columns.get(f, '').lower() not in headers]
+        if missing:
+            raise ValueError(f"File does not match the '{profile.name}' profile; missing column(s): {', '.join(missing)}")
+
+        df = pd.DataFrame(index=chunk.index)
+        df['source_row'] = chunk.index + 2  # 1-based, after the header row
+        for target in REQUIRED_FIELDS + OPTIONAL_FIELDS:
+            source_column = headers.get(profile.columns.get(target, '').lower())
+            if source_column is not None:
+                df[target] = chunk[source_column].str.strip().replace('', None)
+            else:
+                df[target] = pd.Series(None, index=chunk.index, dtype=object)
+
+        # Normalize text fields
+        df['scrip_name'] = df['scrip_name'].str.upper()
+        transaction_type = df['transaction_type'].str.upper()
+        df['transaction_type'] = transaction_type.replace(profile.transaction_types)
+        category = df['transaction_category'].str.upper().replace(profile.categories)
+        df['transaction_category'] = category.fillna('EQUITY')
+        exchange = df['exchange'].str.upper().replace(profile.exchanges)
+        default_exchange = df['transaction_category'].map({'F&O COMMODITY': 'MCX'}).fillna('NSE')
+        df['exchange'] = exchange.fillna(default_exchange)
+        df['instrument_type'] = df['instrument_type'].str.upper()
+
+        # Split F&O trading symbols into underlying, strike and instrument type
+        is_fno = df['transaction_category'] != 'EQUITY'
+        if profile.parse_contract_symbols and is_fno.any():
+            parts = df.loc[is_fno, 'scrip_name'].str.extract(CONTRACT_SYMBOL_PATTERN)
+            parsed = parts['underlying'].notna()
+            parsed_index = parts.index[parsed]
+            df.loc[parsed_index, 'scrip_name'] = parts.loc[parsed, 'underlying']
+            df.loc[parsed_index, 'instrument_type'] = df.loc[parsed_index, 'instrument_type'].fillna(parts.loc[parsed, 'instrument'])
+            df.loc[parsed_index, 'strike_price'] = df.loc[parsed_index, 'strike_price'].fillna(parts.loc[parsed, 'strike'])
+
+        # Parse numbers and dates
+        df['num_shares'] = pd.to_numeric(df['num_shares'].str.replace(',', ''), errors='coerce')
+        df['rate'] = pd.to_numeric(df['rate'].str.replace(',', ''), errors='coerce')
+        df['strike_price'] = pd.to_numeric(df['strike_price'], errors='coerce')
+        df['date'] = pd.to_datetime(df['date'], errors='coerce', dayfirst=profile.dayfirst, format='mixed')
+        df['expiry_date'] = pd.to_datetime(df['expiry_date'], errors='coerce', dayfirst=profile.dayfirst, format='mixed')
+
+        # Validate, collecting the first failing reason per row
+        checks = [
+            (df['date'].isna(), "Invalid or missing trade date"),
+            (df['scrip_name'].isna() | (df['scrip_name'] == ''), "Missing scrip name"),
+            (~df['transaction_type'].isin(['BUY', 'SELL', 'IPO', 'BONUS', 'RIGHT', 'BUYBACK', 'DEMERGER', 'MERGER & ACQUISITION']),
+             "Unknown transaction type"),
+            (~df['transaction_category'].isin(['EQUITY', 'F&O EQUITY', 'F&O COMMODITY']), "Unknown segment/category"),
+            (~(df['num_shares'] > 0) | (df['num_shares'] % 1 != 0), "Quantity must be a positive whole number"),
+            (~(df['rate'] >= 0), "Invalid rate"),
+            (is_fno & (df['expiry_date'].isna() | ~df['instrument_type'].isin(['FUT', 'CE', 'PE'])),
+             "F&O rows need an expiry date and instrument type (FUT, CE or PE)"),
+        ]
+        reason = pd.Series(None, index=df.index, dtype=object)
+        for failed, message in reversed(checks):
+            reason = reason.mask(failed, message)
+        rejected = reason.notna()
+        errors = [
+            {'row': int(row), 'reason': message}
+            for row, message in zip(df.loc[rejected, 'source_row'], reason[rejected])
+        ]
+        df = df[~rejected].copy()
+        if df.empty:
+            return df, errors
+
+        df['num_shares'] = df['num_shares'].astype(int)
+        df['financial_year'] = financial_years(df['date'])
+        df['demat_account_id'] = demat_account_id
+        is_fno = df['transaction_category'] != 'EQUITY'
+        df.loc[~is_fno, ['expiry_date', 'instrument_type', 'strike_price']] = None
+        df.loc[df['instrument_type'] == 'FUT', 'strike_price'] = None
+
+        # Compute charges for the whole chunk at once
+        base_amount = df['num_shares'] * df['rate']
+        charges = self.charges.calculate_charges_bulk(pd.DataFrame({
+            'base_amount': base_amount,
+            'date': df['date'],
+            'transaction_type': df['transaction_type'],
+            'exchange': df['exchange'],
+            'transaction_category': df['transaction_category'],
+            'instrument_type': df['instrument_type']
+        }))
+        is_sell = df['transaction_type'].isin(['SELL', 'BUYBACK'])
+        df['charges'] = charges['TOTAL']
+        df['amount'] = base_amount + charges['TOTAL'].where(~is_sell, -charges['TOTAL'])
+
+        df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+        df['expiry_date'] = df['expiry_date'].dt.strftime('%Y-%m-%d')
+        return df, errors
+
+    def add_fingerprints(self, rows: pd.DataFrame, occurrences: Dict[str, int]):
+        """Attach a content hash that identifies each trade across re-imports.
+
+        Otherwise identical rows (e.g. repeated fills without a broker trade id) are told apart
+        by their running occurrence count within the file, tracked across chunks in occurrences,
+        so re-uploading the same file maps onto the same fingerprints.
+        """
+        if rows.empty:
+            rows['fingerprint'] = pd.Series(dtype=object)
+            return
+        key = (
+            rows['demat_account_id'].astype(str) + '|' + rows['date'] + '|' + rows['scrip_name'] + '|'
+            + rows['transaction_type'] + '|' + rows['num_shares'].astype(str) + '|'
+            + rows['rate'].map('{:.6f}'.format) + '|' + rows['exchange'] + '|'
+            + rows['expiry_date'].fillna('') + '|' + rows['instrument_type'].fillna('') + '|'
+            + rows['strike_price'].map(lambda x: '' if pd.isna(x) else f'{x:.6f}') + '|'
+            + rows['trade_id'].fillna('')
+        )
+        ordinal = key.map(occurrences).fillna(0).astype(int) + key.groupby(key).cumcount()
+        for value, count in key.value_counts().items():
+            occurrences[value] = occurrences.get(value, 0) + count
+        rows['fingerprint'] = [
+            hashlib.sha1(f"{value}|{n}".encode()).hexdigest() for value, n in zip(key, ordinal)
+        ]
+
+    def preview(self, file: BinaryIO, file_name: str, profile: BrokerProfile, demat_account_id: int,
+                limit: int = 200) -> ImportResult:
+        """Dry run: parse, validate and price the whole file without writing anything"""
+        result = ImportResult()
+        previews = []
+        occurrences: Dict[str, int] = {}
+        for chunk in self.iter_chunks(file, file_name):
+            rows, errors = self.normalize_chunk(chunk, profile, demat_account_id)
+            self.add_fingerprints(rows, occurrences)
+            rows['already_imported'] = rows['fingerprint'].isin(
+                self.db_manager.get_existing_fingerprints(rows['fingerprint'].tolist())
+            )
+            result.rows_read += len(chunk)
+            result.rows_rejected += len(errors)
+            result.rows_duplicate += int(rows['already_imported'].sum())
+            result.errors.extend(errors)
+            if sum(len(p) for p in previews) < limit:
+                previews.append(rows)
+        result.preview = pd.concat(previews).head(limit) if previews else pd.DataFrame()
+        return result
+
+    def import_file(self, file: BinaryIO, file_name: str, profile: BrokerProfile, demat_account_id: int,
+                    progress_callback: Optional[Callable[[float, ImportResult], None]] = None) -> ImportResult:
+        """Stream a tradebook into the transactions table, one database transaction per chunk"""
+        result = ImportResult()
+        file.seek(0, 2)
+        file_size = file.tell() or 1
+        file.seek(0)
+        occurrences: Dict[str, int] = {}
+        for chunk in self.iter_chunks(file, file_name):
+            rows, errors = self.normalize_chunk(chunk, profile, demat_account_id)
+            self.add_fingerprints(rows, occurrences)
+            result.rows_read += len(chunk)
+            result.rows_rejected += len(errors)
+            result.errors.extend(errors)
+
+            inserted = self.db_manager.save_transactions(rows)
+            if inserted < 0:
+                raise RuntimeError(
+                    f"Saving rows {int(chunk.index[0]) + 2}-{int(chunk.index[-1]) + 2} failed; "
+                    f"{result.rows_imported} row(s) were imported before the failure"
+                )
+            result.rows_imported += inserted
+            result.rows_duplicate += len(rows) - inserted
+
+            if progress_callback:
+                progress_callback(min(file.tell() / file_size, 1.0), result)
+        return result
@@ -0,0 +1,174 @@
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+from typing import BinaryIO, List
+from .database import DatabaseManager, normalize_symbol
+
+# Bhavcopy column -> accepted headers (old NSE F&O bhavcopy, NSE UDiFF and plain names)
+BHAVCOPY_COLUMNS = {
+    'scrip_name': ['scrip_name', 'symbol', 'tckrsymb'],
+    'expiry_date': ['expiry_date', 'expiry_dt', 'xprydt'],
+    'date': ['date', 'timestamp', 'traddt'],
+    'settlement_price': ['settlement_price', 'settle_pr', 'sttlmpric']
+}
+
+# Optional instrument column; when present only futures rows are kept
+BHAVCOPY_INSTRUMENT_COLUMNS = ['instrument', 'fininstrmtp']
+FUTURES_INSTRUMENTS = ('FUTIDX', 'FUTSTK', 'FUTCOM', 'FUTIVX', 'FUTCUR', 'IDF', 'STF')
+
+# A contract: the underlying's instrument and the expiry (as YYYY-MM-DD)
+CONTRACT_KEY = ['instrument_id', 'expiry_day']
+
+MTM_COLUMNS = [
+    'demat_account_id', 'scrip_name', 'transaction_category', 'expiry_day', 'date', 'quantity',
+    'traded_quantity', 'previous_price', 'settlement_price', 'mtm'
+]
+
+def read_bhavcopy(file: BinaryIO) -> pd.DataFrame:
+    """Read daily futures settlement prices from a bhavcopy-style CSV.
+
+    Returns scrip_name, expiry_date, date (both YYYY-MM-DD) and settlement_price; option
+    rows are dropped when the file has an instrument column.
+    """
+    raw = pd.read_csv(file, dtype=str, skipinitialspace=True)
+    headers = {str(column).strip().lower(): column for column in raw.columns}
+    columns = {}
+    for target, aliases in BHAVCOPY_COLUMNS.items():
+        source = next((headers[alias] for alias in aliases if alias in headers), None)
+        if source is None:
+            raise ValueError(f"Bhavcopy is missing a '{target}' column (accepted headers: {', '.join(aliases)})")
+        columns[target] = raw[source].str.strip()
+    prices = pd.DataFrame(columns)
+
+    instrument = next((headers[alias] for alias in BHAVCOPY_INSTRUMENT_COLUMNS if alias in headers), None)
+    if instrument is not None:
+        prices = prices[raw[instrument].str.strip().str.upper().isin(FUTURES_INSTRUMENTS)]
+
+    expiry = pd.to_datetime(prices['expiry_date'], errors='coerce', dayfirst=True, format='mixed')
+    trade_date = pd.to_datetime(prices['date'], errors='coerce', dayfirst=True, format='mixed')
+    price = pd.to_numeric(prices['settlement_price'].str.replace(',', ''), errors='coerce')
+    invalid = prices['scrip_name'].isna() | expiry.isna() | trade_date.isna() | ~(price > 0)
+    if invalid.any():
+        raise ValueError(f"Bhavcopy has a missing symbol, invalid date or invalid settlement price on row(s): "
+                         f"{', '.join(str(row + 2) for row in prices.index[invalid][:10])}")
+    return pd.DataFrame({
+        'scrip_name': prices['scrip_name'].map(normalize_symbol),
+        'expiry_date': expiry.dt.strftime('%Y-%m-%d'),
+        'date': trade_date.dt.strftime('%Y-%m-%d'),
+        'settlement_price': price
+    }).drop_duplicates(['scrip_name', 'expiry_date', 'date'], keep='last').reset_index(drop=True)
+
+class MarkToMarket:
+    """Daily mark-to-market of open futures positions against exchange settlement prices"""
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+
+    def import_bhavcopy(self, file: BinaryIO, transaction_category: str, exchange: str) -> int:
+        """Store the futures settlement prices of a bhavcopy for one segment; see read_bhavcopy"""
+        prices = read_bhavcopy(file)
+        return self.db_manager.save_settlement_prices(
+            prices.assign(transaction_category=transaction_category, exchange=exchange)
+        )
+
+    def load_trades(self, demat_account_ids: List[int], start_date: date, end_date: date) -> pd.DataFrame:
+        """Futures trades up to end_date on contracts that had not expired by start_date"""
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            return pd.read_sql_query(
+                '''
+                SELECT demat_account_id, instrument_id, scrip_name, transaction_category, expiry_date,
+                       date, transaction_type, num_shares, rate
+                FROM transactions
+                WHERE demat_account_id IN (SELECT value FROM json_each(?))
+                AND expiry_date >= ?
+                AND date < ?
+                AND instrument_type = 'FUT'
+                AND transaction_category != 'EQUITY'
+                AND transaction_type IN ('BUY', 'SELL')
+                AND instrument_id IS NOT NULL
+                ''',
+                conn,
+                params=(
+                    json.dumps([int(account_id) for account_id in demat_account_ids]),
+                    start_date.isoformat(),
+                    (end_date + timedelta(days=1)).isoformat()
+                )
+            )
+
+    def load_prices(self, instrument_ids: List[int], start_date: date, end_date: date) -> pd.DataFrame:
+        """Settlement prices up to end_date of the instruments' contracts that had not expired by start_date"""
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            return pd.read_sql_query(
+                '''
+                SELECT instrument_id, expiry_date AS expiry_day, date, settlement_price
+                FROM settlement_prices
+                WHERE instrument_id IN (SELECT value FROM json_each(?))
+                AND expiry_date >= ?
+                AND date <= ?
+                ''',
+                conn,
+                params=(
+                    json.dumps([int(instrument_id) for instrument_id in instrument_ids]),
+                    start_date.isoformat(),
+                    end_date.isoformat()
+                )
+            )
+
+    def daily_mtm(self, demat_account_ids: List[int], start_date: date, end_date: date) -> pd.DataFrame:
+        """Daily MTM per account and futures contract for settlement days in [start_date, end_date].
+
+        A day's MTM is the change in the position's value at settlement prices less the cash
+        paid for that day's trades: quantity * price - previous quantity * previous price -
+        traded value. Trades are booked on the first settlement day on or after their date.
+        Every account and contract is computed in one batch of grouped vector operations.
+        """
+        trades = self.load_trades(demat_account_ids, start_date, end_date)
+        if trades.empty:
+            return pd.DataFrame(columns=MTM_COLUMNS)
+        trades['instrument_id'] = trades['instrument_id'].astype(int)
+        trades['expiry_day'] = trades['expiry_date'].astype(str).str[:10]
+        trades['day'] = pd.to_datetime(trades['date'].astype(str).str[:10])
+
+        prices = self.load_prices(trades['instrument_id'].unique().tolist(), start_date, end_date)
+        if prices.empty:
+            return pd.DataFrame(columns=MTM_COLUMNS)
+        prices['day'] = pd.to_datetime(prices['date'])
+        prices = prices.sort_values(CONTRACT_KEY + ['day']).reset_index(drop=True)
+        prices['previous_price'] = prices.groupby(CONTRACT_KEY)['settlement_price'].shift()
+
+        # Book each trade on the first settlement day on or after its trade date
+        booked = pd.merge_asof(
+            trades.sort_values('day'),
+            prices[CONTRACT_KEY + ['day']].rename(columns={'day': 'settlement_day'}).sort_values('settlement_day'),
+            left_on='day', right_on='settlement_day', by=CONTRACT_KEY, direction='forward'
+        ).dropna(subset=['settlement_day'])
+        if booked.empty:
+            return pd.DataFrame(columns=MTM_COLUMNS)
+        signed = np.where(booked['transaction_type'] == 'BUY', booked['num_shares'], -booked['num_shares'])
+        position_key = ['demat_account_id'] + CONTRACT_KEY
+        flows = booked.assign(traded_quantity=signed, traded_value=signed * booked['rate']).groupby(
+            position_key + ['settlement_day']
+        ).agg(traded_quantity=('traded_quantity', 'sum'), traded_value=('traded_value', 'sum')).reset_index()
+        labels = booked.groupby(position_key)[['scrip_name', 'transaction_category']].last().reset_index()
+
+        # Every settlement day of each position's contract from its first trade onwards
+        first_day = flows.groupby(position_key)['settlement_day'].min().rename('first_day').reset_index()
+        grid = first_day.merge(prices, on=CONTRACT_KEY)
+        grid = grid[grid['day'] >= grid['first_day']]
+        grid = grid.merge(
+            flows.rename(columns={'settlement_day': 'day'}), on=position_key + ['day'], how='left'
+        ).fillna({'traded_quantity': 0, 'traded_value': 0.0})
+        grid = grid.sort_values(position_key + ['day']).reset_index(drop=True)
+        grid['quantity'] = grid.groupby(position_key)['traded_quantity'].cumsum()
+        previous_quantity = grid['quantity'] - grid['traded_quantity']
+        previous_value = np.where(previous_quantity == 0, 0.0, previous_quantity * grid['previous_price'])
+        grid['mtm'] = grid['quantity'] * grid['settlement_price'] - previous_value - grid['traded_value']
+
+        in_range = (grid['day'] >= pd.Timestamp(start_date)) & (grid['day'] <= pd.Timestamp(end_date))
+        active = (previous_quantity != 0) | (grid['traded_quantity'] != 0)
+        report = grid[in_range & active].merge(labels, on=position_key, how='left')
+        report['quantity'] = report['quantity'].astype(int)
+        report['traded_quantity'] = report['traded_quantity'].astype(int)
+        return report[MTM_COLUMNS].reset_index(drop=True)
@@ -3,9 +3,9 @@ import pandas as pd
 import math
 from datetime import datetime
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Optional
 from .database import DatabaseManager, Transaction
-from ui.charges import Charges
+from .fno_pnl import fifo_match, open_contracts
 
 @dataclass
 class PurchaseLot:
@@ -22,6 +22,7 @@ class PortfolioItem:
     average_price: float
     total_value: float
     transaction_category: str
+    instrument_id: Optional[int] = None
 
 class PortfolioManager:
     def __init__(self, db_manager: DatabaseManager):
@@ -41,18 +42,29 @@ class PortfolioManager:
             sqlite3.register_adapter(datetime, lambda x: x.isoformat())
             sqlite3.register_converter("DATE", lambda x: datetime.fromisoformat(x.decode()))
             
+            # Charges were materialized per transaction when it was written
             df = pd.read_sql_query(
-                "SELECT * FROM transactions WHERE demat_account_id = ? ORDER BY date, scrip_name",
+                """
+                SELECT t.*, COALESCE(cb.total_charges, 0) AS charges
+                FROM transactions t
+                LEFT JOIN charge_breakdowns cb ON cb.transaction_id = t.id
+                WHERE t.demat_account_id = ?
+                ORDER BY t.date, t.instrument_id
+                """,
                 conn,
                 params=(demat_account_id,)
             )
 
-        # Dictionary to store purchase lots for each scrip (FIFO tracking)
-        purchase_lots: Dict[str, List[PurchaseLot]] = {}
+        # Holdings are keyed by integer instrument id (one instrument per symbol and category)
+        df['instrument_id'] = df['instrument_id'].fillna(-1).astype(int)
+        df['old_instrument_id'] = df['old_instrument_id'].fillna(-1).astype(int)
+
+        # Dictionary to store purchase lots for each instrument (FIFO tracking)
+        purchase_lots: Dict[int, List[PurchaseLot]] = {}
         # Dictionary to store short positions (negative quantities)
-        short_positions: Dict[str, float] = {}
-        
-        charges = Charges(self.db_manager)
+        short_positions: Dict[int, float] = {}
+        # Scrip name and category to display for each instrument
+        instrument_labels: Dict[int, tuple] = {}
 
         for _, row in df.iterrows():
             scrip = row['scrip_name']
@@ -60,26 +72,14 @@ class PortfolioManager:
             price = row['rate']
             trans_type = row['transaction_type'].upper()
             category = row['transaction_category']
-            exchange = row.get('exchange', 'NSE')
             date = str(row['date'])
             
-            # Create a composite key for scrip + category
-            portfolio_key = f"{scrip}_{category}"
+            portfolio_key = row['instrument_id']
+            instrument_labels[portfolio_key] = (scrip, category)
             
             # Calculate effective price (including charges)
-            base_amount = quantity * price
             if trans_type in ['BUY', 'SELL', 'BUYBACK'] or category == 'EQUITY':
-                charge_category = category.replace(" ", "_")
-                
-                if category in ["F&O EQUITY", "F&O COMMODITY"]:
-                    instrument_type = row.get('instrument_type', 'FUT')
-                    charge_instrument_type = "OPT" if instrument_type in ["CE", "PE"] else "FUT"
-                else:
-                    charge_instrument_type = "EQUITY"
-                
-                _, total_charges = charges.calculate_charges(
-                    base_amount, trans_type, exchange, charge_category, charge_instrument_type
-                )
+                total_charges = row['charges']
                 
                 # Prevent division by zero - if quantity is 0, use original price
                 if quantity == 0:
@@ -183,9 +183,8 @@ class PortfolioManager:
 
             elif trans_type == 'MERGER & ACQUISITION':
                 # Handle merger - remove old scrip and add new scrip
-                old_scrip = row.get('old_scrip_name')
-                if old_scrip:
-                    old_portfolio_key = f"{old_scrip}_{category}"
+                old_portfolio_key = row['old_instrument_id']
+                if old_portfolio_key != -1:
                     if old_portfolio_key in purchase_lots:
                         purchase_lots[old_portfolio_key] = []
                         short_positions[old_portfolio_key] = 0
@@ -202,8 +201,7 @@ class PortfolioManager:
             if not lots and short_positions[portfolio_key] == 0:
                 continue
                 
-            scrip_name = portfolio_key.split('_')[0]
-            category = '_'.join(portfolio_key.split('_')[1:])
+            scrip_name, category = instrument_labels[portfolio_key]
             
             # Calculate portfolio values
             total_quantity = sum(lot.quantity for lot in lots) + short_positions[portfolio_key]
@@ -239,7 +237,8 @@ class PortfolioManager:
                             quantity=int(total_quantity),
                             average_price=avg_price,
                             total_value=total_quantity * avg_price,
-                            transaction_category=category.replace('_', ' ')
+                            transaction_category=category,
+                            instrument_id=int(portfolio_key)
                         ))
                     else:
                         # Short position
@@ -248,7 +247,51 @@ class PortfolioManager:
                             quantity=int(total_quantity),
                             average_price=avg_price,
                             total_value=total_quantity * avg_price,
-                            transaction_category=category.replace('_', ' ')
+                            transaction_category=category,
+                            instrument_id=int(portfolio_key)
                         ))
 
-        return portfolio_items
\ No newline at end of file
+        return portfolio_items
+
+    def get_open_fno_positions(self, demat_account_id: int) -> pd.DataFrame:
+        """Open F&O positions per contract, matched FIFO over the account's F&O trades.
+        Quantity is negative for short positions."""
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            df = pd.read_sql_query(
+                """
+                SELECT t.*, COALESCE(cb.total_charges, 0) AS charges
+                FROM transactions t
+                LEFT JOIN charge_breakdowns cb ON cb.transaction_id = t.id
+                WHERE t.demat_account_id = ?
+                AND t.transaction_category != 'EQUITY'
+                ORDER BY t.date, t.id
+                """,
+                conn,
+                params=(demat_account_id,)
+            )
+        return open_contracts(fifo_match(df).open_lots)
+
+    def get_equity_flows(self, demat_account_id: int) -> pd.DataFrame:
+        """Equity holdings changes in date order: signed quantity and net cash put in per transaction.
+
+        Buys, IPOs and rights add shares for their amount; sells and buybacks remove shares and
+        return their amount. Bonus, demerger and merger shares come without cash; a merger's
+        old_scrip_name is the scrip whose holding it closes.
+        """
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            df = pd.read_sql_query(
+                """
+                SELECT scrip_name, old_scrip_name, date, transaction_type, num_shares, amount
+                FROM transactions
+                WHERE demat_account_id = ? AND transaction_category = 'EQUITY'
+                ORDER BY date, id
+                """,
+                conn,
+                params=(demat_account_id,)
+            )
+        df['date'] = pd.to_datetime(df['date'].astype(str).str[:10])
+        is_sell = df['transaction_type'].isin(['SELL', 'BUYBACK'])
+        is_paid = df['transaction_type'].isin(['BUY', 'IPO', 'RIGHT'])
+        df['quantity'] = df['num_shares'].where(~is_sell, -df['num_shares'])
+        df['cash_flow'] = df['amount'].where(is_paid, 0.0).where(~is_sell, -df['amount'])
+        return df[['scrip_name', 'old_scrip_name', 'date', 'transaction_type', 'quantity', 'cash_flow']]
@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import glob
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+from .prices import read_eod_prices
+
+# Store location, relative to the working directory like the other local data files
+PRICE_HISTORY_DIR = 'price_history'
+
+# One [symbol x trading day] array per field; close is always present
+PRICE_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+class PriceHistory:
+    """Columnar daily price store built from end-of-day CSVs.
+
+    Each field is a float64 .npy array with one row per symbol and one column per trading
+    day (NaN where there is no price), opened memory-mapped so only the rows a query touches
+    are read from disk. symbols.json and days.npy map symbols to rows and days to columns;
+    opening the store reads only those two small files.
+    """
+
+    def __init__(self, directory: str = PRICE_HISTORY_DIR):
+        self.directory = directory
+        with open(os.path.join(directory, 'symbols.json')) as f:
+            self.symbols: List[str] = json.load(f)
+        self.days: np.ndarray = np.load(os.path.join(directory, 'days.npy'))
+        self.symbol_rows = pd.Index(self.symbols)
+        self._fields = {}
+
+    @staticmethod
+    def exists(directory: str = PRICE_HISTORY_DIR) -> bool:
+        return os.path.exists(os.path.join(directory, 'close.npy'))
+
+    def field(self, name: str = 'close') -> np.ndarray:
+        """The memory-mapped [symbol x day] array of one field"""
+        if name not in self._fields:
+            self._fields[name] = np.load(os.path.join(self.directory, f'{name}.npy'), mmap_mode='r')
+        return self._fields[name]
+
+    def rows(self, symbols: Iterable[str]) -> np.ndarray:
+        """Row of each symbol, -1 for symbols not in the store"""
+        return self.symbol_rows.get_indexer(list(symbols))
+
+    def prices(self, symbols: Iterable[str], field: str = 'close') -> np.ndarray:
+        """[symbol x day] prices of the given symbols, carried forward over days without a price.
+
+        Days before a symbol's first price, and symbols not in the store, are NaN.
+        """
+        rows = self.rows(symbols)
+        known = rows >= 0
+        prices = np.full((len(rows), len(self.days)), np.nan)
+        if known.any():
+            prices[known] = self.field(field)[rows[known]]
+        # Forward fill: each day takes the price of the latest day with one
+        latest = np.where(np.isnan(prices), 0, np.arange(len(self.days)))
+        np.maximum.accumulate(latest, axis=1, out=latest)
+        return np.take_along_axis(prices, latest, axis=1)
+
+    @classmethod
+    def build(cls, files: Iterable, directory: str = PRICE_HISTORY_DIR) -> 'PriceHistory':
+        """Rebuild the store from end-of-day CSV files (any layout read_eod_prices accepts).
+
+        The arrays are written to a staging directory that replaces the store when complete.
+        """
+        frames = []
+        for file in files:
+            try:
+                frames.append(read_eod_prices(file))
+            except ValueError as e:
+                raise ValueError(f"{getattr(file, 'name', file)}: {e}") from e
+        if not frames:
+            raise ValueError("No price files to import")
+        prices = pd.concat(frames, ignore_index=True).drop_duplicates(['scrip_name', 'date'], keep='last')
+        symbols, symbol_codes = np.unique(prices['scrip_name'].to_numpy(dtype=str), return_inverse=True)
+        days, day_codes = np.unique(prices['date'].to_numpy(dtype='datetime64[D]'), return_inverse=True)
+
+        staging = directory.rstrip('/\\') + '.building'
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        for name in PRICE_FIELDS:
+            if name not in prices.columns:
+                continue
+            array = np.lib.format.open_memmap(
+                os.path.join(staging, f'{name}.npy'), mode='w+', dtype=np.float64, shape=(len(symbols), len(days))
+            )
+            array[:] = np.nan
+            array[symbol_codes, day_codes] = prices[name].to_numpy(dtype=float)
+            array.flush()
+            del array
+        np.save(os.path.join(staging, 'days.npy'), days)
+        with open(os.path.join(staging, 'symbols.json'), 'w') as f:
+            json.dump(symbols.tolist(), f)
+
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+        return cls(directory)
+
+@dataclass
+class PerformanceResult:
+    """Daily portfolio curves from the first trade on, indexed by trading day.
+
+    curve has value (holdings at closing prices), invested (net cash put in), twr_index
+    (time-weighted return, starting at 100) and drawdown (of twr_index from its running peak).
+    unpriced lists held symbols with no prices in the store; they are valued at zero.
+    """
+    curve: pd.DataFrame
+    unpriced: List[str] = field(default_factory=list)
+
+def equity_curve(history: PriceHistory, flows: pd.DataFrame) -> PerformanceResult:
+    """Value an account's holdings on every trading day in the store.
+
+    `flows` is PortfolioManager.get_equity_flows output. Quantities are accumulated into a
+    [symbol x day] holdings matrix with one cumulative sum and multiplied against the
+    forward-filled closes of just the held symbols. Flows on non-trading days count from the
+    next trading day; flows after the store's last day are ignored.
+    """
+    if flows.empty or len(history.days) == 0:
+        return PerformanceResult(pd.DataFrame(columns=['value', 'invested', 'twr_index', 'drawdown']))
+    day_index = np.searchsorted(history.days, flows['date'].to_numpy(dtype='datetime64[D]'), side='left')
+    flows = flows[day_index < len(history.days)].reset_index(drop=True)
+    day_index = day_index[day_index < len(history.days)]
+    if flows.empty:
+        return PerformanceResult(pd.DataFrame(columns=['value', 'invested', 'twr_index', 'drawdown']))
+
+    symbols = pd.Index(sorted(set(flows['scrip_name']) | set(flows['old_scrip_name'].dropna())))
+    symbol_index = symbols.get_indexer(flows['scrip_name'])
+    quantity = np.zeros((len(symbols), len(history.days)))
+    np.add.at(quantity, (symbol_index, day_index), flows['quantity'].to_numpy(dtype=float))
+    np.cumsum(quantity, axis=1, out=quantity)
+
+    # A merger closes the whole holding of the old scrip on its day
+    mergers = flows['transaction_type'] == 'MERGER & ACQUISITION'
+    for old_scrip, day in zip(flows.loc[mergers, 'old_scrip_name'], day_index[mergers.to_numpy()]):
+        if isinstance(old_scrip, str):
+            row = symbols.get_loc(old_scrip)
+            quantity[row, day:] -= quantity[row, day]
+
+    closes = history.prices(symbols)
+    unpriced = np.isnan(closes).all(axis=1) & (quantity != 0).any(axis=1)
+    value = (quantity * np.nan_to_num(closes)).sum(axis=0)
+    cash = np.zeros(len(history.days))
+    np.add.at(cash, day_index, flows['cash_flow'].to_numpy(dtype=float))
+    # Returns only see cash that went into (or came out of) holdings with a price that day
+    priced_cash = np.zeros(len(history.days))
+    priced_flow = ~np.isnan(closes[symbol_index, day_index])
+    np.add.at(priced_cash, day_index[priced_flow], flows['cash_flow'].to_numpy(dtype=float)[priced_flow])
+
+    start = day_index.min()
+    value, cash, priced_cash = value[start:], cash[start:], priced_cash[start:]
+    # Daily return net of that day's cash flow; no return while nothing is held
+    previous = np.concatenate([[0.0], value[:-1]])
+    daily_return = np.divide(value - priced_cash, previous, out=np.ones_like(value), where=previous > 0) - 1
+    twr_index = 100 * np.cumprod(1 + daily_return)
+    curve = pd.DataFrame({
+        'value': value,
+        'invested': np.cumsum(cash),
+        'twr_index': twr_index,
+        'drawdown': twr_index / np.maximum.accumulate(twr_index) - 1
+    }, index=pd.DatetimeIndex(history.days[start:], name='date'))
+    return PerformanceResult(curve, symbols[unpriced].tolist())
+
+def benchmark_index(history: PriceHistory, symbol: str, days: pd.DatetimeIndex) -> pd.Series:
+    """A symbol's closes over the given trading days, rebased to 100 on its first price"""
+    closes = pd.Series(history.prices([symbol])[0], index=pd.DatetimeIndex(history.days)).reindex(days)
+    first = closes.first_valid_index()
+    if first is None:
+        return closes
+    return 100 * closes / closes[first]
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog='python -m models.price_history',
+        description='Build the memory-mapped price history store from end-of-day CSV files'
+    )
+    parser.add_argument('paths', nargs='+', help='CSV files, or directories of CSV files')
+    parser.add_argument('--output', default=PRICE_HISTORY_DIR, help=f'Store directory (default: {PRICE_HISTORY_DIR})')
+    args = parser.parse_args(argv)
+    files = []
+    for path in args.paths:
+        files.extend(sorted(glob.glob(os.path.join(path, '*.csv'))) if os.path.isdir(path) else [path])
+    try:
+        history = PriceHistory.build(files, args.output)
+    except (ValueError, OSError) as e:
+        sys.exit(f"Error building price history: {e}")
+    print(f"Built {args.output}: {len(history.symbols)} symbol(s) x {len(history.days)} trading day(s) "
+          f"from {len(files)} file(s)")
+
+if __name__ == '__main__':
+    main()
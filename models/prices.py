@@ -0,0 +1,98 @@
+import json
+import sqlite3
+import pandas as pd
+from typing import BinaryIO, List
+from .database import DatabaseManager, normalize_symbol
+
+# End-of-day price column -> accepted headers (NSE CM bhavcopy, NSE UDiFF, NSE index closes and plain names)
+EOD_COLUMNS = {
+    'scrip_name': ['scrip_name', 'symbol', 'tckrsymb', 'index name'],
+    'date': ['date', 'timestamp', 'traddt', 'index date'],
+    'close': ['close', 'clspric', 'close_price', 'closing index value']
+}
+
+# Optional end-of-day columns, read when the file has them
+OPTIONAL_EOD_COLUMNS = {
+    'open': ['open', 'opnpric', 'open_price', 'open index value'],
+    'high': ['high', 'hghpric', 'high_price', 'high index value'],
+    'low': ['low', 'lwpric', 'low_price', 'low index value'],
+    'volume': ['volume', 'tottrdqty', 'ttltradgvol']
+}
+
+# Optional series column; when present only ordinary equity series are kept
+EOD_SERIES_COLUMNS = ['series', 'sctysrs']
+EQUITY_SERIES = ('EQ', 'BE', 'BZ')
+
+def read_eod_prices(file: BinaryIO) -> pd.DataFrame:
+    """Read closing prices from an end-of-day CSV (e.g. an exchange bhavcopy).
+
+    Returns scrip_name, date (YYYY-MM-DD) and close, plus any of open, high, low and volume
+    the file has, one row per symbol and date.
+    """
+    raw = pd.read_csv(file, dtype=str, skipinitialspace=True)
+    headers = {str(column).strip().lower(): column for column in raw.columns}
+    columns = {}
+    for target, aliases in EOD_COLUMNS.items():
+        source = next((headers[alias] for alias in aliases if alias in headers), None)
+        if source is None:
+            raise ValueError(f"Price file is missing a '{target}' column (accepted headers: {', '.join(aliases)})")
+        columns[target] = raw[source].str.strip()
+    for target, aliases in OPTIONAL_EOD_COLUMNS.items():
+        source = next((headers[alias] for alias in aliases if alias in headers), None)
+        if source is not None:
+            columns[target] = raw[source].str.strip()
+    prices = pd.DataFrame(columns)
+
+    series = next((headers[alias] for alias in EOD_SERIES_COLUMNS if alias in headers), None)
+    if series is not None:
+        prices = prices[raw[series].str.strip().str.upper().isin(EQUITY_SERIES)]
+
+    trade_date = pd.to_datetime(prices['date'], errors='coerce', dayfirst=True, format='mixed')
+    close = pd.to_numeric(prices['close'].str.replace(',', ''), errors='coerce')
+    invalid = prices['scrip_name'].isna() | trade_date.isna() | ~(close > 0)
+    if invalid.any():
+        raise ValueError(f"Price file has a missing symbol, invalid date or invalid close on row(s): "
+                         f"{', '.join(str(row + 2) for row in prices.index[invalid][:10])}")
+    result = pd.DataFrame({
+        'scrip_name': prices['scrip_name'].map(normalize_symbol),
+        'date': trade_date.dt.strftime('%Y-%m-%d'),
+        'close': close
+    })
+    for column in OPTIONAL_EOD_COLUMNS:
+        if column in prices.columns:
+            result[column] = pd.to_numeric(prices[column].str.replace(',', ''), errors='coerce')
+    return result.drop_duplicates(['scrip_name', 'date'], keep='last').reset_index(drop=True)
+
+class PriceStore:
+    """End-of-day equity closing prices, keyed by instrument and date"""
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+
+    def import_files(self, files: List[BinaryIO], exchange: str = 'NSE') -> int:
+        """Upsert the closes of several end-of-day files in one database transaction"""
+        if not files:
+            return 0
+        prices = pd.concat([read_eod_prices(file) for file in files], ignore_index=True)
+        prices = prices.drop_duplicates(['scrip_name', 'date'], keep='last')
+        return self.db_manager.save_prices(prices.assign(transaction_category='EQUITY', exchange=exchange))
+
+    def latest_prices(self, instrument_ids: List[int]) -> pd.DataFrame:
+        """Latest close, its date and the close before it for each instrument that has prices.
+
+        One query; each lookup is a seek on the (instrument_id, date) key, which covers close.
+        """
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            return pd.read_sql_query(
+                '''
+                SELECT p.instrument_id, p.date AS price_date, p.close,
+                       (SELECT q.close FROM prices q
+                        WHERE q.instrument_id = p.instrument_id AND q.date < p.date
+                        ORDER BY q.date DESC LIMIT 1) AS previous_close
+                FROM json_each(?) h
+                JOIN prices p ON p.instrument_id = h.value
+                AND p.date = (SELECT MAX(m.date) FROM prices m WHERE m.instrument_id = h.value)
+                ''',
+                conn,
+                params=(json.dumps([int(instrument_id) for instrument_id in instrument_ids]),)
+            )
@@ -0,0 +1,174 @@
+import sqlite3
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+from .database import DatabaseManager
+from .realized_pnl import RealizedPnL, TRANSACTION_CATEGORIES, unmatched_lots
+from .turnover import audit_turnover
+
+# Column dtypes of each P&L table; every result frame has exactly these columns and dtypes,
+# empty or not, so callers can rely on them without checks
+TOTALS_DTYPES = {
+    'term_type': 'object', 'lots': 'int64', 'quantity': 'int64', 'profit_loss': 'float64', 'turnover': 'float64'
+}
+
+DELIVERY_DTYPES = {
+    'scrip_name': 'object', 'quantity': 'int64', 'sale_date': 'datetime64[ns]', 'sale_price': 'float64',
+    'purchase_date': 'datetime64[ns]', 'purchase_price': 'float64', 'purchase_type': 'object',
+    'profit_loss': 'float64', 'term_type': 'object', 'transaction_type': 'object'
+}
+
+INTRADAY_DTYPES = {
+    'scrip_name': 'object', 'date': 'datetime64[ns]', 'quantity': 'int64', 'buy_price': 'float64',
+    'sell_price': 'float64', 'buy_value': 'float64', 'sell_value': 'float64', 'profit_loss': 'float64',
+    'turnover': 'float64'
+}
+
+CONTRACT_DTYPES = {
+    'scrip_name': 'object', 'expiry_date': 'datetime64[ns]', 'instrument_type': 'object', 'strike_price': 'float64',
+    'transaction_category': 'object', 'position': 'object', 'quantity': 'int64', 'open_date': 'datetime64[ns]',
+    'open_price': 'float64'
+}
+
+MATCHED_DTYPES = {
+    **CONTRACT_DTYPES, 'close_date': 'datetime64[ns]', 'close_price': 'float64', 'profit_loss': 'float64'
+}
+
+OPEN_LOT_DTYPES = CONTRACT_DTYPES
+
+TURNOVER_DTYPES = {
+    'demat_account_id': 'int64', 'transaction_category': 'object', 'financial_year': 'object',
+    'closing_trades': 'int64', 'profit_loss': 'float64', 'absolute_profit_loss': 'float64',
+    'option_sell_premium': 'float64', 'turnover': 'float64', 'audit_limit': 'float64'
+}
+
+SUMMARY_DTYPES = {'transaction_category': 'object', **TOTALS_DTYPES, 'trades': 'int64', 'open_lots': 'int64'}
+
+# Statements per (database, account, category), tagged with the transactions data version
+# they were built from
+_statement_cache: Dict[Tuple[str, int, str], Tuple[int, 'CategoryPnL']] = {}
+
+def typed(frame: pd.DataFrame, dtypes: Dict[str, str]) -> pd.DataFrame:
+    """frame with exactly the given columns, in order, cast to their dtypes"""
+    return frame.reindex(columns=list(dtypes)).astype(dtypes).reset_index(drop=True)
+
+@dataclass(frozen=True)
+class CategoryPnL:
+    """Realized P&L statement of one account in one category.
+
+    Tables follow the *_DTYPES schemas. Equity fills delivery and intraday; F&O fills
+    matched, open_lots and turnover; the other tables are empty. totals has one row per
+    term_type (None for F&O). Statements are memoized and shared between callers, so the
+    frames must not be modified in place.
+    """
+    transaction_category: str
+    trades: int
+    totals: pd.DataFrame
+    delivery: pd.DataFrame
+    intraday: pd.DataFrame
+    matched: pd.DataFrame
+    open_lots: pd.DataFrame
+    turnover: pd.DataFrame
+
+    @property
+    def profit_loss(self) -> float:
+        return float(self.totals['profit_loss'].sum())
+
+def category_statement(transaction_category: str, trades: pd.DataFrame, lots: pd.DataFrame,
+                       totals: pd.DataFrame) -> CategoryPnL:
+    """Build a CategoryPnL from a category's trades (with charges), realized_pnl lots and totals"""
+    empty = {name: typed(pd.DataFrame(), dtypes) for name, dtypes in [
+        ('delivery', DELIVERY_DTYPES), ('intraday', INTRADAY_DTYPES), ('matched', MATCHED_DTYPES),
+        ('open_lots', OPEN_LOT_DTYPES), ('turnover', TURNOVER_DTYPES)
+    ]}
+    if transaction_category == 'EQUITY':
+        intraday = lots['term_type'] == 'INTRADAY'
+        delivery = lots[~intraday].rename(columns={
+            'close_date': 'sale_date', 'close_price': 'sale_price', 'open_date': 'purchase_date',
+            'open_price': 'purchase_price', 'open_type': 'purchase_type', 'close_type': 'transaction_type'
+        })
+        squared_off = lots[intraday]
+        tables = {
+            **empty,
+            'delivery': typed(delivery, DELIVERY_DTYPES),
+            'intraday': typed(squared_off.assign(
+                date=squared_off['close_date'],
+                buy_price=squared_off['open_price'],
+                sell_price=squared_off['close_price'],
+                buy_value=squared_off['open_price'] * squared_off['quantity'],
+                sell_value=squared_off['close_price'] * squared_off['quantity'],
+                turnover=squared_off['profit_loss'].abs()
+            ), INTRADAY_DTYPES)
+        }
+    else:
+        tables = {
+            **empty,
+            'matched': typed(lots, MATCHED_DTYPES),
+            'open_lots': typed(unmatched_lots(trades, lots), OPEN_LOT_DTYPES),
+            'turnover': typed(audit_turnover(trades, lots), TURNOVER_DTYPES)
+        }
+    return CategoryPnL(transaction_category, len(trades), typed(totals, TOTALS_DTYPES), **tables)
+
+class PnLStatements:
+    """Realized P&L statements per account and category, for the P&L pages, exports and summaries.
+
+    Statements come from the realized_pnl ledger (refreshed first) and are memoized per
+    account and category until the transactions data version changes, so repeated reads
+    cost one version lookup.
+    """
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+        self.ledger = RealizedPnL(db_manager)
+
+    def category(self, demat_account_id: int, transaction_category: str) -> CategoryPnL:
+        """One category's statement"""
+        return self.account(demat_account_id, [transaction_category])[transaction_category]
+
+    def account(self, demat_account_id: int, categories: List[str] = TRANSACTION_CATEGORIES) -> Dict[str, CategoryPnL]:
+        """Statements of the given categories of an account.
+
+        Categories not memoized for the current data version are built together: one ledger
+        refresh, then the account's trades and each category's lots and totals read in one
+        read transaction, so they are one snapshot even while trades are being written, then
+        the categories concurrently in a thread pool (the pandas/NumPy kernels release the GIL).
+        A write landing between the refresh and the read leaves its scrip's lots a step behind
+        until the next refresh; the statement is then tagged with the older data version, so
+        the next call rebuilds it.
+        """
+        version = self.db_manager.get_data_version()
+        statements = {}
+        for category in categories:
+            cached = _statement_cache.get((self.db_manager.db_name, demat_account_id, category))
+            if cached is not None and cached[0] == version:
+                statements[category] = cached[1]
+        missing = [category for category in categories if category not in statements]
+        if missing:
+            self.ledger.refresh()
+            with sqlite3.connect(self.db_manager.db_name) as conn:
+                conn.execute('BEGIN')
+                trades = self.ledger.trades(demat_account_id, missing[0] if len(missing) == 1 else None, conn)
+                inputs = {category: (
+                    trades[trades['transaction_category'] == category],
+                    self.ledger.lots(demat_account_id, category, conn),
+                    self.ledger.totals(demat_account_id, category, conn)
+                ) for category in missing}
+            with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+                built = pool.map(lambda category: category_statement(category, *inputs[category]), missing)
+                for category, statement in zip(missing, built):
+                    _statement_cache[(self.db_manager.db_name, demat_account_id, category)] = (version, statement)
+                    statements[category] = statement
+        return {category: statements[category] for category in categories}
+
+    def summary(self, demat_account_id: int) -> pd.DataFrame:
+        """Per category and term type: lots, quantity, profit, absolute profit, trades and open lots"""
+        statements = self.account(demat_account_id)
+        # A category with trades but nothing realized yet still gets a (zero) row
+        nothing_realized = pd.DataFrame({'lots': [0], 'quantity': [0], 'profit_loss': [0.0], 'turnover': [0.0]})
+        summary = pd.concat([
+            (statement.totals if not statement.totals.empty else nothing_realized).assign(
+                transaction_category=category, trades=statement.trades, open_lots=len(statement.open_lots)
+            ) for category, statement in statements.items() if statement.trades
+        ], ignore_index=True) if any(statement.trades for statement in statements.values()) else pd.DataFrame()
+        return typed(summary, SUMMARY_DTYPES)
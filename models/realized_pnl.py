@@ -0,0 +1,227 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from .database import DatabaseManager
+from .equity_pnl import classify_trades, match_equity_lots
+from .fno_pnl import fifo_match, CONTRACT_COLUMNS, OPEN_LOT_COLUMNS
+
+TRANSACTION_CATEGORIES = ['EQUITY', 'F&O EQUITY', 'F&O COMMODITY']
+
+# A scrip's ledger: one account's trades of one instrument in one category
+SCRIP_KEY = ['demat_account_id', 'transaction_category', 'instrument_id']
+
+REALIZED_PNL_COLUMNS = SCRIP_KEY + [
+    'scrip_name', 'expiry_date', 'instrument_type', 'strike_price', 'position', 'term_type', 'quantity',
+    'open_id', 'open_type', 'open_date', 'open_price', 'close_id', 'close_type', 'close_date', 'close_price',
+    'profit_loss'
+]
+
+def _days(values: pd.Series) -> pd.Series:
+    """Dates of any stored format as YYYY-MM-DD text (None where missing)"""
+    days = pd.to_datetime(values.astype(str).str[:10], errors='coerce').dt.strftime('%Y-%m-%d')
+    return days.astype(object).where(days.notna(), None)
+
+def realized_lots(transactions: pd.DataFrame) -> pd.DataFrame:
+    """Matched lot pairs of any mix of accounts and categories, as realized_pnl rows.
+
+    Equity trades are split by classify_trades: each intraday square-off is one INTRADAY
+    row (without trade ids) and delivery trades are matched by match_equity_lots. F&O
+    trades are matched by fifo_match per account; their prices carry the stored charges.
+    """
+    frames = []
+    equity = transactions[transactions['transaction_category'] == 'EQUITY']
+    if not equity.empty:
+        trades = classify_trades(equity)
+        delivery = match_equity_lots(trades.delivery)
+        frames.append(pd.DataFrame({
+            'demat_account_id': delivery['demat_account_id'],
+            'transaction_category': 'EQUITY',
+            'instrument_id': delivery['instrument_id'],
+            'scrip_name': delivery['scrip_name'],
+            'position': 'LONG',
+            'term_type': delivery['term_type'],
+            'quantity': delivery['quantity'],
+            'open_id': delivery['purchase_id'],
+            'open_type': delivery['purchase_type'],
+            'open_date': delivery['purchase_date'],
+            'open_price': delivery['purchase_price'],
+            'close_id': delivery['sale_id'],
+            'close_type': delivery['transaction_type'],
+            'close_date': delivery['sale_date'],
+            'close_price': delivery['sale_price'],
+            'profit_loss': delivery['profit_loss']
+        }))
+        intraday = trades.intraday
+        frames.append(pd.DataFrame({
+            'demat_account_id': intraday['demat_account_id'],
+            'transaction_category': 'EQUITY',
+            'instrument_id': intraday['instrument_id'],
+            'scrip_name': intraday['scrip_name'],
+            'position': 'LONG',
+            'term_type': 'INTRADAY',
+            'quantity': intraday['quantity'],
+            'open_type': 'BUY',
+            'open_date': intraday['date'],
+            'open_price': intraday['buy_price'],
+            'close_type': 'SELL',
+            'close_date': intraday['date'],
+            'close_price': intraday['sell_price'],
+            'profit_loss': intraday['profit_loss']
+        }))
+    fno = transactions[transactions['transaction_category'] != 'EQUITY']
+    for account_id, account_trades in fno.groupby('demat_account_id'):
+        matched = fifo_match(account_trades).matched
+        long_lots = matched['position'] == 'LONG'
+        frames.append(matched.assign(
+            demat_account_id=account_id,
+            open_type=np.where(long_lots, 'BUY', 'SELL'),
+            close_type=np.where(long_lots, 'SELL', 'BUY')
+        ))
+
+    frames = [frame.reindex(columns=REALIZED_PNL_COLUMNS) for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=REALIZED_PNL_COLUMNS)
+    lots = pd.concat(frames, ignore_index=True)
+    lots['instrument_id'] = lots['instrument_id'].fillna(-1).astype(int)
+    for column in ['expiry_date', 'open_date', 'close_date']:
+        lots[column] = _days(lots[column])
+    return lots
+
+def unmatched_lots(trades: pd.DataFrame, lots: pd.DataFrame) -> pd.DataFrame:
+    """Open F&O lots (as fifo_match's open_lots) from the trades and their matched lots.
+
+    Under FIFO a trade first closes opposite lots and opens a lot with what is left, so a
+    trade's open quantity is its size less what was matched with it on either side; no
+    matching is redone.
+    """
+    trades = trades[trades['transaction_type'].isin(['BUY', 'SELL'])]
+    if trades.empty:
+        return pd.DataFrame(columns=OPEN_LOT_COLUMNS)
+    matched = pd.concat([
+        lots[['open_id', 'quantity']].set_axis(['id', 'quantity'], axis=1),
+        lots[['close_id', 'quantity']].set_axis(['id', 'quantity'], axis=1)
+    ]).groupby('id')['quantity'].sum()
+    open_quantity = trades['num_shares'] - trades['id'].map(matched).fillna(0)
+    is_buy = trades['transaction_type'] == 'BUY'
+    per_unit_charges = trades['charges'].astype(float) / trades['num_shares'].where(trades['num_shares'] != 0, 1)
+    open_lots = trades.assign(
+        position=np.where(is_buy, 'LONG', 'SHORT'),
+        quantity=open_quantity.astype(trades['num_shares'].dtype),
+        expiry_date=pd.to_datetime(trades['expiry_date'].astype(str).str[:10], errors='coerce'),
+        open_date=pd.to_datetime(trades['date'].astype(str).str[:10]),
+        open_price=trades['rate'].astype(float) + per_unit_charges.where(is_buy, -per_unit_charges)
+    )[open_quantity > 0]
+    return open_lots.sort_values(CONTRACT_COLUMNS + ['date', 'id'], kind='stable')[OPEN_LOT_COLUMNS].reset_index(drop=True)
+
+class RealizedPnL:
+    """Persisted ledger of matched lot pairs (realized_pnl), kept current per scrip.
+
+    Database triggers record each scrip whose transactions or charges change, with the
+    earliest trade date touched. refresh recomputes just those scrips and rewrites their
+    lots closed on or after that date; earlier lots cannot change, since a lot's match only
+    depends on trades up to its closing date. lots and totals read the ledger as it is, so
+    callers refresh first (models.profit_loss.PnLStatements does); the readers take an open
+    connection to read several tables in one snapshot.
+    """
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+
+    def refresh(self) -> int:
+        """Bring stale scrips up to date; returns the number of scrips recomputed"""
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            stale = pd.read_sql_query('SELECT * FROM realized_pnl_stale', conn)
+            if stale.empty:
+                return 0
+            transactions = pd.read_sql_query(
+                '''
+                SELECT t.*, COALESCE(cb.total_charges, 0) AS charges
+                FROM realized_pnl_stale s
+                -- CROSS JOIN keeps this join order, so each scrip is an index lookup on transactions
+                CROSS JOIN transactions t ON t.demat_account_id = s.demat_account_id
+                AND t.instrument_id IS NULLIF(s.instrument_id, -1)
+                AND t.transaction_category = s.transaction_category
+                LEFT JOIN charge_breakdowns cb ON cb.transaction_id = t.id
+                ''',
+                conn
+            )
+            # Categories are matched independently, so each is one task for the pool
+            partitions = [trades for _, trades in transactions.groupby('transaction_category')] or [transactions]
+            with ThreadPoolExecutor(max_workers=len(partitions)) as pool:
+                # Categories with nothing matched are left out, so the concat takes its dtypes from real lots
+                matched = [frame for frame in pool.map(realized_lots, partitions) if not frame.empty]
+            lots = pd.concat(matched, ignore_index=True) if matched else pd.DataFrame(columns=REALIZED_PNL_COLUMNS)
+            lots = lots.merge(stale[SCRIP_KEY + ['from_date']], on=SCRIP_KEY)
+            lots = lots[lots['close_date'] >= lots['from_date']][REALIZED_PNL_COLUMNS]
+
+            cursor = conn.cursor()
+            cursor.executemany('''
+                DELETE FROM realized_pnl
+                WHERE demat_account_id = ? AND transaction_category = ? AND instrument_id = ? AND close_date >= ?
+            ''', stale[SCRIP_KEY + ['from_date']].astype(object).itertuples(index=False, name=None))
+            cursor.executemany(f'''
+                INSERT INTO realized_pnl ({', '.join(REALIZED_PNL_COLUMNS)})
+                VALUES ({', '.join('?' * len(REALIZED_PNL_COLUMNS))})
+            ''', lots.astype(object).where(lots.notna(), None).itertuples(index=False, name=None))
+            # A scrip written to again since it was read stays stale for the next refresh
+            cursor.executemany('''
+                DELETE FROM realized_pnl_stale
+                WHERE demat_account_id = ? AND transaction_category = ? AND instrument_id = ? AND version = ?
+            ''', stale[SCRIP_KEY + ['version']].astype(object).itertuples(index=False, name=None))
+            self.db_manager.bump_data_version(cursor, 'realized_pnl')
+            conn.commit()
+        return len(stale)
+
+    def _query(self, sql: str, params: tuple, conn: Optional[sqlite3.Connection], **kwargs) -> pd.DataFrame:
+        """Run a read on the caller's connection (e.g. one read transaction), or on a new one"""
+        if conn is not None:
+            return pd.read_sql_query(sql, conn, params=params, **kwargs)
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            return pd.read_sql_query(sql, conn, params=params, **kwargs)
+
+    def lots(self, demat_account_id: int, transaction_category: str,
+             conn: Optional[sqlite3.Connection] = None) -> pd.DataFrame:
+        """An account's realized lots in one category, oldest close first"""
+        return self._query(
+            '''
+            SELECT * FROM realized_pnl
+            WHERE demat_account_id = ? AND transaction_category = ?
+            ORDER BY close_date, scrip_name, close_id, open_id
+            ''',
+            (demat_account_id, transaction_category),
+            conn,
+            parse_dates=['expiry_date', 'open_date', 'close_date']
+        )
+
+    def totals(self, demat_account_id: int, transaction_category: str,
+               conn: Optional[sqlite3.Connection] = None) -> pd.DataFrame:
+        """Lots, quantity, profit and turnover (sum of absolute profit) per term type"""
+        return self._query(
+            '''
+            SELECT term_type, COUNT(*) AS lots, SUM(quantity) AS quantity,
+                   SUM(profit_loss) AS profit_loss, SUM(ABS(profit_loss)) AS turnover
+            FROM realized_pnl
+            WHERE demat_account_id = ? AND transaction_category = ?
+            GROUP BY term_type
+            ''',
+            (demat_account_id, transaction_category),
+            conn
+        )
+
+    def trades(self, demat_account_id: int, transaction_category: Optional[str] = None,
+               conn: Optional[sqlite3.Connection] = None) -> pd.DataFrame:
+        """An account's transactions with their stored charges, in one category or all of them"""
+        return self._query(
+            '''
+            SELECT t.*, COALESCE(cb.total_charges, 0) AS charges
+            FROM transactions t
+            LEFT JOIN charge_breakdowns cb ON cb.transaction_id = t.id
+            WHERE t.demat_account_id = ?
+            AND (? IS NULL OR t.transaction_category = ?)
+            ORDER BY t.date, t.instrument_id, t.expiry_date, t.instrument_type, t.strike_price
+            ''',
+            (demat_account_id, transaction_category, transaction_category),
+            conn
+        )
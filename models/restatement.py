@@ -0,0 +1,109 @@
+import json
+import sqlite3
+import pandas as pd
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Callable, List, Optional
+from .database import DatabaseManager
+from .charges import ChargesEngine, CHARGED_TRANSACTION_TYPES
+from .settlement import SETTLEMENT_FINGERPRINT_PREFIX
+
+# Number of restated transactions written per database transaction
+CHUNK_SIZE = 5000
+
+# Differences below this are rounding noise, not a rate change
+TOLERANCE = 1e-6
+
+@dataclass
+class RestatementScope:
+    """Which transactions a charge restatement covers; empty filters match everything"""
+    demat_account_ids: List[int]
+    start_date: date
+    end_date: date
+    exchanges: List[str] = field(default_factory=list)
+    categories: List[str] = field(default_factory=list)
+
+@dataclass
+class RestatementResult:
+    rows_restated: int = 0
+    # Sum of new minus old amounts over the restated rows
+    amount_delta: float = 0.0
+
+class ChargeRestatement:
+    """Recompute stored amounts and charge breakdowns of existing transactions with the current rates"""
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+        self.charges = ChargesEngine(db_manager)
+
+    def load(self, scope: RestatementScope) -> pd.DataFrame:
+        """Read the charged transactions in scope with their stored amount and charges"""
+        if not scope.demat_account_ids:
+            return pd.DataFrame()
+        query = '''
+            SELECT t.id, t.demat_account_id, t.date, t.scrip_name, t.transaction_type, t.transaction_category,
+                   t.exchange, t.instrument_type, t.num_shares, t.rate, t.amount AS old_amount,
+                   cb.total_charges AS old_charges
+            FROM transactions t
+            LEFT JOIN charge_breakdowns cb ON cb.transaction_id = t.id
+            WHERE t.demat_account_id IN (SELECT value FROM json_each(?))
+            AND t.date >= ? AND t.date < ?
+            AND t.transaction_type IN (SELECT value FROM json_each(?))
+            AND (t.fingerprint IS NULL OR t.fingerprint NOT LIKE ? || '%')
+        '''
+        params = [
+            json.dumps([int(account_id) for account_id in scope.demat_account_ids]),
+            scope.start_date.isoformat(),
+            # Exclusive upper bound so timestamps on the end date are included
+            (scope.end_date + timedelta(days=1)).isoformat(),
+            json.dumps(list(CHARGED_TRANSACTION_TYPES)),
+            # Expiry settlements carry no charges
+            SETTLEMENT_FINGERPRINT_PREFIX
+        ]
+        if scope.exchanges:
+            query += ' AND t.exchange IN (SELECT value FROM json_each(?))'
+            params.append(json.dumps(scope.exchanges))
+        if scope.categories:
+            query += ' AND t.transaction_category IN (SELECT value FROM json_each(?))'
+            params.append(json.dumps(scope.categories))
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            return pd.read_sql_query(query + ' ORDER BY t.id', conn, params=params)
+
+    def preview(self, scope: RestatementScope) -> pd.DataFrame:
+        """Transactions in scope whose amount or charges change under the current rates.
+        
+        Returns the loaded columns plus new_charges, new_amount and amount_delta.
+        """
+        rows = self.load(scope)
+        if rows.empty:
+            return rows
+        base_amount = rows['num_shares'] * rows['rate']
+        new_charges = self.charges.calculate_charges_bulk(rows.assign(base_amount=base_amount))['TOTAL']
+        is_sell = rows['transaction_type'].isin(['SELL', 'BUYBACK'])
+        rows['new_charges'] = new_charges
+        rows['new_amount'] = base_amount + new_charges.where(~is_sell, -new_charges)
+        rows['amount_delta'] = rows['new_amount'] - rows['old_amount']
+        changed = (
+            (rows['amount_delta'].abs() > TOLERANCE) |
+            ~((rows['new_charges'] - rows['old_charges']).abs() <= TOLERANCE)
+        )
+        return rows[changed].reset_index(drop=True)
+
+    def apply(self, scope: RestatementScope,
+              progress_callback: Optional[Callable[[float, RestatementResult], None]] = None) -> RestatementResult:
+        """Write the restated amounts, one short database transaction per chunk"""
+        result = RestatementResult()
+        changes = self.preview(scope)
+        for start in range(0, len(changes), CHUNK_SIZE):
+            chunk = changes.iloc[start:start + CHUNK_SIZE]
+            updated = self.db_manager.restate_amounts(chunk[['id']].assign(amount=chunk['new_amount']))
+            if updated < 0:
+                raise RuntimeError(
+                    f"Restating transactions failed; {result.rows_restated} of {len(changes)} row(s) "
+                    "were restated before the failure"
+                )
+            result.rows_restated += updated
+            result.amount_delta += float(chunk['amount_delta'].sum())
+            if progress_callback:
+                progress_callback(min((start + len(chunk)) / len(changes), 1.0), result)
+        return result
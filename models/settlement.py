@@ -0,0 +1,137 @@
+import json
+import hashlib
+import sqlite3
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from datetime import date
+from typing import BinaryIO, List, Optional
+from .database import DatabaseManager, normalize_symbol
+from .fno_pnl import CONTRACT_COLUMNS, fifo_match, open_contracts
+from .importer import financial_years
+
+# Columns of a settlement-price file: the final settlement price of each underlying per expiry
+SETTLEMENT_PRICE_COLUMNS = ['scrip_name', 'expiry_date', 'settlement_price']
+
+# Fingerprints of generated settlement trades start with this, telling them apart from broker trades
+SETTLEMENT_FINGERPRINT_PREFIX = 'expiry:'
+
+def read_settlement_prices(file: BinaryIO) -> pd.DataFrame:
+    """Read final settlement prices from CSV, one row per underlying and expiry date"""
+    prices = pd.read_csv(file, dtype=str, skipinitialspace=True)
+    prices.columns = [str(column).strip().lower() for column in prices.columns]
+    missing = [column for column in SETTLEMENT_PRICE_COLUMNS if column not in prices.columns]
+    if missing:
+        raise ValueError(f"Settlement price file is missing column(s): {', '.join(missing)}")
+    prices = prices[SETTLEMENT_PRICE_COLUMNS].copy()
+    names = prices['scrip_name'].str.strip().replace('', None)
+    expiry = pd.to_datetime(prices['expiry_date'].str.strip(), errors='coerce', format='mixed')
+    price = pd.to_numeric(prices['settlement_price'].str.replace(',', ''), errors='coerce')
+    invalid = names.isna() | expiry.isna() | ~(price >= 0)
+    if invalid.any():
+        raise ValueError(f"Settlement price file has a missing scrip, invalid expiry date or invalid price on row(s): "
+                         f"{', '.join(str(row + 2) for row in prices.index[invalid][:10])}")
+    prices['scrip_name'] = names.map(normalize_symbol)
+    prices['expiry_date'] = expiry.dt.strftime('%Y-%m-%d')
+    prices['settlement_price'] = price
+    # A later row for the same underlying and expiry overrides an earlier one
+    return prices.drop_duplicates(['scrip_name', 'expiry_date'], keep='last').reset_index(drop=True)
+
+@dataclass
+class SettlementPlan:
+    """Settlement trades for expired open positions, and the positions that could not be priced"""
+    trades: pd.DataFrame
+    unpriced: pd.DataFrame
+
+class ExpirySettlement:
+    """Close F&O positions still open after their contract expired"""
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+
+    def load(self, demat_account_ids: List[int], as_of: date) -> pd.DataFrame:
+        """Read the F&O trades of contracts that expired before as_of (served by the account/expiry index)"""
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            return pd.read_sql_query(
+                '''
+                SELECT t.*, COALESCE(cb.total_charges, 0) AS charges
+                FROM transactions t
+                LEFT JOIN charge_breakdowns cb ON cb.transaction_id = t.id
+                WHERE t.demat_account_id IN (SELECT value FROM json_each(?))
+                AND t.expiry_date < ?
+                AND t.transaction_category != 'EQUITY'
+                ORDER BY t.demat_account_id, t.date, t.id
+                ''',
+                conn,
+                params=(json.dumps([int(account_id) for account_id in demat_account_ids]), as_of.isoformat())
+            )
+
+    def open_positions(self, demat_account_ids: List[int], as_of: Optional[date] = None) -> pd.DataFrame:
+        """Net open position per account and expired contract, with the exchange it was traded on"""
+        trades = self.load(demat_account_ids, as_of or date.today())
+        positions = []
+        for account_id, account_trades in trades.groupby('demat_account_id', sort=True):
+            account_positions = open_contracts(fifo_match(account_trades).open_lots)
+            if account_positions.empty:
+                continue
+            exchanges = account_trades.groupby(CONTRACT_COLUMNS, dropna=False, sort=False)['exchange'].last().reset_index()
+            positions.append(account_positions.merge(exchanges, on=CONTRACT_COLUMNS, how='left').assign(demat_account_id=account_id))
+        if not positions:
+            return pd.DataFrame()
+        return pd.concat(positions, ignore_index=True)
+
+    def plan(self, demat_account_ids: List[int], prices: pd.DataFrame, as_of: Optional[date] = None) -> SettlementPlan:
+        """Price every expired open position and build the closing trades.
+
+        Futures settle at the final settlement price and options at their intrinsic value
+        against it, so out-of-the-money options settle at zero. Positions whose underlying
+        and expiry are missing from `prices` are returned as unpriced.
+        """
+        positions = self.open_positions(demat_account_ids, as_of)
+        if positions.empty:
+            return SettlementPlan(pd.DataFrame(), pd.DataFrame())
+
+        positions['expiry_day'] = positions['expiry_date'].astype(str).str[:10]
+        positions = positions.merge(
+            prices.rename(columns={'expiry_date': 'expiry_day'}), on=['scrip_name', 'expiry_day'], how='left'
+        )
+        underlying = positions['settlement_price']
+        strike = positions['strike_price'].astype(float)
+        instrument_type = positions['instrument_type']
+        positions['rate'] = np.select(
+            [instrument_type == 'FUT', instrument_type == 'CE', instrument_type == 'PE'],
+            [underlying, (underlying - strike).clip(lower=0), (strike - underlying).clip(lower=0)],
+            np.nan
+        )
+        priced = positions['rate'].notna()
+        unpriced = positions[~priced].reset_index(drop=True)
+        positions = positions[priced].reset_index(drop=True)
+        if positions.empty:
+            return SettlementPlan(pd.DataFrame(), unpriced)
+
+        # A long position is closed by a sell at expiry and a short one by a buy, dated on the expiry
+        trades = positions.assign(
+            financial_year=financial_years(pd.to_datetime(positions['expiry_day'])),
+            serial_number=None,
+            date=positions['expiry_date'],
+            num_shares=positions['quantity'].abs().astype(int),
+            transaction_type=np.where(positions['position'] == 'LONG', 'SELL', 'BUY')
+        )
+        trades['amount'] = trades['num_shares'] * trades['rate']
+        key = (
+            trades['demat_account_id'].astype(str) + '|' + trades['instrument_id'].astype(str) + '|'
+            + trades['expiry_day'] + '|' + trades['instrument_type'] + '|'
+            + trades['strike_price'].map(lambda x: '' if pd.isna(x) else f'{x:.6f}') + '|'
+            + trades['position'] + '|' + trades['num_shares'].astype(str)
+        )
+        trades['fingerprint'] = [SETTLEMENT_FINGERPRINT_PREFIX + hashlib.sha1(value.encode()).hexdigest() for value in key]
+        return SettlementPlan(trades, unpriced)
+
+    def settle(self, plan: SettlementPlan) -> int:
+        """Write the settlement trades of a plan in one bulk insert, without charges.
+
+        Returns the number of trades written, or -1 if the write failed.
+        """
+        if plan.trades.empty:
+            return 0
+        return self.db_manager.save_transactions(plan.trades, charged=False)
@@ -0,0 +1,91 @@
+import json
+import sqlite3
+import pandas as pd
+from datetime import date, timedelta
+from typing import BinaryIO, Dict, List
+from .database import DatabaseManager
+from .charges import ChargeInputs, ChargesEngine, RateResolver, CHARGE_TYPES, CHARGED_TRANSACTION_TYPES
+from .settlement import SETTLEMENT_FINGERPRINT_PREFIX
+
+# Columns of a rate table; the same layout as the charges table
+RATE_TABLE_COLUMNS = ['charge_type', 'exchange', 'category', 'instrument_type', 'transaction_type', 'value']
+
+# Optional columns dating each rate; without them a rate applies to all trade dates
+EFFECTIVE_DATE_COLUMNS = ['effective_from', 'effective_to']
+
+def read_rate_table(file: BinaryIO) -> pd.DataFrame:
+    """Read an alternative rate table from CSV, laid out like the charges table"""
+    rates = pd.read_csv(file, dtype=str, skipinitialspace=True)
+    rates.columns = [str(column).strip().lower() for column in rates.columns]
+    missing = [column for column in RATE_TABLE_COLUMNS if column not in rates.columns]
+    if missing:
+        raise ValueError(f"Rate table is missing column(s): {', '.join(missing)}")
+    rates = rates[RATE_TABLE_COLUMNS + [column for column in EFFECTIVE_DATE_COLUMNS if column in rates.columns]].copy()
+    for column in RATE_TABLE_COLUMNS[:-1]:
+        rates[column] = rates[column].str.strip().str.upper()
+    rates['value'] = pd.to_numeric(rates['value'], errors='coerce')
+    if rates['value'].isna().any():
+        raise ValueError(f"Rate table has non-numeric values on row(s): "
+                         f"{', '.join(str(row + 2) for row in rates.index[rates['value'].isna()][:10])}")
+    for column in EFFECTIVE_DATE_COLUMNS:
+        if column not in rates.columns:
+            continue
+        dates = rates[column].str.strip().replace('', None)
+        invalid = dates.notna() & pd.to_datetime(dates, errors='coerce', format='ISO8601').isna()
+        if invalid.any():
+            raise ValueError(f"Rate table has invalid {column} dates (expected YYYY-MM-DD) on row(s): "
+                             f"{', '.join(str(row + 2) for row in rates.index[invalid][:10])}")
+        rates[column] = dates
+    return rates
+
+class ChargesSimulator:
+    """Price an account's trade history under alternative rate tables"""
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+        self.charges = ChargesEngine(db_manager)
+
+    def current_rates(self) -> pd.DataFrame:
+        """The charges table, with its effective dates, in rate-table layout (a template for alternative schedules)"""
+        return self.charges.rate_table()[RATE_TABLE_COLUMNS + EFFECTIVE_DATE_COLUMNS]
+
+    def load(self, demat_account_ids: List[int], start_date: date, end_date: date) -> pd.DataFrame:
+        """Read only the columns charges depend on for the charged transactions in range.
+
+        Expiry settlements are left out, as in ChargeRestatement.load: they are stored without
+        charges, so pricing them would overstate the current totals.
+        """
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            return pd.read_sql_query(
+                '''
+                SELECT date, transaction_type, transaction_category, exchange, instrument_type,
+                       num_shares * rate AS base_amount
+                FROM transactions
+                WHERE demat_account_id IN (SELECT value FROM json_each(?))
+                AND date >= ? AND date < ?
+                AND transaction_type IN (SELECT value FROM json_each(?))
+                AND (fingerprint IS NULL OR fingerprint NOT LIKE ? || '%')
+                ''',
+                conn,
+                params=(
+                    json.dumps([int(account_id) for account_id in demat_account_ids]),
+                    start_date.isoformat(),
+                    (end_date + timedelta(days=1)).isoformat(),
+                    json.dumps(list(CHARGED_TRANSACTION_TYPES)),
+                    SETTLEMENT_FINGERPRINT_PREFIX
+                )
+            )
+
+    def simulate(self, inputs: ChargeInputs, rates: pd.DataFrame) -> pd.Series:
+        """Total of each charge type (plus TOTAL) over prepared transactions under a rate table"""
+        charges = self.charges.compute_charges(inputs, RateResolver(rates))
+        return charges[CHARGE_TYPES + ['TOTAL']].sum()
+
+    def compare(self, transactions: pd.DataFrame, schedules: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+        """Charge totals by type under the current rates and each named schedule, one column each"""
+        # Group the history by rate key once; every schedule reuses it
+        inputs = ChargeInputs.from_transactions(transactions)
+        totals = {'Current': self.charges.compute_charges(inputs)[CHARGE_TYPES + ['TOTAL']].sum()}
+        for name, rates in schedules.items():
+            totals[name] = self.simulate(inputs, rates)
+        return pd.DataFrame(totals)
@@ -0,0 +1,99 @@
+import os
+import sqlite3
+from bisect import bisect_left
+from typing import Iterable, List, Optional
+import pandas as pd
+from .database import DatabaseManager, normalize_symbol
+
+# Local instrument master dump (e.g. a broker's instruments CSV), read from the working directory
+INSTRUMENT_MASTER_FILE = 'instrument_master.csv'
+
+# Column names accepted for the symbol field of an instrument master file
+MASTER_SYMBOL_COLUMNS = ['tradingsymbol', 'trading_symbol', 'symbol', 'scrip_name']
+
+
+class SymbolIndex:
+    """Prefix index over instrument symbols.
+
+    Symbols are kept in one sorted array so a prefix lookup is two bisects plus a slice,
+    independent of how many contracts are loaded.
+    """
+
+    def __init__(self, symbols: Iterable[str]):
+        self.symbols: List[str] = sorted({normalize_symbol(s) for s in symbols if isinstance(s, str) and s.strip()})
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def search(self, prefix: str, limit: int = 20) -> List[str]:
+        """Return up to `limit` symbols starting with `prefix`, in sorted order"""
+        prefix = normalize_symbol(prefix)
+        if not prefix:
+            return []
+        start = bisect_left(self.symbols, prefix)
+        end = bisect_left(self.symbols, prefix + '\uffff', start)
+        return self.symbols[start:min(end, start + limit)]
+
+    @classmethod
+    def from_master_file(cls, path: str) -> 'SymbolIndex':
+        """Build an index from an instrument master CSV; a missing file gives an empty index"""
+        if not os.path.exists(path):
+            return cls([])
+
+        header = pd.read_csv(path, nrows=0).columns
+        lookup = {str(col).strip().lower(): col for col in header}
+        symbol_column = next((lookup[name] for name in MASTER_SYMBOL_COLUMNS if name in lookup), None)
+        if symbol_column is None:
+            raise ValueError(
+                f"Instrument master {path} has no symbol column (expected one of: {', '.join(MASTER_SYMBOL_COLUMNS)})"
+            )
+        symbols = pd.read_csv(path, usecols=[symbol_column], dtype=str)[symbol_column]
+        return cls(symbols.dropna().tolist())
+
+
+class ScripSuggester:
+    """Scrip suggestions from the instrument master plus an account's own traded scrips.
+
+    The master index is built once and shared; the account's scrips are a small index that is
+    rebuilt only when the transactions data version changes. Own scrips are listed first.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, master_index: Optional[SymbolIndex] = None):
+        self.db_manager = db_manager
+        self.master_index = master_index if master_index is not None else SymbolIndex([])
+        self._account_indexes = {}
+
+    def get_account_scrips(self, demat_account_id: int) -> List[str]:
+        """Get the distinct scrips traded in a demat account"""
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT DISTINCT i.symbol
+                FROM transactions t
+                JOIN instruments i ON i.id = t.instrument_id
+                WHERE t.demat_account_id = ?
+            ''', (demat_account_id,))
+            return [row[0] for row in cursor.fetchall()]
+
+    def _account_index(self, demat_account_id: int, data_version: Optional[int] = None) -> SymbolIndex:
+        version = data_version if data_version is not None else self.db_manager.get_data_version()
+        cached = self._account_indexes.get(demat_account_id)
+        if cached is None or cached[0] != version:
+            cached = (version, SymbolIndex(self.get_account_scrips(demat_account_id)))
+            self._account_indexes[demat_account_id] = cached
+        return cached[1]
+
+    def suggest(self, prefix: str, demat_account_id: int, limit: int = 20,
+                data_version: Optional[int] = None) -> List[str]:
+        """Suggest symbols for a typed prefix, the account's own scrips first.
+
+        Pass the transactions data_version when the caller already knows it, so repeated
+        lookups stay in memory; otherwise it is read from the database on every call.
+        """
+        own = self._account_index(demat_account_id, data_version).search(prefix, limit)
+        if len(own) >= limit:
+            return own
+        seen = set(own)
+        # Over-fetch by len(own) so overlaps with the master index don't shorten the list
+        extra = [s for s in self.master_index.search(prefix, limit + len(own)) if s not in seen]
+        return own + extra[:limit - len(own)]
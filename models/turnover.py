@@ -0,0 +1,105 @@
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+from .database import DatabaseManager
+from .fno_pnl import fifo_match
+from .importer import financial_years
+from .settlement import SETTLEMENT_FINGERPRINT_PREFIX
+
+# Turnover above which books must be audited u/s 44AB, from the given financial year on (the
+# higher limits apply when nearly all receipts and payments are digital, as in F&O trading)
+AUDIT_TURNOVER_LIMITS = [
+    ('2016-2017', 10000000.0),
+    ('2020-2021', 50000000.0),
+    ('2021-2022', 100000000.0)
+]
+
+TURNOVER_COLUMNS = [
+    'demat_account_id', 'transaction_category', 'financial_year', 'closing_trades', 'profit_loss',
+    'absolute_profit_loss', 'option_sell_premium', 'turnover', 'audit_limit'
+]
+
+def audit_limits(years: pd.Series) -> pd.Series:
+    """Tax-audit turnover limit of each financial year; NaN before the first listed year"""
+    starts = [year for year, _ in AUDIT_TURNOVER_LIMITS]
+    limits = np.array([np.nan] + [limit for _, limit in AUDIT_TURNOVER_LIMITS])
+    return pd.Series(limits[np.searchsorted(starts, years.to_numpy(dtype=str), side='right')], index=years.index)
+
+def audit_turnover(transactions: pd.DataFrame, matched: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """F&O turnover for tax audit per account, category and financial year.
+
+    Turnover is the sum of the absolute realized profit or loss of each closing trade plus
+    the premium received on option sells. `transactions` are stored F&O rows with charges
+    (as fifo_match takes them) with id and demat_account_id; trades are matched FIFO per account
+    and everything after that is grouped sums. A closing trade counts in the year of its
+    date; expiry settlements close positions but are not option sales, so they add no premium.
+    `matched` takes already matched lots (with close_id and profit_loss, e.g. from the
+    realized_pnl ledger) in place of matching the trades again.
+    """
+    trades = transactions[transactions['transaction_type'].isin(['BUY', 'SELL'])]
+    if trades.empty:
+        return pd.DataFrame(columns=TURNOVER_COLUMNS)
+    trades = trades.assign(financial_year=financial_years(pd.to_datetime(trades['date'].astype(str).str[:10])))
+
+    # Realized profit or loss per closing trade, from each account's FIFO matches
+    if matched is None:
+        matched = pd.concat(
+            [fifo_match(account_trades).matched for _, account_trades in trades.groupby('demat_account_id')],
+            ignore_index=True
+        )
+    per_trade = matched.groupby('close_id')['profit_loss'].sum()
+    # Ledger lots can name a trade deleted since the ledger was last refreshed; it has no year to count in
+    per_trade = per_trade[per_trade.index.isin(trades['id'])]
+    closing = trades.set_index('id').reindex(per_trade.index)[['demat_account_id', 'transaction_category', 'financial_year']]
+    closing = closing.assign(profit_loss=per_trade.to_numpy(), absolute_profit_loss=per_trade.abs().to_numpy())
+    key = ['demat_account_id', 'transaction_category', 'financial_year']
+    realized = closing.groupby(key).agg(
+        closing_trades=('profit_loss', 'size'),
+        profit_loss=('profit_loss', 'sum'),
+        absolute_profit_loss=('absolute_profit_loss', 'sum')
+    )
+
+    option_sells = (trades['transaction_type'] == 'SELL') & trades['instrument_type'].isin(['CE', 'PE'])
+    if 'fingerprint' in trades.columns:
+        option_sells &= ~trades['fingerprint'].fillna('').str.startswith(SETTLEMENT_FINGERPRINT_PREFIX)
+    premium = trades[option_sells].assign(
+        option_sell_premium=trades['rate'] * trades['num_shares']
+    ).groupby(key)['option_sell_premium'].sum()
+
+    turnover = realized.join(premium, how='outer').fillna(
+        {'closing_trades': 0, 'profit_loss': 0.0, 'absolute_profit_loss': 0.0, 'option_sell_premium': 0.0}
+    ).reset_index()
+    turnover['closing_trades'] = turnover['closing_trades'].astype(int)
+    turnover['turnover'] = turnover['absolute_profit_loss'] + turnover['option_sell_premium']
+    turnover['audit_limit'] = audit_limits(turnover['financial_year'])
+    return turnover[TURNOVER_COLUMNS]
+
+class FnoTurnover:
+    """Tax-audit turnover of F&O trading, recomputed from the stored trades"""
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+
+    def load(self, demat_account_ids: List[int]) -> pd.DataFrame:
+        """F&O trades of several accounts with their stored charges, in one query"""
+        with sqlite3.connect(self.db_manager.db_name) as conn:
+            return pd.read_sql_query(
+                '''
+                SELECT t.id, t.demat_account_id, t.instrument_id, t.scrip_name, t.date, t.transaction_type,
+                       t.num_shares, t.rate, t.transaction_category, t.expiry_date, t.instrument_type,
+                       t.strike_price, t.fingerprint, COALESCE(cb.total_charges, 0) AS charges
+                FROM transactions t
+                LEFT JOIN charge_breakdowns cb ON cb.transaction_id = t.id
+                WHERE t.demat_account_id IN (SELECT value FROM json_each(?))
+                AND t.transaction_category IN ('F&O EQUITY', 'F&O COMMODITY')
+                AND t.transaction_type IN ('BUY', 'SELL')
+                ''',
+                conn,
+                params=(json.dumps([int(account_id) for account_id in demat_account_ids]),)
+            )
+
+    def report(self, demat_account_ids: List[int]) -> pd.DataFrame:
+        """audit_turnover of the given accounts' stored F&O trades"""
+        return audit_turnover(self.load(demat_account_ids))
@@ -0,0 +1,159 @@
+import streamlit as st
+from models.database import DatabaseManager
+from models.capital_gains import CapitalGains, FMV_FILE, read_fmv_file, load_fmv
+
+class CapitalGainsView:
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+        self.capital_gains = CapitalGains(db_manager)
+
+    def render(self, demat_account_id: int):
+        st.title("Equity Capital Gains Report")
+
+        with st.expander("FMV as on 31-Jan-2018 (Grandfathering)"):
+            st.write(f"Long-term gains on shares bought up to 31-Jan-2018 use the FMV from {FMV_FILE} as their cost "
+                     "where it is higher. Upload the NSE bhavcopy of 31-Jan-2018 (the day's high is the FMV) or any "
+                     "CSV with scrip_name and fmv columns to replace it.")
+            uploaded_file = st.file_uploader("FMV file (CSV)", type=["csv"])
+            if uploaded_file is not None and st.button("Save FMV File"):
+                try:
+                    uploaded_file.seek(0)
+                    fmv = read_fmv_file(uploaded_file)
+                except ValueError as e:
+                    st.error(str(e))
+                    return
+                fmv.to_csv(FMV_FILE, index=False)
+                st.success(f"Saved FMV of {len(fmv)} scrip(s) to {FMV_FILE}")
+
+        accounts = self.db_manager.get_demat_accounts()
+        account_names = {account['id']: account['name'] for account in accounts}
+        years = self.capital_gains.sale_years()
+        if not years:
+            st.info("No equity sell or buyback transactions found")
+            return
+
+        with st.form("capital_gains"):
+            account_ids = st.multiselect(
+                "Demat Accounts",
+                list(account_names.keys()),
+                default=[demat_account_id],
+                format_func=lambda account_id: account_names[account_id]
+            )
+            year = st.selectbox("Financial Year", years)
+            submitted = st.form_submit_button("Compute Capital Gains")
+
+        if not submitted:
+            return
+        if not account_ids:
+            st.error("Please select at least one demat account")
+            return
+
+        try:
+            fmv = load_fmv()
+        except ValueError as e:
+            st.error(f"{FMV_FILE}: {e}")
+            return
+        report = self.capital_gains.report(account_ids, fmv)
+        if fmv.empty:
+            st.warning(f"No {FMV_FILE} found; long-term gains on shares bought up to 31-Jan-2018 use the actual cost")
+
+        schedule_cg = report.schedule_cg.assign(account=report.schedule_cg['demat_account_id'].map(account_names))
+        schedule_112a = report.schedule_112a.assign(account=report.schedule_112a['demat_account_id'].map(account_names))
+        speculative = report.speculative.assign(account=report.speculative['demat_account_id'].map(account_names))
+        schedule_cg = schedule_cg[schedule_cg['financial_year'] == year]
+        schedule_112a = schedule_112a[schedule_112a['financial_year'] == year]
+        speculative = speculative[speculative['financial_year'] == year]
+        if schedule_cg.empty and speculative.empty:
+            st.info(f"No matched equity sales in {year}")
+            return
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("STCG (111A)", f"₹{schedule_cg['stcg'].sum():,.2f}")
+        col2.metric("LTCG (112A)", f"₹{schedule_cg['ltcg'].sum():,.2f}")
+        col3.metric("Taxable LTCG", f"₹{schedule_cg['taxable_ltcg'].sum():,.2f}",
+                    help="After short-term loss set-off and the yearly exemption")
+        col4.metric("Estimated Tax", f"₹{schedule_cg['estimated_tax'].sum():,.2f}",
+                    help="Before surcharge and cess")
+
+        def money(label, help=None):
+            return st.column_config.NumberColumn(label, format="₹%.2f", help=help)
+
+        st.subheader("Schedule CG")
+        st.dataframe(
+            schedule_cg[[
+                'account', 'stcg_consideration', 'stcg_cost', 'stcg', 'ltcg_consideration', 'ltcg_cost', 'ltcg',
+                'stcl_set_off', 'ltcg_exemption', 'taxable_stcg', 'taxable_ltcg', 'estimated_tax',
+                'stcl_carried_forward', 'ltcl_carried_forward'
+            ]],
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "account": st.column_config.TextColumn("Account"),
+                "stcg_consideration": money("STCG Sale Value"),
+                "stcg_cost": money("STCG Cost"),
+                "stcg": money("STCG (111A)"),
+                "ltcg_consideration": money("LTCG Sale Value"),
+                "ltcg_cost": money("LTCG Cost", "Cost after grandfathering"),
+                "ltcg": money("LTCG (112A)"),
+                "stcl_set_off": money("STCL Set Off", "Short-term loss set off against long-term gains"),
+                "ltcg_exemption": money("LTCG Exemption"),
+                "taxable_stcg": money("Taxable STCG"),
+                "taxable_ltcg": money("Taxable LTCG"),
+                "estimated_tax": money("Estimated Tax"),
+                "stcl_carried_forward": money("STCL Carried Forward"),
+                "ltcl_carried_forward": money("LTCL Carried Forward")
+            }
+        )
+
+        st.subheader("Schedule 112A")
+        if schedule_112a.empty:
+            st.info("No long-term gains in this financial year")
+        else:
+            st.dataframe(
+                schedule_112a[[
+                    'account', 'scrip_name', 'quantity', 'sale_price', 'consideration', 'actual_cost', 'fmv',
+                    'fmv_value', 'cost', 'ltcg'
+                ]],
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "account": st.column_config.TextColumn("Account"),
+                    "scrip_name": st.column_config.TextColumn("Scrip"),
+                    "quantity": st.column_config.NumberColumn("Shares Sold"),
+                    "sale_price": money("Sale Price per Share"),
+                    "consideration": money("Full Value of Consideration"),
+                    "actual_cost": money("Cost of Acquisition", "Actual cost without indexation"),
+                    "fmv": money("FMV per Share", "As on 31-Jan-2018, for grandfathered lots"),
+                    "fmv_value": money("Total FMV"),
+                    "cost": money("Cost Allowed", "Higher of actual cost and lower of FMV and sale value"),
+                    "ltcg": money("LTCG")
+                }
+            )
+
+        st.subheader("Intraday (Speculative Business Income)")
+        if speculative.empty:
+            st.info("No intraday trades in this financial year")
+        else:
+            st.dataframe(
+                speculative[['account', 'scrip_days', 'buy_value', 'sell_value', 'profit_loss', 'turnover']],
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "account": st.column_config.TextColumn("Account"),
+                    "scrip_days": st.column_config.NumberColumn("Scrip-Days", help="Scrips squared off, counted per day"),
+                    "buy_value": money("Buy Value"),
+                    "sell_value": money("Sell Value"),
+                    "profit_loss": money("Profit/Loss"),
+                    "turnover": money("Turnover", "Sum of absolute profit or loss per scrip and day")
+                }
+            )
+
+        lots = report.lots[report.lots['financial_year'] == year]
+        col1, col2, col3 = st.columns(3)
+        col1.download_button("Download Schedule CG (CSV)", schedule_cg.to_csv(index=False),
+                             file_name=f"schedule_cg_{year}.csv", mime="text/csv")
+        col2.download_button("Download Schedule 112A (CSV)", schedule_112a.to_csv(index=False),
+                             file_name=f"schedule_112a_{year}.csv", mime="text/csv")
+        col3.download_button("Download Matched Lots (CSV)",
+                             lots.assign(account=lots['demat_account_id'].map(account_names)).to_csv(index=False),
+                             file_name=f"capital_gains_lots_{year}.csv", mime="text/csv")
@@ -1,860 +1,334 @@
 import streamlit as st
 import pandas as pd
 from models.database import DatabaseManager
-import sqlite3
-from typing import Tuple, Dict
+from models.charges import ChargesEngine, EARLIEST_EFFECTIVE_DATE
+from models.restatement import ChargeRestatement, RestatementScope
+from models.simulator import ChargesSimulator, read_rate_table
+from datetime import date
+
+# Rate sheet layout per category: (charge types, exchanges, instrument types)
+CATEGORY_SHEETS = {
+    'EQUITY': (
+        ['BROKERAGE', 'DP_CHARGES', 'TRANSACTION_CHARGES', 'STT', 'STAMP_CHARGES', 'SEBI', 'IPFT', 'GST'],
+        ['NSE', 'BSE'],
+        ['EQUITY']
+    ),
+    'F&O_EQUITY': (
+        ['BROKERAGE', 'TRANSACTION_CHARGES', 'STT', 'STAMP_CHARGES', 'SEBI', 'IPFT', 'GST'],
+        ['NSE', 'BSE'],
+        ['FUT', 'OPT']
+    ),
+    'F&O_COMMODITY': (
+        ['BROKERAGE', 'TRANSACTION_CHARGES', 'CTT', 'STAMP_CHARGES', 'SEBI', 'IPFT', 'GST'],
+        ['MCX', 'NCDEX'],
+        ['FUT', 'OPT']
+    ),
+}
+
+SECTIONS = {
+    "Equity Charges": 'EQUITY',
+    "F&O Equity Charges": 'F&O_EQUITY',
+    "F&O Commodity Charges": 'F&O_COMMODITY',
+    "Restate Transactions": None,
+    "What-If Simulator": None,
+}
+
+
+@st.cache_data(show_spinner=False)
+def load_charge_rates(db_name: str, charges_version: int) -> pd.DataFrame:
+    """The whole charges table with effective dates, reloaded only when the rates change"""
+    return ChargesEngine(DatabaseManager(db_name)).rate_table()
+
+
+@st.cache_data(show_spinner=False)
+def load_simulation_trades(db_name: str, demat_account_ids: tuple, start_date: date, end_date: date,
+                           data_version: int) -> pd.DataFrame:
+    """Trade history for the what-if simulator, reloaded only when transactions change"""
+    return ChargesSimulator(DatabaseManager(db_name)).load(list(demat_account_ids), start_date, end_date)
+
+
+def rate_sheet(rates: pd.DataFrame, category: str) -> pd.DataFrame:
+    """Rates of a category in force today, one row per charge type and one column per
+    (exchange, instrument_type, transaction_type); missing rates are zero"""
+    charge_types, exchanges, instrument_types = CATEGORY_SHEETS[category]
+    today = date.today().isoformat()
+    in_force = rates[
+        (rates['category'] == category)
+        & (rates['effective_from'] <= today)
+        & (rates['effective_to'].isna() | (rates['effective_to'] >= today))
+    ]
+    values = in_force.groupby(['charge_type', 'exchange', 'instrument_type', 'transaction_type'])['value'].first()
+    columns = [
+        (exchange, instrument_type, transaction_type)
+        for exchange in exchanges for instrument_type in instrument_types for transaction_type in ['BUY', 'SELL']
+    ]
+    return pd.DataFrame(
+        [[float(values.get((charge_type,) + column, 0.0)) for column in columns] for charge_type in charge_types],
+        index=charge_types,
+        columns=pd.MultiIndex.from_tuples(columns)
+    )
+
 
 class Charges:
+    """Editor for the charges table; calculations live in models.charges.ChargesEngine"""
+
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
-        self.ensure_charges_table()
-
-    def ensure_charges_table(self):
-        """Ensure the charges table exists with correct schema and default values"""
-        with sqlite3.connect(self.db_manager.db_name) as conn:
-            cursor = conn.cursor()
-            
-            # Check if table exists
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='charges'")
-            table_exists = cursor.fetchone() is not None
-            
-            if not table_exists:
-                # Create new charges table with exchange and category columns
-                cursor.execute('''
-                    CREATE TABLE charges (
-                        charge_type TEXT,
-                        exchange TEXT,
-                        category TEXT,
-                        instrument_type TEXT,
-                        transaction_type TEXT,
-                        value REAL,
-                        last_updated TIMESTAMP,
-                        PRIMARY KEY (charge_type, exchange, category, instrument_type, transaction_type)
-                    )
-                ''')
-                
-                # Initialize default charges
-                default_charges = [
-                    # Equity NSE charges
-                    ('BROKERAGE', 'NSE', 'EQUITY', 'EQUITY', 'BUY', 20.00),  # ₹20 per transaction
-                    ('BROKERAGE', 'NSE', 'EQUITY', 'EQUITY', 'SELL', 20.00),  # ₹20 per transaction
-                    ('DP_CHARGES', 'NSE', 'EQUITY', 'EQUITY', 'BUY', 0.0004),  # 0.04%
-                    ('DP_CHARGES', 'NSE', 'EQUITY', 'EQUITY', 'SELL', 0.0004),  # 0.04%
-                    ('TRANSACTION_CHARGES', 'NSE', 'EQUITY', 'EQUITY', 'BUY', 0.0000297),  # 0.00297%
-                    ('TRANSACTION_CHARGES', 'NSE', 'EQUITY', 'EQUITY', 'SELL', 0.0000297),  # 0.00297%
-                    ('STT', 'NSE', 'EQUITY', 'EQUITY', 'BUY', 0.001),  # 0.1%
-                    ('STT', 'NSE', 'EQUITY', 'EQUITY', 'SELL', 0.001),  # 0.1%
-                    ('STAMP_CHARGES', 'NSE', 'EQUITY', 'EQUITY', 'BUY', 0.00015),  # 0.015%
-                    ('STAMP_CHARGES', 'NSE', 'EQUITY', 'EQUITY', 'SELL', 0.00015),  # 0.015%
-                    ('SEBI', 'NSE', 'EQUITY', 'EQUITY', 'BUY', 0.000001),  # 0.0001%
-                    ('SEBI', 'NSE', 'EQUITY', 'EQUITY', 'SELL', 0.000001),  # 0.0001%
-                    ('IPFT', 'NSE', 'EQUITY', 'EQUITY', 'BUY', 0.000001),  # 0.0001%
-                    ('IPFT', 'NSE', 'EQUITY', 'EQUITY', 'SELL', 0.000001),  # 0.0001%
-                    ('GST', 'NSE', 'EQUITY', 'EQUITY', 'BUY', 0.18),  # 18%
-                    ('GST', 'NSE', 'EQUITY', 'EQUITY', 'SELL', 0.18),  # 18%
-                    
-                    # Equity BSE charges
-                    ('BROKERAGE', 'BSE', 'EQUITY', 'EQUITY', 'BUY', 0.00),  # ₹0 per transaction
-                    ('BROKERAGE', 'BSE', 'EQUITY', 'EQUITY', 'SELL', 0.00),  # ₹0 per transaction
-                    ('DP_CHARGES', 'BSE', 'EQUITY', 'EQUITY', 'BUY', 0.0004),  # 0.04%
-                    ('DP_CHARGES', 'BSE', 'EQUITY', 'EQUITY', 'SELL', 0.0004),  # 0.04%
-                    ('TRANSACTION_CHARGES', 'BSE', 'EQUITY', 'EQUITY', 'BUY', 0.0000375),  # 0.00375%
-                    ('TRANSACTION_CHARGES', 'BSE', 'EQUITY', 'EQUITY', 'SELL', 0.0000375),  # 0.00375%
-                    ('STT', 'BSE', 'EQUITY', 'EQUITY', 'BUY', 0.001),  # 0.1%
-                    ('STT', 'BSE', 'EQUITY', 'EQUITY', 'SELL', 0.001),  # 0.1%
-                    ('STAMP_CHARGES', 'BSE', 'EQUITY', 'EQUITY', 'BUY', 0.00015),  # 0.015%
-                    ('STAMP_CHARGES', 'BSE', 'EQUITY', 'EQUITY', 'SELL', 0.00015),  # 0.015%
-                    ('SEBI', 'BSE', 'EQUITY', 'EQUITY', 'BUY', 0.000001),  # 0.0001%
-                    ('SEBI', 'BSE', 'EQUITY', 'EQUITY', 'SELL', 0.000001),  # 0.0001%
-                    ('IPFT', 'BSE', 'EQUITY', 'EQUITY', 'BUY', 0.0000),  # 0%
-                    ('IPFT', 'BSE', 'EQUITY', 'EQUITY', 'SELL', 0.0000),  # 0%
-                    ('GST', 'BSE', 'EQUITY', 'EQUITY', 'BUY', 0.18),  # 18%
-                    ('GST', 'BSE', 'EQUITY', 'EQUITY', 'SELL', 0.18),  # 18%
-                    
-                    # F&O Equity NSE charges - Futures
-                    ('BROKERAGE', 'NSE', 'F&O_EQUITY', 'FUT', 'BUY', 20.00),  # ₹20 per lot
-                    ('BROKERAGE', 'NSE', 'F&O_EQUITY', 'FUT', 'SELL', 20.00),  # ₹20 per lot
-                    ('TRANSACTION_CHARGES', 'NSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.0000297),  # 0.00297%
-                    ('TRANSACTION_CHARGES', 'NSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.0000297),  # 0.00297%
-                    ('STT', 'NSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.001),  # 0.1%
-                    ('STT', 'NSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.001),  # 0.1%
-                    ('STAMP_CHARGES', 'NSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.00015),  # 0.015%
-                    ('STAMP_CHARGES', 'NSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.00015),  # 0.015%
-                    ('SEBI', 'NSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.000001),  # 0.0001%
-                    ('SEBI', 'NSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.000001),  # 0.0001%
-                    ('IPFT', 'NSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.000001),  # 0.0001%
-                    ('IPFT', 'NSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.000001),  # 0.0001%
-                    ('GST', 'NSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.18),  # 18%
-                    ('GST', 'NSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.18),  # 18%
-                    
-                    # F&O Equity NSE charges - Options
-                    ('BROKERAGE', 'NSE', 'F&O_EQUITY', 'OPT', 'BUY', 20.00),  # ₹20 per lot
-                    ('BROKERAGE', 'NSE', 'F&O_EQUITY', 'OPT', 'SELL', 20.00),  # ₹20 per lot
-                    ('TRANSACTION_CHARGES', 'NSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.0000297),  # 0.00297%
-                    ('TRANSACTION_CHARGES', 'NSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.0000297),  # 0.00297%
-                    ('STT', 'NSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.001),  # 0.1%
-                    ('STT', 'NSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.001),  # 0.1%
-                    ('STAMP_CHARGES', 'NSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.00015),  # 0.015%
-                    ('STAMP_CHARGES', 'NSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.00015),  # 0.015%
-                    ('SEBI', 'NSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.000001),  # 0.0001%
-                    ('SEBI', 'NSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.000001),  # 0.0001%
-                    ('IPFT', 'NSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.000001),  # 0.0001%
-                    ('IPFT', 'NSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.000001),  # 0.0001%
-                    ('GST', 'NSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.18),  # 18%
-                    ('GST', 'NSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.18),  # 18%
-                    
-                    # F&O Equity BSE charges - Futures
-                    ('BROKERAGE', 'BSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.00),  # ₹0 per lot
-                    ('BROKERAGE', 'BSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.00),  # ₹0 per lot
-                    ('TRANSACTION_CHARGES', 'BSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.0000375),  # 0.00375%
-                    ('TRANSACTION_CHARGES', 'BSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.0000375),  # 0.00375%
-                    ('STT', 'BSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.001),  # 0.1%
-                    ('STT', 'BSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.001),  # 0.1%
-                    ('STAMP_CHARGES', 'BSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.00015),  # 0.015%
-                    ('STAMP_CHARGES', 'BSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.00015),  # 0.015%
-                    ('SEBI', 'BSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.000001),  # 0.0001%
-                    ('SEBI', 'BSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.000001),  # 0.0001%
-                    ('IPFT', 'BSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.0000),  # 0%
-                    ('IPFT', 'BSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.0000),  # 0%
-                    ('GST', 'BSE', 'F&O_EQUITY', 'FUT', 'BUY', 0.18),  # 18%
-                    ('GST', 'BSE', 'F&O_EQUITY', 'FUT', 'SELL', 0.18),  # 18%
-                    
-                    # F&O Equity BSE charges - Options
-                    ('BROKERAGE', 'BSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.00),  # ₹0 per lot
-                    ('BROKERAGE', 'BSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.00),  # ₹0 per lot
-                    ('TRANSACTION_CHARGES', 'BSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.0000375),  # 0.00375%
-                    ('TRANSACTION_CHARGES', 'BSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.0000375),  # 0.00375%
-                    ('STT', 'BSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.001),  # 0.1%
-                    ('STT', 'BSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.001),  # 0.1%
-                    ('STAMP_CHARGES', 'BSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.00015),  # 0.015%
-                    ('STAMP_CHARGES', 'BSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.00015),  # 0.015%
-                    ('SEBI', 'BSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.000001),  # 0.0001%
-                    ('SEBI', 'BSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.000001),  # 0.0001%
-                    ('IPFT', 'BSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.0000),  # 0%
-                    ('IPFT', 'BSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.0000),  # 0%
-                    ('GST', 'BSE', 'F&O_EQUITY', 'OPT', 'BUY', 0.18),  # 18%
-                    ('GST', 'BSE', 'F&O_EQUITY', 'OPT', 'SELL', 0.18),  # 18%
-                    
-                    # F&O Commodity MCX charges - Futures
-                    ('BROKERAGE', 'MCX', 'F&O_COMMODITY', 'FUT', 'BUY', 20.00),  # ₹20 per lot
-                    ('BROKERAGE', 'MCX', 'F&O_COMMODITY', 'FUT', 'SELL', 20.00),  # ₹20 per lot
-                    ('TRANSACTION_CHARGES', 'MCX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.0000297),  # 0.00297%
-                    ('TRANSACTION_CHARGES', 'MCX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.0000297),  # 0.00297%
-                    ('CTT', 'MCX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.001),  # 0.1% (CTT instead of STT)
-                    ('CTT', 'MCX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.001),  # 0.1% (CTT instead of STT)
-                    ('STAMP_CHARGES', 'MCX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.00015),  # 0.015%
-                    ('STAMP_CHARGES', 'MCX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.00015),  # 0.015%
-                    ('SEBI', 'MCX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.000001),  # 0.0001%
-                    ('SEBI', 'MCX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.000001),  # 0.0001%
-                    ('IPFT', 'MCX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.000001),  # 0.0001%
-                    ('IPFT', 'MCX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.000001),  # 0.0001%
-                    ('GST', 'MCX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.18),  # 18%
-                    ('GST', 'MCX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.18),  # 18%
-                    
-                    # F&O Commodity MCX charges - Options
-                    ('BROKERAGE', 'MCX', 'F&O_COMMODITY', 'OPT', 'BUY', 20.00),  # ₹20 per lot
-                    ('BROKERAGE', 'MCX', 'F&O_COMMODITY', 'OPT', 'SELL', 20.00),  # ₹20 per lot
-                    ('TRANSACTION_CHARGES', 'MCX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.0000297),  # 0.00297%
-                    ('TRANSACTION_CHARGES', 'MCX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.0000297),  # 0.00297%
-                    ('CTT', 'MCX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.001),  # 0.1% (CTT instead of STT)
-                    ('CTT', 'MCX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.001),  # 0.1% (CTT instead of STT)
-                    ('STAMP_CHARGES', 'MCX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.00015),  # 0.015%
-                    ('STAMP_CHARGES', 'MCX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.00015),  # 0.015%
-                    ('SEBI', 'MCX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.000001),  # 0.0001%
-                    ('SEBI', 'MCX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.000001),  # 0.0001%
-                    ('IPFT', 'MCX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.000001),  # 0.0001%
-                    ('IPFT', 'MCX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.000001),  # 0.0001%
-                    ('GST', 'MCX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.18),  # 18%
-                    ('GST', 'MCX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.18),  # 18%
-                    
-                    # F&O Commodity NCDEX charges - Futures
-                    ('BROKERAGE', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'BUY', 20.00),  # ₹20 per lot
-                    ('BROKERAGE', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'SELL', 20.00),  # ₹20 per lot
-                    ('TRANSACTION_CHARGES', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.0000297),  # 0.00297%
-                    ('TRANSACTION_CHARGES', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.0000297),  # 0.00297%
-                    ('CTT', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.001),  # 0.1% (CTT instead of STT)
-                    ('CTT', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.001),  # 0.1% (CTT instead of STT)
-                    ('STAMP_CHARGES', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.00015),  # 0.015%
-                    ('STAMP_CHARGES', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.00015),  # 0.015%
-                    ('SEBI', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.000001),  # 0.0001%
-                    ('SEBI', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.000001),  # 0.0001%
-                    ('IPFT', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.000001),  # 0.0001%
-                    ('IPFT', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.000001),  # 0.0001%
-                    ('GST', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'BUY', 0.18),  # 18%
-                    ('GST', 'NCDEX', 'F&O_COMMODITY', 'FUT', 'SELL', 0.18),  # 18%
-                    
-                    # F&O Commodity NCDEX charges - Options
-                    ('BROKERAGE', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'BUY', 20.00),  # ₹20 per lot
-                    ('BROKERAGE', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'SELL', 20.00),  # ₹20 per lot
-                    ('TRANSACTION_CHARGES', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.0000297),  # 0.00297%
-                    ('TRANSACTION_CHARGES', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.0000297),  # 0.00297%
-                    ('CTT', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.001),  # 0.1% (CTT instead of STT)
-                    ('CTT', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.001),  # 0.1% (CTT instead of STT)
-                    ('STAMP_CHARGES', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.00015),  # 0.015%
-                    ('STAMP_CHARGES', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.00015),  # 0.015%
-                    ('SEBI', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.000001),  # 0.0001%
-                    ('SEBI', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.000001),  # 0.0001%
-                    ('IPFT', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.000001),  # 0.0001%
-                    ('IPFT', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.000001),  # 0.0001%
-                    ('GST', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'BUY', 0.18),  # 18%
-                    ('GST', 'NCDEX', 'F&O_COMMODITY', 'OPT', 'SELL', 0.18),  # 18%
-                ]
-                
-                for charge_type, exchange, category, instrument_type, transaction_type, value in default_charges:
-                    cursor.execute('''
-                        INSERT INTO charges (charge_type, exchange, category, instrument_type, transaction_type, value, last_updated)
-                        VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                    ''', (charge_type, exchange, category, instrument_type, transaction_type, value))
-                
-                conn.commit()
-            else:
-                # Check if new columns exist
-                cursor.execute("PRAGMA table_info(charges)")
-                columns = {row[1] for row in cursor.fetchall()}
-                
-                # Add missing columns if needed
-                if 'instrument_type' not in columns:
-                    cursor.execute('ALTER TABLE charges ADD COLUMN instrument_type TEXT DEFAULT "EQUITY"')
-                if 'transaction_type' not in columns:
-                    cursor.execute('ALTER TABLE charges ADD COLUMN transaction_type TEXT DEFAULT "BUY"')
-                
-                # Update existing records to have default values
-                cursor.execute('''
-                    UPDATE charges 
-                    SET instrument_type = "EQUITY", transaction_type = "BUY"
-                    WHERE instrument_type IS NULL OR transaction_type IS NULL
-                ''')
-                
-                # Create a temporary table with the new schema
-                cursor.execute('''
-                    CREATE TABLE charges_new (
-                        charge_type TEXT,
-                        exchange TEXT,
-                        category TEXT,
-                        instrument_type TEXT,
-                        transaction_type TEXT,
-                        value REAL,
-                        last_updated TIMESTAMP,
-                        PRIMARY KEY (charge_type, exchange, category, instrument_type, transaction_type)
-                    )
-                ''')
-                
-                # Copy data to new table with both BUY and SELL entries
-                cursor.execute('''
-                    INSERT INTO charges_new (charge_type, exchange, category, instrument_type, transaction_type, value, last_updated)
-                    SELECT charge_type, exchange, category, instrument_type, transaction_type, value, last_updated
-                    FROM charges
-                ''')
-                
-                # Drop old table and rename new one
-                cursor.execute('DROP TABLE charges')
-                cursor.execute('ALTER TABLE charges_new RENAME TO charges')
-                
-                conn.commit()
+        self.engine = ChargesEngine(db_manager)
 
     def render(self, demat_account_id: int):
         st.title("Transaction Charges")
         
-        # Create tabs for different categories
-        tab1, tab2, tab3 = st.tabs(["Equity Charges", "F&O Equity Charges", "F&O Commodity Charges"])
+        # Only the selected section is built; the charges table is read once per charges version
+        section = st.radio("Section", list(SECTIONS), horizontal=True, label_visibility="collapsed",
+                           key="charges_section")
+        rates = load_charge_rates(self.db_manager.db_name, self.db_manager.get_data_version('charges'))
         
-        def render_category_charges(category: str):
-            """Render charges for a specific category"""
-            with sqlite3.connect(self.db_manager.db_name) as conn:
-                # Get charges for the category
-                charges_df = pd.read_sql_query(
-                    f"""
-                    SELECT charge_type, exchange, category, instrument_type, transaction_type, value
-                    FROM charges
-                    WHERE category = ?
-                    """,
-                    conn,
-                    params=(category,)
-                )
-                
-                if charges_df.empty:
-                    st.warning(f"No charges found for {category}")
-                    return
-                
-                # Define all possible charge types
-                all_charge_types = [
-                    'BROKERAGE',
-                    'DP_CHARGES',
-                    'TRANSACTION_CHARGES',
-                    'STT',
-                    'STAMP_CHARGES',
-                    'SEBI',
-                    'IPFT',
-                    'GST'
-                ]
-                
-                # For EQUITY, pivot by exchange and transaction_type
-                if category == 'EQUITY':
-                    equity_charge_types = all_charge_types  # Show all for equity
-                    
-                    # Ensure all charge types exist
-                    for charge_type in equity_charge_types:
-                        if charge_type not in charges_df['charge_type'].unique():
-                            for exchange in ['NSE', 'BSE']:
-                                for transaction_type in ['BUY', 'SELL']:
-                                    charges_df = pd.concat([charges_df, pd.DataFrame([{
-                                        'charge_type': charge_type,
-                                        'exchange': exchange,
-                                        'category': category,
-                                        'instrument_type': 'EQUITY',
-                                        'transaction_type': transaction_type,
-                                        'value': 0.0
-                                    }])], ignore_index=True)
-                    
-                    # Create pivot table
-                    pivot_df = charges_df.pivot_table(
-                        index=['charge_type'],
-                        columns=['exchange', 'transaction_type'],
-                        values='value',
-                        aggfunc='first'
-                    )
-                    
-                    # Reset index to make charge_type a column
-                    pivot_df = pivot_df.reset_index()
-                    
-                    # Rename columns to make them more readable
-                    pivot_df.columns = ['charge_type'] + [f"{ex}_{tr}" for ex, tr in pivot_df.columns[1:]]
-                    
-                    # Format values based on charge type
-                    for col in pivot_df.columns:
-                        if col != 'charge_type':
-                            # Create a mask for brokerage charges
-                            is_brokerage = pivot_df['charge_type'] == 'BROKERAGE'
-                            
-                            # Convert values to float and handle any non-numeric values
-                            pivot_df[col] = pd.to_numeric(pivot_df[col], errors='coerce').fillna(0)
-                            
-                            # Apply formatting based on the mask
-                            pivot_df.loc[~is_brokerage, col] = pivot_df.loc[~is_brokerage, col].apply(
-                                lambda x: f"₹{float(x):.7f}"
-                            )
-                            pivot_df.loc[is_brokerage, col] = pivot_df.loc[is_brokerage, col].apply(
-                                lambda x: f"₹{float(x):.2f}"
-                            )
-                    
-                    # Sort by charge type order
-                    pivot_df['charge_type'] = pd.Categorical(
-                        pivot_df['charge_type'],
-                        categories=equity_charge_types,
-                        ordered=True
-                    )
-                    pivot_df = pivot_df.sort_values('charge_type')
-                    
-                    # Display the table with explicit column names
-                    st.dataframe(
-                        pivot_df,
-                        use_container_width=True,
-                        column_config={
-                            "charge_type": st.column_config.TextColumn(
-                                "Charge Type",
-                                width="medium",
-                                disabled=True
-                            )
-                        },
-                        hide_index=True
-                    )
-                    
-                    # Create form for updating charges
-                    with st.form(key=f"update_charges_{category}"):
-                        st.subheader("Update Charges")
-                        
-                        # Create input fields for each combination
-                        for charge_type in equity_charge_types:
-                            st.write(f"**{charge_type}**")
-                            cols = st.columns(len(['NSE', 'BSE']) * 2)  # 2 columns per exchange (BUY/SELL)
-                            
-                            for i, exchange in enumerate(['NSE', 'BSE']):
-                                try:
-                                    # Get current values
-                                    buy_value = pivot_df.loc[
-                                        pivot_df['charge_type'] == charge_type,
-                                        (exchange, 'BUY')
-                                    ].values[0].replace('₹', '').replace(',', '')
-                                    
-                                    sell_value = pivot_df.loc[
-                                        pivot_df['charge_type'] == charge_type,
-                                        (exchange, 'SELL')
-                                    ].values[0].replace('₹', '').replace(',', '')
-                                except (KeyError, IndexError):
-                                    buy_value = "0.00"
-                                    sell_value = "0.00"
-                                
-                                # Create input fields
-                                with cols[i*2]:
-                                    st.text_input(
-                                        f"{exchange} Buy",
-                                        value=buy_value,
-                                        key=f"{category}_{charge_type}_{exchange}_buy"
-                                    )
-                                with cols[i*2+1]:
-                                    st.text_input(
-                                        f"{exchange} Sell",
-                                        value=sell_value,
-                                        key=f"{category}_{charge_type}_{exchange}_sell"
-                                    )
-                    
-                        if st.form_submit_button("Update Charges"):
-                            # Update charges in database
-                            for charge_type in equity_charge_types:
-                                for exchange in ['NSE', 'BSE']:
-                                    # Get new values
-                                    buy_value = st.session_state[f"{category}_{charge_type}_{exchange}_buy"]
-                                    sell_value = st.session_state[f"{category}_{charge_type}_{exchange}_sell"]
-                                    
-                                    # Update BUY value
-                                    cursor = conn.cursor()
-                                    cursor.execute('''
-                                        UPDATE charges
-                                        SET value = ?, last_updated = CURRENT_TIMESTAMP
-                                        WHERE charge_type = ? AND exchange = ? AND category = ? AND instrument_type = ? AND transaction_type = ?
-                                    ''', (float(buy_value), charge_type, exchange, category, 'EQUITY', 'BUY'))
-                                    
-                                    # Update SELL value
-                                    cursor.execute('''
-                                        UPDATE charges
-                                        SET value = ?, last_updated = CURRENT_TIMESTAMP
-                                        WHERE charge_type = ? AND exchange = ? AND category = ? AND instrument_type = ? AND transaction_type = ?
-                                    ''', (float(sell_value), charge_type, exchange, category, 'EQUITY', 'SELL'))
-                                    
-                                    conn.commit()
-                            
-                            st.success("Charges updated successfully!")
-                            st.rerun()
-                
-                # For F&O, pivot by exchange, instrument_type, and transaction_type
-                else:
-                    # Define charge types based on category
-                    if category == 'F&O_EQUITY':
-                        fno_charge_types = [
-                            'BROKERAGE',
-                            'TRANSACTION_CHARGES',
-                            'STT',
-                            'STAMP_CHARGES',
-                            'SEBI',
-                            'IPFT',
-                            'GST'
-                        ]
-                        exchanges = ['NSE', 'BSE']
-                    else:  # F&O_COMMODITY
-                        fno_charge_types = [
-                            'BROKERAGE',
-                            'TRANSACTION_CHARGES',
-                            'CTT',
-                            'STAMP_CHARGES',
-                            'SEBI',
-                            'IPFT',
-                            'GST'
-                        ]
-                        exchanges = ['MCX', 'NCDEX']
-                    
-                    # First, ensure we have the correct instrument types in the database
-                    cursor = conn.cursor()
-                    
-                    # Clean up old data for F&O_COMMODITY
-                    if category == 'F&O_COMMODITY':
-                        cursor.execute('''
-                            DELETE FROM charges 
-                            WHERE category = ? AND exchange IN ('NSE', 'BSE')
-                        ''', (category,))
-                    
-                    # Delete any EQUITY instrument types
-                    cursor.execute('''
-                        DELETE FROM charges 
-                        WHERE category = ? AND instrument_type = 'EQUITY'
-                    ''', (category,))
-                    
-                    # Ensure all charge types exist with correct instrument types
-                    for charge_type in fno_charge_types:
-                        if charge_type not in charges_df['charge_type'].unique():
-                            for exchange in exchanges:
-                                for instrument_type in ['FUT', 'OPT']:
-                                    for transaction_type in ['BUY', 'SELL']:
-                                        # Check if the record exists
-                                        cursor.execute('''
-                                            SELECT value FROM charges 
-                                            WHERE charge_type = ? AND exchange = ? AND category = ? 
-                                            AND instrument_type = ? AND transaction_type = ?
-                                        ''', (charge_type, exchange, category, instrument_type, transaction_type))
-                                        
-                                        result = cursor.fetchone()
-                                        if result is None:
-                                            # Insert new record
-                                            cursor.execute('''
-                                                INSERT INTO charges (
-                                                    charge_type, exchange, category, instrument_type, 
-                                                    transaction_type, value, last_updated
-                                                ) VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                                            ''', (charge_type, exchange, category, instrument_type, transaction_type, 0.0))
-                    
-                    conn.commit()
-                    
-                    # Get updated charges
-                    charges_df = pd.read_sql_query(
-                        f"""
-                        SELECT charge_type, exchange, category, instrument_type, transaction_type, value
-                        FROM charges
-                        WHERE category = ? AND instrument_type IN ('FUT', 'OPT')
-                        """,
-                        conn,
-                        params=(category,)
-                    )
-                    
-                    # Filter out any charge types that don't exist in the data
-                    existing_charge_types = charges_df['charge_type'].unique()
-                    fno_charge_types = [ct for ct in fno_charge_types if ct in existing_charge_types]
-                    
-                    # Create pivot table
-                    pivot_df = charges_df.pivot_table(
-                        index=['charge_type'],
-                        columns=['exchange', 'instrument_type', 'transaction_type'],
-                        values='value',
-                        aggfunc='first'
-                    )
-                    
-                    # Reset index to make charge_type a column
-                    pivot_df = pivot_df.reset_index()
-                    
-                    # Rename columns to make them more readable
-                    pivot_df.columns = ['charge_type'] + [f"{ex}_{inst}_{tr}" for ex, inst, tr in pivot_df.columns[1:]]
-                    
-                    # Filter columns to only show relevant exchanges
-                    valid_columns = ['charge_type'] + [col for col in pivot_df.columns[1:] if col.split('_')[0] in exchanges]
-                    pivot_df = pivot_df[valid_columns]
-                    
-                    # Format values based on charge type
-                    for col in pivot_df.columns:
-                        if col != 'charge_type':
-                            # Create a mask for brokerage charges
-                            is_brokerage = pivot_df['charge_type'] == 'BROKERAGE'
-                            
-                            # Convert values to float and handle any non-numeric values
-                            pivot_df[col] = pd.to_numeric(pivot_df[col], errors='coerce').fillna(0)
-                            
-                            # Apply formatting based on the mask
-                            pivot_df.loc[~is_brokerage, col] = pivot_df.loc[~is_brokerage, col].apply(
-                                lambda x: f"₹{float(x):.7f}"
-                            )
-                            pivot_df.loc[is_brokerage, col] = pivot_df.loc[is_brokerage, col].apply(
-                                lambda x: f"₹{float(x):.2f}"
-                            )
-                    
-                    # Sort by charge type order and filter to only show existing charge types
-                    pivot_df['charge_type'] = pd.Categorical(
-                        pivot_df['charge_type'],
-                        categories=fno_charge_types,
-                        ordered=True
-                    )
-                    pivot_df = pivot_df.sort_values('charge_type')
-                    pivot_df = pivot_df[pivot_df['charge_type'].isin(fno_charge_types)]
-                    
-                    # Display the table with explicit column names
-                    st.dataframe(
-                        pivot_df,
-                        use_container_width=True,
-                        column_config={
-                            "charge_type": st.column_config.TextColumn(
-                                "Charge Type",
-                                width="medium",
-                                disabled=True
-                            )
-                        },
-                        hide_index=True
-                    )
-                    
-                    # Create form for updating charges
-                    with st.form(key=f"update_charges_{category}"):
-                        st.subheader("Update Charges")
-                        
-                        # Create input fields for each combination
-                        for charge_type in fno_charge_types:
-                            st.write(f"**{charge_type}**")
-                            
-                            for instrument_type in ['FUT', 'OPT']:
-                                st.write(f"*{instrument_type}*")
-                                cols = st.columns(len(exchanges) * 2)  # 2 columns per exchange (BUY/SELL)
-                                
-                                for i, exchange in enumerate(exchanges):
-                                    try:
-                                        # Get current values
-                                        buy_value = pivot_df.loc[
-                                            pivot_df['charge_type'] == charge_type,
-                                            f"{exchange}_{instrument_type}_BUY"
-                                        ].values[0].replace('₹', '').replace(',', '')
-                                        
-                                        sell_value = pivot_df.loc[
-                                            pivot_df['charge_type'] == charge_type,
-                                            f"{exchange}_{instrument_type}_SELL"
-                                        ].values[0].replace('₹', '').replace(',', '')
-                                    except (KeyError, IndexError):
-                                        buy_value = "0.00"
-                                        sell_value = "0.00"
-                                    
-                                    # Create input fields
-                                    with cols[i*2]:
-                                        st.text_input(
-                                            f"{exchange} Buy",
-                                            value=buy_value,
-                                            key=f"{category}_{charge_type}_{exchange}_{instrument_type}_buy"
-                                        )
-                                    with cols[i*2+1]:
-                                        st.text_input(
-                                            f"{exchange} Sell",
-                                            value=sell_value,
-                                            key=f"{category}_{charge_type}_{exchange}_{instrument_type}_sell"
-                                        )
-                        
-                        if st.form_submit_button("Update Charges"):
-                            # Update charges in database
-                            for charge_type in fno_charge_types:
-                                for exchange in exchanges:
-                                    for instrument_type in ['FUT', 'OPT']:
-                                        # Get new values
-                                        buy_value = st.session_state[f"{category}_{charge_type}_{exchange}_{instrument_type}_buy"]
-                                        sell_value = st.session_state[f"{category}_{charge_type}_{exchange}_{instrument_type}_sell"]
-                                        
-                                        # Update BUY value
-                                        cursor = conn.cursor()
-                                        cursor.execute('''
-                                            UPDATE charges
-                                            SET value = ?, last_updated = CURRENT_TIMESTAMP
-                                            WHERE charge_type = ? AND exchange = ? AND category = ? AND instrument_type = ? AND transaction_type = ?
-                                        ''', (float(buy_value), charge_type, exchange, category, instrument_type, 'BUY'))
-                                        
-                                        # Update SELL value
-                                        cursor.execute('''
-                                            UPDATE charges
-                                            SET value = ?, last_updated = CURRENT_TIMESTAMP
-                                            WHERE charge_type = ? AND exchange = ? AND category = ? AND instrument_type = ? AND transaction_type = ?
-                                        ''', (float(sell_value), charge_type, exchange, category, instrument_type, 'SELL'))
-                                        
-                                        conn.commit()
-                            
-                            st.success("Charges updated successfully!")
-                            st.rerun()
+        if SECTIONS[section] is not None:
+            self.render_category_charges(SECTIONS[section], rates)
+        elif section == "Restate Transactions":
+            self.render_restatement(demat_account_id)
+        else:
+            self.render_simulator(demat_account_id, rates)
+
+    def render_category_charges(self, category: str, rates: pd.DataFrame):
+        """Render the rate sheet of a category as an editable grid"""
+        sheet = rate_sheet(rates, category)
+        columns = list(sheet.columns)
+        # Equity has a single instrument type, so it is left out of the column labels
+        labels = [
+            f"{exchange} {transaction_type.title()}" if instrument_type == 'EQUITY'
+            else f"{exchange} {instrument_type} {transaction_type.title()}"
+            for exchange, instrument_type, transaction_type in columns
+        ]
+        sheet.columns = labels
         
-        # Render each category in its tab
-        with tab1:
-            render_category_charges('EQUITY')
+        def column_config(number_format: str, step: float) -> dict:
+            config = {"_index": st.column_config.TextColumn("Charge Type", disabled=True)}
+            for label in labels:
+                config[label] = st.column_config.NumberColumn(label, format=number_format, min_value=0.0, step=step)
+            return config
         
-        with tab2:
-            render_category_charges('F&O_EQUITY')
+        with st.form(key=f"update_charges_{category}"):
+            st.subheader("Update Charges")
+            effective_from = st.date_input(
+                "Effective From",
+                value=date.today(),
+                min_value=date(1900, 1, 1),
+                key=f"{category}_effective_from",
+                help="Trades on or after this date are charged at the new rates; earlier trades keep "
+                     "the rates that were in force on their date"
+            )
+            
+            st.write("**Brokerage** (₹ per order)")
+            brokerage = st.data_editor(
+                sheet.loc[['BROKERAGE']],
+                use_container_width=True,
+                column_config=column_config("₹%.2f", 0.01),
+                key=f"{category}_brokerage"
+            )
+            st.write("**Rates** (fraction of the trade value; GST as a fraction of the taxed charges)")
+            percentages = st.data_editor(
+                sheet.drop(index='BROKERAGE'),
+                use_container_width=True,
+                column_config=column_config("%.7f", 0.0000001),
+                key=f"{category}_rates"
+            )
+            
+            if st.form_submit_button("Update Charges"):
+                # Send only the cells edited in the grid, so other rates keep their history and
+                # scheduled changes; set_rates writes those that differ on the date, in one transaction
+                edited = pd.concat([brokerage, percentages]).fillna(0.0)
+                updated = self.engine.set_rates([
+                    (charge_type, exchange, category, instrument_type, transaction_type, float(edited.at[charge_type, label]))
+                    for charge_type in edited.index
+                    for (exchange, instrument_type, transaction_type), label in zip(columns, labels)
+                    if edited.at[charge_type, label] != sheet.at[charge_type, label]
+                ], effective_from)
+                if updated:
+                    st.success(f"Charges updated successfully! ({updated} rate(s) changed)")
+                    st.rerun()
+                st.info("No rates changed")
         
-        with tab3:
-            render_category_charges('F&O_COMMODITY')
+        # Periods of rates that have changed over time
+        with st.expander("Rate History"):
+            history_df = rates[
+                (rates['category'] == category)
+                & ((rates['effective_from'] > EARLIEST_EFFECTIVE_DATE) | rates['effective_to'].notna())
+            ].drop(columns='category')
+            if history_df.empty:
+                st.info("No rate changes recorded; the rates above apply to all trade dates")
+            else:
+                st.dataframe(
+                    history_df,
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config={"value": st.column_config.NumberColumn("value", format="%.7f")}
+                )
 
-    def calculate_charges(self, transaction_amount: float, transaction_type: str, exchange: str = 'NSE', category: str = 'EQUITY', instrument_type: str = 'EQUITY') -> Tuple[Dict[str, float], float]:
-        """
-        Calculate all applicable charges for a transaction amount based on transaction type, exchange, and category
+    def render_simulator(self, demat_account_id: int, current_rates: pd.DataFrame):
+        """Compare the charges paid over a period under alternative rate tables"""
+        st.write("Price your trade history with other rate tables, e.g. a competing broker's brokerage and DP "
+                 "schedule. Rate tables use the same layout as the charges table, with optional effective_from "
+                 "and effective_to dates; download the current rates as a template.")
         
-        Args:
-            transaction_amount: The gross value of the transaction (price * quantity)
-            transaction_type: Type of transaction (BUY, SELL, IPO, BONUS, RIGHT, BUYBACK, DEMERGER, MERGER)
-            exchange: Exchange where transaction was made (NSE or BSE)
-            category: Transaction category (EQUITY, F&O_EQUITY, F&O_COMMODITY)
-            instrument_type: Type of instrument (EQUITY, FUT, OPT)
-            
-        Returns:
-            Tuple containing:
-            - Dictionary of charges with their amounts
-            - Total charges
-        """
-        # For BUYBACK, use SELL rates since they have the same charge structure
-        lookup_transaction_type = 'SELL' if transaction_type == 'BUYBACK' else transaction_type
+        simulator = ChargesSimulator(self.db_manager)
+        st.download_button(
+            "Download Current Rates (CSV)",
+            current_rates.to_csv(index=False),
+            file_name="charges.csv",
+            mime="text/csv"
+        )
+        
+        accounts = self.db_manager.get_demat_accounts()
+        account_names = {account['id']: account['name'] for account in accounts}
+        account_ids = st.multiselect(
+            "Demat Accounts",
+            list(account_names.keys()),
+            default=[demat_account_id],
+            format_func=lambda account_id: account_names[account_id],
+            key="simulator_accounts"
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            start_date = st.date_input("From", value=date(2000, 4, 1), key="simulator_start")
+        with col2:
+            end_date = st.date_input("To", value=date.today(), key="simulator_end")
         
-        # Force a fresh read from the database each time
-        with sqlite3.connect(self.db_manager.db_name) as conn:
-            charges_df = pd.read_sql_query(
-                """
-                SELECT charge_type, exchange, category, instrument_type, transaction_type, value 
-                FROM charges 
-                WHERE exchange = ? AND category = ? AND instrument_type = ? AND transaction_type = ?
-                """,
-                conn,
-                params=(exchange, category, instrument_type, lookup_transaction_type)
+        uploaded_files = st.file_uploader("Alternative Rate Tables", type=["csv"], accept_multiple_files=True)
+        schedules = {}
+        for uploaded_file in uploaded_files or []:
+            try:
+                schedules[uploaded_file.name.rsplit('.', 1)[0]] = read_rate_table(uploaded_file)
+            except ValueError as e:
+                st.error(f"{uploaded_file.name}: {e}")
+        
+        with st.expander("Edit a schedule here instead"):
+            edited_rates = st.data_editor(
+                current_rates,
+                use_container_width=True,
+                hide_index=True,
+                disabled=['charge_type', 'exchange', 'category', 'instrument_type', 'transaction_type',
+                          'effective_from', 'effective_to'],
+                key="simulator_rates"
             )
+        if not edited_rates.equals(current_rates):
+            schedules['Edited'] = edited_rates
         
-        # Convert charges DataFrame to dictionary
-        charge_rates = {}
-        for _, row in charges_df.iterrows():
-            key = (row['charge_type'], row['transaction_type'])
-            charge_rates[key] = row['value']
-
-        charges = {}
+        if not account_ids:
+            st.info("Select at least one demat account")
+            return
+        if not schedules:
+            st.info("Upload or edit a rate table to compare")
+            return
         
-        # Helper function to calculate GST
-        def calculate_gst(base_charges):
-            return sum(base_charges) * charge_rates.get(('GST', lookup_transaction_type), 0)
+        trades = load_simulation_trades(
+            self.db_manager.db_name, tuple(account_ids), start_date, end_date, self.db_manager.get_data_version()
+        )
+        if trades.empty:
+            st.info("No charged transactions in this range")
+            return
         
-        # Helper function to calculate DP charges with minimum threshold (for SELL only)
-        def calculate_dp_charges_sell(amount):
-            dp_charge = amount * charge_rates.get(('DP_CHARGES', lookup_transaction_type), 0)
-            return max(dp_charge, 20.0) if dp_charge > 0 else 0
+        comparison = simulator.compare(trades, schedules)
+        st.write(f"Simulated over {len(trades)} transaction(s)")
+        cols = st.columns(len(schedules))
+        for col, name in zip(cols, schedules):
+            with col:
+                st.metric(
+                    f"{name} Total",
+                    f"₹{comparison.loc['TOTAL', name]:,.2f}",
+                    delta=f"₹{comparison.loc['TOTAL', name] - comparison.loc['TOTAL', 'Current']:,.2f} vs current",
+                    delta_color="inverse"
+                )
         
-        # Helper function to calculate DP charges without minimum threshold (for BUY)
-        def calculate_dp_charges_buy(amount):
-            return amount * charge_rates.get(('DP_CHARGES', lookup_transaction_type), 0)
+        comparison.index = [charge_type.replace('_', ' ').title() for charge_type in comparison.index]
+        for name in schedules:
+            comparison[f"{name} vs Current"] = comparison[name] - comparison['Current']
+        st.dataframe(
+            comparison,
+            use_container_width=True,
+            column_config={column: st.column_config.NumberColumn(column, format="₹%.2f") for column in comparison.columns}
+        )
+
+    def render_restatement(self, demat_account_id: int):
+        """Recompute stored amounts of existing transactions after a rate change"""
+        st.write("Re-apply the rates in force on each trade date to transactions that were recorded with older charges. "
+                 "Preview the changes first; applying them updates the stored amounts.")
         
-        # Initialize all charges to 0
-        for charge_type in ['BROKERAGE', 'DP_CHARGES', 'TRANSACTION_CHARGES', 'STT', 'CTT', 'STAMP_CHARGES', 'SEBI', 'IPFT', 'GST']:
-            charges[charge_type] = 0
+        accounts = self.db_manager.get_demat_accounts()
+        account_names = {account['id']: account['name'] for account in accounts}
+        today = date.today()
+        fy_start = date(today.year if today.month >= 4 else today.year - 1, 4, 1)
         
-        # Calculate charges based on transaction type
-        if transaction_type == 'BUY':
-            # Brokerage
-            charges['BROKERAGE'] = charge_rates.get(('BROKERAGE', 'BUY'), 0)
-            
-            # DP Charges (only for equity) - set to 0 for BUY
-            if category == 'EQUITY':
-                charges['DP_CHARGES'] = 0
-            
-            # Transaction Charges
-            charges['TRANSACTION_CHARGES'] = transaction_amount * charge_rates.get(('TRANSACTION_CHARGES', 'BUY'), 0)
-            
-            # STT/CTT based on category
-            if category == 'F&O_COMMODITY':
-                charges['CTT'] = transaction_amount * charge_rates.get(('CTT', 'BUY'), 0)
-            else:
-                charges['STT'] = transaction_amount * charge_rates.get(('STT', 'BUY'), 0)
-            
-            # Stamp Charges (only for BUY)
-            charges['STAMP_CHARGES'] = transaction_amount * charge_rates.get(('STAMP_CHARGES', 'BUY'), 0)
-            
-            # SEBI
-            charges['SEBI'] = transaction_amount * charge_rates.get(('SEBI', 'BUY'), 0)
-            
-            # IPFT (only for NSE)
-            if exchange == 'NSE':
-                charges['IPFT'] = transaction_amount * charge_rates.get(('IPFT', 'BUY'), 0)
-            
-            # Calculate GST on applicable charges
-            gst_base = [
-                charges['BROKERAGE'],
-                charges['TRANSACTION_CHARGES'],
-                charges['SEBI']
-            ]
-            charges['GST'] = calculate_gst(gst_base)
-            
-        elif transaction_type in ['IPO', 'BONUS', 'RIGHT', 'MERGER & ACQUISITION']:
-            # No charges for IPO, BONUS, RIGHT, and MERGER & ACQUISITION transactions
-            pass
-            
-        elif transaction_type == 'DEMERGER':
-            # Brokerage
-            charges['BROKERAGE'] = charge_rates.get(('BROKERAGE', 'BUY'), 0)
-            
-            # DP Charges (only for equity)
-            if category == 'EQUITY':
-                charges['DP_CHARGES'] = calculate_dp_charges_buy(transaction_amount)
-            
-            # Transaction Charges
-            charges['TRANSACTION_CHARGES'] = transaction_amount * charge_rates.get(('TRANSACTION_CHARGES', 'BUY'), 0)
-            
-            # STT/CTT based on category
-            if category == 'F&O_COMMODITY':
-                charges['CTT'] = transaction_amount * charge_rates.get(('CTT', 'BUY'), 0)
-            else:
-                charges['STT'] = transaction_amount * charge_rates.get(('STT', 'BUY'), 0)
-            
-            # Stamp Charges (for DEMERGER)
-            charges['STAMP_CHARGES'] = transaction_amount * charge_rates.get(('STAMP_CHARGES', 'BUY'), 0)
-            
-            # SEBI
-            charges['SEBI'] = transaction_amount * charge_rates.get(('SEBI', 'BUY'), 0)
-            
-            # IPFT (only for NSE)
-            if exchange == 'NSE':
-                charges['IPFT'] = transaction_amount * charge_rates.get(('IPFT', 'BUY'), 0)
-            
-            # Calculate GST on applicable charges
-            gst_base = [
-                charges['BROKERAGE'],
-                charges['TRANSACTION_CHARGES'],
-                charges['SEBI']
-            ]
-            charges['GST'] = calculate_gst(gst_base)
-            
-        elif transaction_type == 'SELL':
-            # For SELL transactions
-            # Brokerage is 0
-            charges['BROKERAGE'] = charge_rates.get(('BROKERAGE', 'SELL'), 0)
-            
-            # DP Charges with minimum threshold (0.04% or ₹20, whichever is higher)
-            if category == 'EQUITY':
-                charges['DP_CHARGES'] = calculate_dp_charges_sell(transaction_amount)
-            
-            # Transaction Charges
-            charges['TRANSACTION_CHARGES'] = transaction_amount * charge_rates.get(('TRANSACTION_CHARGES', 'SELL'), 0)
-            
-            # STT/CTT based on category
-            if category == 'F&O_COMMODITY':
-                charges['CTT'] = transaction_amount * charge_rates.get(('CTT', 'SELL'), 0)
-            else:
-                charges['STT'] = transaction_amount * charge_rates.get(('STT', 'SELL'), 0)
-            
-            # Stamp Charges (0 for SELL)
-            charges['STAMP_CHARGES'] = 0
-            
-            # SEBI
-            charges['SEBI'] = transaction_amount * charge_rates.get(('SEBI', 'SELL'), 0)
-            
-            # IPFT (only for NSE)
-            if exchange == 'NSE':
-                charges['IPFT'] = transaction_amount * charge_rates.get(('IPFT', 'SELL'), 0)
-            else:
-                charges['IPFT'] = 0
-            
-            # Calculate GST on applicable charges (Brokerage + Transaction Charges + SEBI)
-            gst_base = [
-                charges['BROKERAGE'],
-                charges['TRANSACTION_CHARGES'],
-                charges['SEBI']
-            ]
-            charges['GST'] = calculate_gst(gst_base)
-            
-        elif transaction_type == 'BUYBACK':
-            # For BUYBACK, charges are similar to SELL
-            # Brokerage is 0
-            charges['BROKERAGE'] = charge_rates.get(('BROKERAGE', lookup_transaction_type), 0)
-            
-            # DP Charges with minimum threshold (0.04% or ₹20, whichever is higher)
-            if category == 'EQUITY':
-                charges['DP_CHARGES'] = calculate_dp_charges_sell(transaction_amount)
-            
-            # Transaction Charges
-            charges['TRANSACTION_CHARGES'] = transaction_amount * charge_rates.get(('TRANSACTION_CHARGES', lookup_transaction_type), 0)
-            
-            # STT/CTT based on category
-            if category == 'F&O_COMMODITY':
-                charges['CTT'] = transaction_amount * charge_rates.get(('CTT', lookup_transaction_type), 0)
-            else:
-                charges['STT'] = transaction_amount * charge_rates.get(('STT', lookup_transaction_type), 0)
-            
-            # Stamp Charges (0 for BUYBACK)
-            charges['STAMP_CHARGES'] = 0
-            
-            # SEBI
-            charges['SEBI'] = transaction_amount * charge_rates.get(('SEBI', lookup_transaction_type), 0)
-            
-            # IPFT (only for NSE)
-            if exchange == 'NSE':
-                charges['IPFT'] = transaction_amount * charge_rates.get(('IPFT', lookup_transaction_type), 0)
-            else:
-                charges['IPFT'] = 0
-            
-            # Calculate GST on applicable charges (Brokerage + Transaction Charges + SEBI)
-            gst_base = [
-                charges['BROKERAGE'],
-                charges['TRANSACTION_CHARGES'],
-                charges['SEBI']
-            ]
-            charges['GST'] = calculate_gst(gst_base)
+        with st.form("restate_charges"):
+            account_ids = st.multiselect(
+                "Demat Accounts",
+                list(account_names.keys()),
+                default=[demat_account_id],
+                format_func=lambda account_id: account_names[account_id]
+            )
+            col1, col2 = st.columns(2)
+            with col1:
+                start_date = st.date_input("From", value=fy_start, max_value=today)
+                exchanges = st.multiselect("Exchanges", ["NSE", "BSE", "MCX", "NCDEX"], help="Leave empty for all exchanges")
+            with col2:
+                end_date = st.date_input("To", value=today, max_value=today)
+                categories = st.multiselect("Categories", ["EQUITY", "F&O EQUITY", "F&O COMMODITY"], help="Leave empty for all categories")
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                preview_clicked = st.form_submit_button("Preview Changes")
+            with col2:
+                apply_clicked = st.form_submit_button("Apply Restatement", type="primary")
+        
+        if not (preview_clicked or apply_clicked):
+            return
+        if not account_ids:
+            st.error("Please select at least one demat account")
+            return
+        if start_date > end_date:
+            st.error("The start date must not be after the end date")
+            return
         
-        # Calculate total charges
-        total_charges = sum(charges.values())
+        restatement = ChargeRestatement(self.db_manager)
+        scope = RestatementScope(account_ids, start_date, end_date, exchanges, categories)
+        
+        if preview_clicked:
+            changes = restatement.preview(scope)
+            if changes.empty:
+                st.info("All transactions in this range already match the current rates")
+                return
+            st.write(f"{len(changes)} transaction(s) would change | "
+                     f"Total amount change: ₹{changes['amount_delta'].sum():,.2f}")
+            changes['account'] = changes['demat_account_id'].map(account_names)
+            st.dataframe(
+                changes[[
+                    'account', 'date', 'scrip_name', 'transaction_type', 'transaction_category', 'exchange',
+                    'num_shares', 'rate', 'old_charges', 'new_charges', 'old_amount', 'new_amount', 'amount_delta'
+                ]],
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "rate": st.column_config.NumberColumn("Rate", format="₹%.2f"),
+                    "old_charges": st.column_config.NumberColumn("Stored Charges", format="₹%.2f"),
+                    "new_charges": st.column_config.NumberColumn("New Charges", format="₹%.2f"),
+                    "old_amount": st.column_config.NumberColumn("Stored Amount", format="₹%.2f"),
+                    "new_amount": st.column_config.NumberColumn("New Amount", format="₹%.2f"),
+                    "amount_delta": st.column_config.NumberColumn("Change", format="₹%.2f")
+                }
+            )
         
-        return charges, total_charges 
\ No newline at end of file
+        if apply_clicked:
+            progress_bar = st.progress(0.0, text="Restating...")
+            
+            def update_progress(fraction, result):
+                progress_bar.progress(fraction, text=f"Restated {result.rows_restated} transaction(s)...")
+            
+            try:
+                result = restatement.apply(scope, update_progress)
+            except RuntimeError as e:
+                st.error(str(e))
+                return
+            progress_bar.progress(1.0, text="Restatement complete")
+            st.success(f"Restated {result.rows_restated} transaction(s); "
+                       f"total amount change ₹{result.amount_delta:,.2f}")
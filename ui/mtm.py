@@ -0,0 +1,96 @@
+import streamlit as st
+from datetime import date, timedelta
+from models.database import DatabaseManager
+from models.mtm import MarkToMarket
+
+class MarkToMarketView:
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+        self.mtm = MarkToMarket(db_manager)
+
+    def render(self, demat_account_id: int):
+        st.title("F&O Futures Mark-to-Market")
+
+        with st.expander("Import Settlement Prices"):
+            st.write("Upload an exchange bhavcopy (or any CSV with scrip_name, expiry_date, date and "
+                     "settlement_price columns). Only futures rows are stored; re-importing a day replaces its prices.")
+            col1, col2 = st.columns(2)
+            with col1:
+                category = st.selectbox("Segment", ["F&O EQUITY", "F&O COMMODITY"])
+            with col2:
+                exchange = st.selectbox("Exchange", ["MCX", "NCDEX"] if category == "F&O COMMODITY" else ["NSE", "BSE"])
+            uploaded_file = st.file_uploader("Bhavcopy (CSV)", type=["csv"])
+            if uploaded_file is not None and st.button("Import Prices"):
+                try:
+                    uploaded_file.seek(0)
+                    stored = self.mtm.import_bhavcopy(uploaded_file, category, exchange)
+                except ValueError as e:
+                    st.error(str(e))
+                    return
+                if stored < 0:
+                    st.error("Error saving settlement prices")
+                else:
+                    st.success(f"Stored {stored} settlement price(s)")
+
+        accounts = self.db_manager.get_demat_accounts()
+        account_names = {account['id']: account['name'] for account in accounts}
+        today = date.today()
+
+        with st.form("daily_mtm"):
+            account_ids = st.multiselect(
+                "Demat Accounts",
+                list(account_names.keys()),
+                default=[demat_account_id],
+                format_func=lambda account_id: account_names[account_id]
+            )
+            col1, col2 = st.columns(2)
+            with col1:
+                start_date = st.date_input("From", value=today - timedelta(days=90), max_value=today)
+            with col2:
+                end_date = st.date_input("To", value=today, max_value=today)
+            submitted = st.form_submit_button("Compute MTM")
+
+        if not submitted:
+            return
+        if not account_ids:
+            st.error("Please select at least one demat account")
+            return
+        if start_date > end_date:
+            st.error("The start date must not be after the end date")
+            return
+
+        report = self.mtm.daily_mtm(account_ids, start_date, end_date)
+        if report.empty:
+            st.info("No open futures positions with settlement prices in this range")
+            return
+
+        report['account'] = report['demat_account_id'].map(account_names)
+        st.metric("Total MTM", f"₹{report['mtm'].sum():,.2f}")
+
+        st.subheader("Daily MTM by Account")
+        daily = report.pivot_table(index='date', columns='account', values='mtm', aggfunc='sum', fill_value=0.0)
+        st.dataframe(daily.round(2), use_container_width=True)
+
+        st.subheader("Daily MTM by Contract")
+        st.dataframe(
+            report[[
+                'account', 'date', 'scrip_name', 'transaction_category', 'expiry_day', 'quantity',
+                'traded_quantity', 'previous_price', 'settlement_price', 'mtm'
+            ]],
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "account": st.column_config.TextColumn("Account"),
+                "date": st.column_config.TextColumn("Date"),
+                "scrip_name": st.column_config.TextColumn("Scrip"),
+                "transaction_category": st.column_config.TextColumn("Category"),
+                "expiry_day": st.column_config.TextColumn("Expiry"),
+                "quantity": st.column_config.NumberColumn(
+                    "Quantity", help="Position at the day's settlement (negative indicates short position)"
+                ),
+                "traded_quantity": st.column_config.NumberColumn("Traded", help="Net quantity bought (+) or sold (-) that day"),
+                "previous_price": st.column_config.NumberColumn("Previous Settlement", format="₹%.2f"),
+                "settlement_price": st.column_config.NumberColumn("Settlement", format="₹%.2f"),
+                "mtm": st.column_config.NumberColumn("MTM", format="₹%.2f")
+            }
+        )
@@ -0,0 +1,54 @@
+import streamlit as st
+import pandas as pd
+from models.portfolio import PortfolioManager
+from models.price_history import PriceHistory, PRICE_HISTORY_DIR, equity_curve, benchmark_index
+
+# Benchmarks offered first when the store has them
+DEFAULT_BENCHMARKS = ['NIFTY 50', 'NIFTY', 'NIFTYBEES', 'SENSEX']
+
+class PerformanceView:
+    def __init__(self, portfolio_manager: PortfolioManager):
+        self.portfolio_manager = portfolio_manager
+
+    def render(self, demat_account_id: int):
+        st.title("Equity Portfolio Performance")
+
+        if not PriceHistory.exists():
+            st.info("No price history found. Build it from a folder of end-of-day CSV files "
+                    f"(exchange bhavcopies or scrip_name/date/close files) with:\n\n"
+                    f"`python -m models.price_history path/to/eod_files --output {PRICE_HISTORY_DIR}`")
+            return
+
+        history = PriceHistory()
+        result = equity_curve(history, self.portfolio_manager.get_equity_flows(demat_account_id))
+        curve = result.curve
+        if curve.empty:
+            st.info("No equity transactions within the price history")
+            return
+
+        latest = curve.iloc[-1]
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Market Value", f"₹{latest['value']:,.2f}", help=f"At closes of {curve.index[-1]:%Y-%m-%d}")
+        col2.metric("Net Invested", f"₹{latest['invested']:,.2f}")
+        col3.metric("Time-Weighted Return", f"{latest['twr_index'] / 100 - 1:.2%}")
+        col4.metric("Max Drawdown", f"{curve['drawdown'].min():.2%}")
+
+        if result.unpriced:
+            st.warning(f"No price history for {len(result.unpriced)} held scrip(s), valued at zero: "
+                       f"{', '.join(result.unpriced[:20])}")
+
+        st.subheader("Value vs Net Invested")
+        st.line_chart(curve[['value', 'invested']].rename(columns={'value': 'Market Value', 'invested': 'Net Invested'}))
+
+        st.subheader("Returns vs Benchmark")
+        defaults = [symbol for symbol in DEFAULT_BENCHMARKS if symbol in history.symbol_rows]
+        options = ["None"] + defaults + [symbol for symbol in history.symbols if symbol not in defaults]
+        benchmark = st.selectbox("Benchmark", options, index=1 if defaults else 0,
+                                 help="Any symbol in the price history, rebased to 100 on the first trade date")
+        returns = pd.DataFrame({'Portfolio': curve['twr_index']})
+        if benchmark != "None":
+            returns[benchmark] = benchmark_index(history, benchmark, curve.index)
+        st.line_chart(returns)
+
+        st.subheader("Drawdown")
+        st.area_chart(curve[['drawdown']].rename(columns={'drawdown': 'Drawdown'}) * 100)
@@ -1,5 +1,6 @@
 import streamlit as st
 from models.portfolio import PortfolioManager
+from models.prices import PriceStore
 import pandas as pd
 import sys
 import math
@@ -7,6 +8,7 @@ import math
 class PortfolioView:
     def __init__(self, portfolio_manager: PortfolioManager):
         self.portfolio_manager = portfolio_manager
+        self.price_store = PriceStore(portfolio_manager.db_manager)
 
     def _safe_quantity(self, quantity: int) -> int:
         """Safely handle large quantities that might cause overflow in PyArrow conversion."""
@@ -29,8 +31,26 @@ class PortfolioView:
             # Value too large to convert to float, treat as not finite
             return False
 
+    def _render_price_import(self):
+        with st.expander("Import End-of-Day Prices"):
+            st.write("Upload one or more end-of-day price files (an exchange bhavcopy, or a CSV with scrip_name, "
+                     "date and close columns). Re-importing a day replaces its prices.")
+            exchange = st.selectbox("Exchange", ["NSE", "BSE"], key="price_import_exchange")
+            uploaded_files = st.file_uploader("Price Files (CSV)", type=["csv"], accept_multiple_files=True)
+            if uploaded_files and st.button("Import Prices"):
+                try:
+                    stored = self.price_store.import_files(uploaded_files, exchange)
+                except ValueError as e:
+                    st.error(str(e))
+                    return
+                if stored < 0:
+                    st.error("Error saving prices")
+                else:
+                    st.success(f"Stored {stored} closing price(s)")
+
     def render(self, demat_account_id: int):
         st.title("Current Portfolio")
+        self._render_price_import()
         portfolio_items = self.portfolio_manager.calculate_portfolio(demat_account_id)
 
         if portfolio_items:
@@ -45,8 +65,10 @@ class PortfolioView:
                 st.error("❌ Cannot calculate total portfolio value due to extremely large numbers in the data.")
                 total_portfolio_value = 0
             
-            st.metric("Total Portfolio Value", f"₹{total_portfolio_value:,.2f}")
-
+            # Latest close and the close before it for every holding, in one query
+            prices = self.price_store.latest_prices([item.instrument_id for item in portfolio_items])
+            prices = prices.set_index('instrument_id')
+            
             # Create a DataFrame for better display
             has_large_quantities = any(abs(item.quantity) > 2**53 for item in portfolio_items)
             
@@ -59,6 +81,24 @@ class PortfolioView:
                     "Total Value": f"₹{item.total_value:,.2f}"
                 } for item in portfolio_items
             ])
+            instrument_ids = pd.Series([item.instrument_id for item in portfolio_items])
+            quantities = pd.Series([float(item.quantity) for item in portfolio_items])
+            cost = pd.Series([item.total_value for item in portfolio_items])
+            portfolio_df["Last Price"] = instrument_ids.map(prices['close'])
+            portfolio_df["Price Date"] = instrument_ids.map(prices['price_date'])
+            portfolio_df["Market Value"] = quantities * portfolio_df["Last Price"]
+            portfolio_df["Unrealized P&L"] = portfolio_df["Market Value"] - cost
+            portfolio_df["Day Change"] = quantities * (portfolio_df["Last Price"] - instrument_ids.map(prices['previous_close']))
+            
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Total Portfolio Value", f"₹{total_portfolio_value:,.2f}")
+            priced = portfolio_df['Market Value'].notna()
+            if priced.any():
+                col2.metric("Market Value", f"₹{portfolio_df.loc[priced, 'Market Value'].sum():,.2f}",
+                            help="Holdings with an imported closing price")
+                col3.metric("Unrealized P&L", f"₹{portfolio_df.loc[priced, 'Unrealized P&L'].sum():,.2f}")
+                col4.metric("Day Change", f"₹{portfolio_df['Day Change'].sum():,.2f}",
+                            help="Change since the previous close")
             
             # Show warning if quantities were capped
             if has_large_quantities:
@@ -124,6 +164,27 @@ class PortfolioView:
                     "Total Value": st.column_config.TextColumn(
                         "Total Value",
                         help="Total value of holding (Quantity × Average Price)"
+                    ),
+                    "Last Price": st.column_config.NumberColumn(
+                        "Last Price",
+                        format="₹%.2f",
+                        help="Latest imported closing price"
+                    ),
+                    "Price Date": st.column_config.TextColumn("Price Date"),
+                    "Market Value": st.column_config.NumberColumn(
+                        "Market Value",
+                        format="₹%.2f",
+                        help="Quantity × Last Price"
+                    ),
+                    "Unrealized P&L": st.column_config.NumberColumn(
+                        "Unrealized P&L",
+                        format="₹%.2f",
+                        help="Market Value − Total Value"
+                    ),
+                    "Day Change": st.column_config.NumberColumn(
+                        "Day Change",
+                        format="₹%.2f",
+                        help="Quantity × (Last Price − previous close)"
                     )
                 }
             )
@@ -157,4 +218,42 @@ class PortfolioView:
                 )
                 
         else:
-            st.info("No stocks in portfolio")
\ No newline at end of file
+            st.info("No stocks in portfolio")
+
+        self._render_open_fno_positions(demat_account_id)
+
+    def _render_open_fno_positions(self, demat_account_id: int):
+        positions = self.portfolio_manager.get_open_fno_positions(demat_account_id)
+        if positions.empty:
+            return
+
+        st.subheader("Open F&O Positions")
+        positions_df = pd.DataFrame({
+            "Scrip": positions['scrip_name'],
+            "Category": positions['transaction_category'],
+            "Expiry": positions['expiry_date'],
+            "Instrument": positions['instrument_type'],
+            "Strike Price": positions['strike_price'],
+            "Position": positions['position'],
+            "Quantity": positions['quantity'],
+            "Average Price": positions['open_price'].round(2),
+            "Opened": positions['open_date']
+        })
+        st.dataframe(
+            positions_df,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Strike Price": st.column_config.NumberColumn("Strike Price", format="₹%.2f"),
+                "Quantity": st.column_config.NumberColumn(
+                    "Quantity",
+                    help="Open lots still unmatched FIFO (negative indicates short position)"
+                ),
+                "Average Price": st.column_config.NumberColumn(
+                    "Average Price",
+                    format="₹%.2f",
+                    help="Average open premium per unit (including charges)"
+                ),
+                "Opened": st.column_config.TextColumn("Opened", help="Date the oldest open lot was opened")
+            }
+        )
\ No newline at end of file
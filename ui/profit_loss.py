@@ -1,213 +1,240 @@
 import streamlit as st
 import pandas as pd
 from models.database import DatabaseManager
-import sqlite3
-from datetime import datetime
-from ui.charges import Charges
+from models.profit_loss import PnLStatements, CategoryPnL
+
+def render_audit_turnover(turnover: pd.DataFrame):
+    """Tax-audit turnover table per category and financial year, flagging years over the limit"""
+    st.subheader("Tax-Audit Turnover")
+    st.dataframe(
+        turnover[[
+            'transaction_category', 'financial_year', 'closing_trades', 'profit_loss', 'absolute_profit_loss',
+            'option_sell_premium', 'turnover', 'audit_limit'
+        ]].sort_values(['financial_year', 'transaction_category'], ascending=[False, True]),
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "transaction_category": st.column_config.TextColumn("Category"),
+            "financial_year": st.column_config.TextColumn("Financial Year"),
+            "closing_trades": st.column_config.NumberColumn("Closing Trades"),
+            "profit_loss": st.column_config.NumberColumn("Net Profit/Loss", format="₹%.2f"),
+            "absolute_profit_loss": st.column_config.NumberColumn(
+                "Absolute Profit/Loss", format="₹%.2f", help="Sum of the absolute realized profit or loss of each closing trade"
+            ),
+            "option_sell_premium": st.column_config.NumberColumn("Option Sell Premium", format="₹%.2f"),
+            "turnover": st.column_config.NumberColumn("Turnover", format="₹%.2f"),
+            "audit_limit": st.column_config.NumberColumn("Audit Limit", format="₹%.0f", help="Turnover limit u/s 44AB")
+        }
+    )
+    over_limit = turnover.groupby('financial_year')[['turnover', 'audit_limit']].agg({'turnover': 'sum', 'audit_limit': 'max'})
+    over_limit = over_limit[over_limit['turnover'] > over_limit['audit_limit']]
+    if not over_limit.empty:
+        st.warning(f"F&O turnover is above the tax-audit limit in {', '.join(over_limit.index)}")
 
 class ProfitLoss:
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
+        self.statements = PnLStatements(db_manager)
 
     def render(self, demat_account_id: int, transaction_category: str):
         st.title(f"{transaction_category} Profit & Loss Statement")
         
-        # Get all transactions
-        with sqlite3.connect(self.db_manager.db_name, detect_types=sqlite3.PARSE_DECLTYPES) as conn:
-            transactions_df = pd.read_sql_query(
-                """
-                SELECT * FROM transactions 
-                WHERE demat_account_id = ? 
-                AND transaction_category = ? 
-                ORDER BY date, scrip_name, expiry_date, instrument_type, strike_price
-                """,
-                conn,
-                params=(demat_account_id, transaction_category)
-            )
-        
-        if transactions_df.empty:
+        # Statements are built from the realized_pnl ledger and memoized per data version
+        self._render_category(self.statements.category(demat_account_id, transaction_category))
+
+    def render_summary(self, demat_account_id: int):
+        st.title("All Categories Profit & Loss")
+
+        # The three categories are built together, concurrently, from one read of the account's trades
+        statements = self.statements.account(demat_account_id)
+        summary = self.statements.summary(demat_account_id)
+        if summary.empty:
             st.info("No transactions found")
             return
 
-        if transaction_category == "EQUITY":
-            self._render_equity_pnl(transactions_df)
-        else:
-            self._render_fno_pnl(transactions_df)
+        columns = st.columns(len(statements) + 1)
+        for col, (category, statement) in zip(columns, statements.items()):
+            col.metric(f"{category} P&L", f"₹{statement.profit_loss:,.2f}")
+        columns[-1].metric("Total P&L", f"₹{sum(statement.profit_loss for statement in statements.values()):,.2f}")
 
-    def _render_equity_pnl(self, transactions_df):
-        # Filter SELL and BUYBACK transactions (both generate P&L)
-        sell_transactions = transactions_df[transactions_df['transaction_type'].isin(['SELL', 'BUYBACK'])]
-        
-        if sell_transactions.empty:
-            st.info("No sell or buyback transactions found")
+        st.dataframe(
+            summary,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "transaction_category": st.column_config.TextColumn("Category"),
+                "term_type": st.column_config.TextColumn("Term"),
+                "lots": st.column_config.NumberColumn("Matched Lots"),
+                "quantity": st.column_config.NumberColumn("Quantity"),
+                "profit_loss": st.column_config.NumberColumn("Profit/Loss", format="₹%.2f"),
+                "turnover": st.column_config.NumberColumn(
+                    "Absolute Profit/Loss", format="₹%.2f", help="Sum of the absolute profit or loss of each lot"
+                ),
+                "trades": st.column_config.NumberColumn("Trades"),
+                "open_lots": st.column_config.NumberColumn("Open F&O Lots")
+            }
+        )
+        st.download_button("Download Summary (CSV)", summary.to_csv(index=False),
+                           file_name="pnl_summary.csv", mime="text/csv")
+
+        # Drill down into each category's full statement
+        for tab, statement in zip(st.tabs(list(statements.keys())), statements.values()):
+            with tab:
+                self._render_category(statement)
+
+    def _render_category(self, statement: CategoryPnL):
+        if not statement.trades:
+            st.info("No transactions found")
             return
+        if statement.transaction_category == "EQUITY":
+            self._render_equity_pnl(statement)
+            tables = {'delivery': statement.delivery, 'intraday': statement.intraday}
+        else:
+            self._render_fno_pnl(statement)
+            tables = {'matched': statement.matched, 'open_lots': statement.open_lots}
 
-        # Create a list to store P&L data
-        pnl_data = []
+        # Exports reuse the statement's tables as they are
+        tables = {name: table for name, table in tables.items() if not table.empty}
+        for col, (name, table) in zip(st.columns(max(len(tables), 1)), tables.items()):
+            label = name.replace('_', ' ').title()
+            slug = statement.transaction_category.lower().replace('&', '').replace(' ', '_')
+            col.download_button(f"Download {label} (CSV)", table.to_csv(index=False),
+                                file_name=f"pnl_{slug}_{name}.csv", mime="text/csv",
+                                key=f"pnl_{slug}_{name}")
 
-        # For each sell/buyback transaction, find matching buy transactions
-        for _, sell_row in sell_transactions.iterrows():
-            scrip = sell_row['scrip_name']
-            sell_shares = sell_row['num_shares']
-            sell_date = pd.to_datetime(sell_row['date']).date()  # Convert to date
-            sell_price = sell_row['rate']
-            transaction_type = sell_row['transaction_type']  # Get actual transaction type
-            exchange = sell_row.get('exchange', 'NSE')  # Default to NSE if not specified
-            
-            # Use the stored amount directly (charges already included/excluded during transaction entry)
-            sell_amount = sell_row['amount']
-            effective_sell_price = sell_amount / sell_shares
-            
-            # Get all transactions that add shares to portfolio for this scrip before the sell date
-            # Include BUY, IPO, BONUS, RIGHT, and DEMERGER transactions
-            buy_transactions = transactions_df[
-                (transactions_df['scrip_name'] == scrip) &
-                (transactions_df['transaction_type'].isin(['BUY', 'IPO', 'BONUS', 'RIGHT', 'DEMERGER'])) &
-                (pd.to_datetime(transactions_df['date']).dt.date <= sell_date)  # Convert to date for comparison
-            ].sort_values('date')
+    def _render_equity_pnl(self, statement: CategoryPnL):
+        # Same-day buys and sells of a scrip are intraday (speculative); only the net is delivery
+        totals = statement.totals
+        if statement.delivery.empty:
+            st.info("No delivery sell or buyback transactions found" if not statement.intraday.empty
+                    else "No sell or buyback transactions found")
+        else:
+            self._render_delivery_pnl(statement.delivery, totals.loc[totals['term_type'] != 'INTRADAY', 'profit_loss'].sum())
 
-            remaining_sell_shares = sell_shares
-            
-            # Match acquisition transactions (BUY, IPO, BONUS, RIGHT, DEMERGER) with sell/buyback
-            for _, buy_row in buy_transactions.iterrows():
-                if remaining_sell_shares <= 0:
-                    break
-                    
-                buy_shares = buy_row['num_shares']
-                buy_date = pd.to_datetime(buy_row['date']).date()  # Convert to date
-                buy_transaction_type = buy_row['transaction_type']
-                
-                # Use the stored amount directly (charges already included/excluded during transaction entry)
-                buy_amount = buy_row['amount']
-                effective_buy_price = buy_amount / buy_shares
-                
-                # Calculate shares to match
-                shares_to_match = min(remaining_sell_shares, buy_shares)
-                
-                # Calculate profit/loss including charges
-                profit_loss = (effective_sell_price - effective_buy_price) * shares_to_match
-                
-                # Determine if short term or long term
-                holding_period = (sell_date - buy_date).days
-                term_type = "SHORT TERM" if holding_period <= 365 else "LONG TERM"
-                
-                pnl_data.append({
-                    'SCRIP': scrip,
-                    'SALE_SHARES': shares_to_match,
-                    'SALE_DATE': sell_date,
-                    'SALE_PRICE': effective_sell_price,
-                    'PURCHASE_SHARES': shares_to_match,
-                    'PURCHASE_DATE': buy_date,
-                    'PURCHASE_PRICE': effective_buy_price,
-                    'PURCHASE_TYPE': buy_transaction_type,  # Add this to show acquisition type
-                    'PROFIT_LOSS': profit_loss,
-                    'TERM_TYPE': term_type,
-                    'TRANSACTION_TYPE': transaction_type  # Add this to distinguish SELL from BUYBACK
-                })
-                
-                remaining_sell_shares -= shares_to_match
+        if not statement.intraday.empty:
+            self._render_intraday_pnl(statement.intraday, totals[totals['term_type'] == 'INTRADAY'])
 
-        self._display_pnl_table(pnl_data)
+    def _render_delivery_pnl(self, delivery, total_profit):
+        # Sells/buybacks matched FIFO against acquisitions (BUY, IPO, BONUS, RIGHT, DEMERGER);
+        # prices come from the stored amounts, which already include charges
+        pnl_data = pd.DataFrame({
+            'SCRIP': delivery['scrip_name'],
+            'SALE_SHARES': delivery['quantity'],
+            'SALE_DATE': delivery['sale_date'].dt.date,
+            'SALE_PRICE': delivery['sale_price'],
+            'PURCHASE_SHARES': delivery['quantity'],
+            'PURCHASE_DATE': delivery['purchase_date'].dt.date,
+            'PURCHASE_PRICE': delivery['purchase_price'],
+            'PURCHASE_TYPE': delivery['purchase_type'],  # Add this to show acquisition type
+            'PROFIT_LOSS': delivery['profit_loss'],
+            'TERM_TYPE': delivery['term_type'],
+            'TRANSACTION_TYPE': delivery['transaction_type']  # Add this to distinguish SELL from BUYBACK
+        })
 
-    def _render_fno_pnl(self, transactions_df):
-        # Group transactions by scrip, expiry, instrument type, and transaction category
-        grouped_transactions = transactions_df.groupby(
-            ['scrip_name', 'expiry_date', 'instrument_type', 'transaction_category']
+        self._display_pnl_table(pnl_data, total_profit)
+
+    def _render_intraday_pnl(self, intraday, totals):
+        st.subheader("Intraday Trades (Speculative)")
+        display_df = intraday.rename(columns={
+            'scrip_name': 'SCRIP',
+            'date': 'DATE',
+            'quantity': 'QTY',
+            'buy_price': 'BUY_PRICE',
+            'sell_price': 'SELL_PRICE',
+            'buy_value': 'BUY_VALUE',
+            'sell_value': 'SELL_VALUE',
+            'profit_loss': 'PROFIT_LOSS',
+            'turnover': 'TURNOVER'
+        })[['SCRIP', 'DATE', 'QTY', 'BUY_PRICE', 'SELL_PRICE', 'BUY_VALUE', 'SELL_VALUE', 'PROFIT_LOSS', 'TURNOVER']]
+        display_df['DATE'] = display_df['DATE'].dt.date
+        for col in ['BUY_PRICE', 'SELL_PRICE', 'BUY_VALUE', 'SELL_VALUE', 'PROFIT_LOSS', 'TURNOVER']:
+            display_df[col] = display_df[col].round(2)
+
+        def style_profit_loss(val):
+            if val > 0:
+                return 'background-color: #90EE90'  # Light green
+            elif val < 0:
+                return 'background-color: #FFB6C1'  # Light red
+            return ''
+
+        st.dataframe(
+            display_df.style.applymap(style_profit_loss, subset=['PROFIT_LOSS']),
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "QTY": st.column_config.NumberColumn("Qty", help="Shares bought and sold the same day"),
+                "BUY_PRICE": st.column_config.NumberColumn("Buy Price", format="₹%.2f", help="Average of the day's buys"),
+                "SELL_PRICE": st.column_config.NumberColumn("Sell Price", format="₹%.2f", help="Average of the day's sells"),
+                "BUY_VALUE": st.column_config.NumberColumn("Buy Value", format="₹%.2f"),
+                "SELL_VALUE": st.column_config.NumberColumn("Sell Value", format="₹%.2f"),
+                "PROFIT_LOSS": st.column_config.NumberColumn("Profit/Loss", format="₹%.2f"),
+                "TURNOVER": st.column_config.NumberColumn(
+                    "Turnover", format="₹%.2f", help="Absolute profit or loss, the turnover of speculative trades for tax audit"
+                )
+            }
         )
 
-        pnl_data = []
-        charges = Charges(self.db_manager)
+        col1, col2 = st.columns(2)
+        col1.metric("Intraday Profit/Loss", f"₹{totals['profit_loss'].sum():,.2f}")
+        col2.metric("Intraday Turnover", f"₹{totals['turnover'].sum():,.2f}")
 
-        for (scrip, expiry, instrument, category), group in grouped_transactions:
-            # Sort by date
-            group = group.sort_values('date')
-            
-            # Calculate total buy and sell quantities and amounts
-            buy_transactions = group[group['transaction_type'] == 'BUY']
-            sell_transactions = group[group['transaction_type'] == 'SELL']
-            
-            total_buy_qty = buy_transactions['num_shares'].sum()
-            total_sell_qty = sell_transactions['num_shares'].sum()
-            
-            if total_buy_qty > 0 and total_sell_qty > 0:
-                # Calculate average buy and sell prices with charges
-                buy_amounts = []
-                for _, buy_row in buy_transactions.iterrows():
-                    base_amount = buy_row['num_shares'] * buy_row['rate']
-                    exchange = buy_row.get('exchange', 'MCX' if category == 'F&O COMMODITY' else 'NSE')
-                    charge_category = category.replace(" ", "_")
-                    charge_instrument_type = "OPT" if instrument in ["CE", "PE"] else "FUT"
-                    _, total_charges = charges.calculate_charges(
-                        base_amount,
-                        'BUY',
-                        exchange,
-                        charge_category,
-                        charge_instrument_type
-                    )
-                    buy_amounts.append((buy_row['num_shares'], buy_row['rate'] + (total_charges / buy_row['num_shares'])))
-                
-                sell_amounts = []
-                for _, sell_row in sell_transactions.iterrows():
-                    base_amount = sell_row['num_shares'] * sell_row['rate']
-                    exchange = sell_row.get('exchange', 'MCX' if category == 'F&O COMMODITY' else 'NSE')
-                    charge_category = category.replace(" ", "_")
-                    charge_instrument_type = "OPT" if instrument in ["CE", "PE"] else "FUT"
-                    _, total_charges = charges.calculate_charges(
-                        base_amount,
-                        'SELL',
-                        exchange,
-                        charge_category,
-                        charge_instrument_type
-                    )
-                    sell_amounts.append((sell_row['num_shares'], sell_row['rate'] - (total_charges / sell_row['num_shares'])))
-                
-                # Calculate weighted averages
-                avg_buy_price = sum(qty * price for qty, price in buy_amounts) / total_buy_qty
-                avg_sell_price = sum(qty * price for qty, price in sell_amounts) / total_sell_qty
-                
-                # Calculate profit/loss for the matched quantity
-                matched_qty = min(total_buy_qty, total_sell_qty)
-                profit_loss = (avg_sell_price - avg_buy_price) * matched_qty
-                
-                pnl_data.append({
-                    'SCRIP': scrip,
-                    'EXPIRY': expiry,
-                    'INSTRUMENT': instrument,
-                    'STRIKE_PRICE': group['strike_price'].iloc[0] if instrument in ["CE", "PE"] else None,
-                    'CATEGORY': category,
-                    'BUY_DATE': buy_transactions['date'].min(),
-                    'BUY_QTY': total_buy_qty,
-                    'BUY_PREMIUM': avg_buy_price,
-                    'BUY_TOTAL': avg_buy_price * total_buy_qty,
-                    'SELL_DATE': sell_transactions['date'].min(),
-                    'SELL_QTY': total_sell_qty,
-                    'SELL_PREMIUM': avg_sell_price,
-                    'SELL_TOTAL': avg_sell_price * total_sell_qty,
-                    'PROFIT_LOSS': profit_loss,
-                    'UNMATCHED_QTY': abs(total_buy_qty - total_sell_qty)
-                })
+    def _render_fno_pnl(self, statement: CategoryPnL):
+        # Buys and sells are matched FIFO within each contract (instrument, expiry, type, strike)
+        lots, totals, open_lots = statement.matched, statement.totals, statement.open_lots
+
+        # Style the DataFrame
+        def style_profit_loss(val):
+            if val > 0:
+                return 'background-color: #90EE90'  # Light green
+            elif val < 0:
+                return 'background-color: #FFB6C1'  # Light red
+            return ''
+
+        contract_columns = {
+            'scrip_name': 'SCRIP',
+            'expiry_date': 'EXPIRY',
+            'instrument_type': 'INSTRUMENT',
+            'strike_price': 'STRIKE_PRICE',
+            'transaction_category': 'CATEGORY',
+            'position': 'POSITION',
+            'quantity': 'QTY',
+            'open_date': 'OPEN_DATE',
+            'open_price': 'OPEN_PREMIUM'
+        }
+        column_config = {
+            "STRIKE_PRICE": st.column_config.NumberColumn(
+                "Strike Price",
+                format="₹%.2f",
+                help="Strike price for options (CE/PE) only"
+            ),
+            "POSITION": st.column_config.TextColumn(
+                "Position",
+                help="LONG if opened by a buy, SHORT if opened by a sell (option writing)"
+            ),
+            "OPEN_PREMIUM": st.column_config.NumberColumn(
+                "Open Premium",
+                format="₹%.2f",
+                help="Premium per unit including charges on buys, net of charges on sells"
+            ),
+            "CLOSE_PREMIUM": st.column_config.NumberColumn(
+                "Close Premium",
+                format="₹%.2f"
+            ),
+            "PROFIT_LOSS": st.column_config.NumberColumn(
+                "Profit/Loss",
+                format="₹%.2f"
+            )
+        }
 
-        if pnl_data:
+        if not lots.empty:
             # Create DataFrame for display
-            display_df = pd.DataFrame(pnl_data)
+            display_df = lots.rename(columns={
+                **contract_columns, 'close_date': 'CLOSE_DATE', 'close_price': 'CLOSE_PREMIUM', 'profit_loss': 'PROFIT_LOSS'
+            })[list(contract_columns.values()) + ['CLOSE_DATE', 'CLOSE_PREMIUM', 'PROFIT_LOSS']]
             
-            # Format numbers - handle STRIKE_PRICE separately since it can be None
-            numeric_columns = ['BUY_PREMIUM', 'BUY_TOTAL', 'SELL_PREMIUM', 'SELL_TOTAL', 'PROFIT_LOSS']
-            for col in numeric_columns:
+            # Format numbers
+            for col in ['STRIKE_PRICE', 'OPEN_PREMIUM', 'CLOSE_PREMIUM', 'PROFIT_LOSS']:
                 display_df[col] = display_df[col].round(2)
-            
-            # Handle STRIKE_PRICE separately - only round if not None
-            display_df['STRIKE_PRICE'] = display_df['STRIKE_PRICE'].apply(
-                lambda x: round(x, 2) if pd.notnull(x) else None
-            )
-            
-            # Style the DataFrame
-            def style_profit_loss(val):
-                if val > 0:
-                    return 'background-color: #90EE90'  # Light green
-                elif val < 0:
-                    return 'background-color: #FFB6C1'  # Light red
-                return ''
 
             # Apply styling
             styled_df = display_df.style.applymap(
@@ -216,48 +243,26 @@ class ProfitLoss:
             )
             
             # Display the table
-            st.dataframe(
-                styled_df,
-                use_container_width=True,
-                column_config={
-                    "STRIKE_PRICE": st.column_config.NumberColumn(
-                        "Strike Price",
-                        format="₹%.2f",
-                        help="Strike price for options (CE/PE) only"
-                    ),
-                    "BUY_PREMIUM": st.column_config.NumberColumn(
-                        "Buy Premium",
-                        format="₹%.2f"
-                    ),
-                    "BUY_TOTAL": st.column_config.NumberColumn(
-                        "Buy Total",
-                        format="₹%.2f"
-                    ),
-                    "SELL_PREMIUM": st.column_config.NumberColumn(
-                        "Sell Premium",
-                        format="₹%.2f"
-                    ),
-                    "SELL_TOTAL": st.column_config.NumberColumn(
-                        "Sell Total",
-                        format="₹%.2f"
-                    ),
-                    "PROFIT_LOSS": st.column_config.NumberColumn(
-                        "Profit/Loss",
-                        format="₹%.2f"
-                    )
-                }
-            )
+            st.dataframe(styled_df, use_container_width=True, hide_index=True, column_config=column_config)
             
             # Show summary
-            total_profit = display_df['PROFIT_LOSS'].sum()
-            st.subheader(f"Total Profit/Loss: ₹{total_profit:,.2f}")
+            st.subheader(f"Total Profit/Loss: ₹{totals['profit_loss'].sum():,.2f}")
         else:
             st.info("No matching buy and sell transactions found")
 
-    def _display_pnl_table(self, pnl_data):
-        if pnl_data:
-            # Create DataFrame for display
-            display_df = pd.DataFrame(pnl_data)
+        if not open_lots.empty:
+            st.subheader("Open Positions")
+            open_df = open_lots.rename(columns=contract_columns)[list(contract_columns.values())]
+            for col in ['STRIKE_PRICE', 'OPEN_PREMIUM']:
+                open_df[col] = open_df[col].round(2)
+            st.dataframe(open_df, use_container_width=True, hide_index=True, column_config=column_config)
+
+        if not statement.turnover.empty:
+            render_audit_turnover(statement.turnover)
+
+    def _display_pnl_table(self, pnl_data: pd.DataFrame, total_profit: float):
+        if not pnl_data.empty:
+            display_df = pnl_data.copy()
             
             # Format numbers
             display_df['SALE_PRICE'] = display_df['SALE_PRICE'].round(2)
@@ -348,7 +353,6 @@ class ProfitLoss:
             )
             
             # Show summary
-            total_profit = display_df['PROFIT_LOSS'].sum()
             st.subheader(f"Total Profit/Loss: ₹{total_profit:,.2f}")
         else:
             st.info("No matching acquisition transactions (BUY, IPO, BONUS, RIGHT, DEMERGER) found for sell transactions")
\ No newline at end of file
@@ -0,0 +1,100 @@
+import streamlit as st
+from datetime import date
+from models.database import DatabaseManager
+from models.settlement import ExpirySettlement, read_settlement_prices, SETTLEMENT_PRICE_COLUMNS
+import pandas as pd
+
+class SettlementView:
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+        self.settlement = ExpirySettlement(db_manager)
+
+    def render(self, demat_account_id: int):
+        st.title("Expiry Settlement")
+        st.write("Close F&O positions that are still open after their contract expired. Futures settle at the "
+                 "final settlement price and options at their intrinsic value (zero when out of the money). "
+                 "Settlement trades are dated on the expiry and carry no charges.")
+
+        accounts = self.db_manager.get_demat_accounts()
+        account_names = {account['id']: account['name'] for account in accounts}
+
+        uploaded_file = st.file_uploader(
+            "Settlement Prices (CSV)",
+            type=["csv"],
+            help=f"Columns: {', '.join(SETTLEMENT_PRICE_COLUMNS)} - the final settlement price of each "
+                 "underlying for an expiry date, e.g. from the exchange bhavcopy"
+        )
+
+        with st.form("expiry_settlement"):
+            account_ids = st.multiselect(
+                "Demat Accounts",
+                list(account_names.keys()),
+                default=[demat_account_id],
+                format_func=lambda account_id: account_names[account_id]
+            )
+            as_of = st.date_input("Settle Contracts Expiring Before", value=date.today(), max_value=date.today())
+
+            col1, col2 = st.columns(2)
+            with col1:
+                preview_clicked = st.form_submit_button("Preview Settlement")
+            with col2:
+                settle_clicked = st.form_submit_button("Settle Expired Positions", type="primary")
+
+        if not (preview_clicked or settle_clicked):
+            return
+        if not account_ids:
+            st.error("Please select at least one demat account")
+            return
+
+        prices = pd.DataFrame(columns=SETTLEMENT_PRICE_COLUMNS)
+        if uploaded_file is not None:
+            try:
+                uploaded_file.seek(0)
+                prices = read_settlement_prices(uploaded_file)
+            except ValueError as e:
+                st.error(str(e))
+                return
+
+        plan = self.settlement.plan(account_ids, prices, as_of)
+        if plan.trades.empty and plan.unpriced.empty:
+            st.info("No open F&O positions on expired contracts")
+            return
+
+        if preview_clicked:
+            if not plan.trades.empty:
+                st.write(f"{len(plan.trades)} position(s) would be settled")
+                self._render_positions(plan.trades, account_names, with_prices=True)
+        elif not plan.trades.empty:
+            settled = self.settlement.settle(plan)
+            if settled < 0:
+                st.error("Error writing settlement trades")
+                return
+            st.success(f"Settled {settled} expired position(s)")
+
+        if not plan.unpriced.empty:
+            st.warning(f"{len(plan.unpriced)} position(s) have no settlement price in the file and were left open")
+            self._render_positions(plan.unpriced, account_names, with_prices=False)
+
+    def _render_positions(self, positions: pd.DataFrame, account_names: dict, with_prices: bool):
+        columns = ['account', 'scrip_name', 'expiry_day', 'instrument_type', 'strike_price', 'position', 'quantity', 'open_price']
+        if with_prices:
+            columns += ['settlement_price', 'transaction_type', 'rate', 'amount']
+        st.dataframe(
+            positions.assign(account=positions['demat_account_id'].map(account_names))[columns],
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "account": st.column_config.TextColumn("Account"),
+                "scrip_name": st.column_config.TextColumn("Scrip"),
+                "expiry_day": st.column_config.TextColumn("Expiry"),
+                "instrument_type": st.column_config.TextColumn("Instrument"),
+                "strike_price": st.column_config.NumberColumn("Strike Price", format="₹%.2f"),
+                "position": st.column_config.TextColumn("Position"),
+                "quantity": st.column_config.NumberColumn("Quantity", help="Negative indicates a short position"),
+                "open_price": st.column_config.NumberColumn("Average Open Price", format="₹%.2f"),
+                "settlement_price": st.column_config.NumberColumn("Underlying Settlement Price", format="₹%.2f"),
+                "transaction_type": st.column_config.TextColumn("Settlement Trade"),
+                "rate": st.column_config.NumberColumn("Settlement Rate", format="₹%.2f"),
+                "amount": st.column_config.NumberColumn("Amount", format="₹%.2f")
+            }
+        )
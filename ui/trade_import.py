@@ -0,0 +1,102 @@
+import streamlit as st
+import pandas as pd
+from models.database import DatabaseManager
+from models.importer import TradebookImporter, BROKER_PROFILES
+from models.turnover import FnoTurnover
+from ui.profit_loss import render_audit_turnover
+
+class TradeImport:
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+        self.importer = TradebookImporter(db_manager)
+        self.turnover = FnoTurnover(db_manager)
+
+    def render(self, demat_account_id: int):
+        st.title("Import Trades")
+        st.write("Upload a broker tradebook or contract-note export (CSV or XLSX). "
+                 "Financial year, serial numbers and charges are derived automatically.")
+
+        profile_name = st.selectbox(
+            "Broker Format",
+            list(BROKER_PROFILES.keys()),
+            help="Generic CSV expects columns named like the transaction fields: date, scrip_name, "
+                 "transaction_type, num_shares, rate, exchange, transaction_category, expiry_date, "
+                 "instrument_type, strike_price"
+        )
+        profile = BROKER_PROFILES[profile_name]
+
+        uploaded_file = st.file_uploader("Tradebook File", type=["csv", "xlsx"])
+        if uploaded_file is None:
+            return
+
+        col1, col2 = st.columns(2)
+        with col1:
+            preview_clicked = st.button("Preview (Dry Run)")
+        with col2:
+            import_clicked = st.button("Import Trades", type="primary")
+
+        if preview_clicked:
+            try:
+                uploaded_file.seek(0)
+                result = self.importer.preview(uploaded_file, uploaded_file.name, profile, demat_account_id)
+            except ValueError as e:
+                st.error(str(e))
+                return
+
+            st.subheader("Preview")
+            st.write(f"Rows read: {result.rows_read} | "
+                     f"New: {result.rows_read - result.rows_rejected - result.rows_duplicate} | "
+                     f"Already imported: {result.rows_duplicate} | Rejected: {result.rows_rejected}")
+            if not result.preview.empty:
+                st.dataframe(
+                    result.preview[[
+                        'source_row', 'financial_year', 'date', 'transaction_category', 'exchange', 'scrip_name',
+                        'transaction_type', 'num_shares', 'rate', 'charges', 'amount',
+                        'expiry_date', 'instrument_type', 'strike_price', 'already_imported'
+                    ]],
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config={
+                        "source_row": st.column_config.NumberColumn("Row"),
+                        "rate": st.column_config.NumberColumn("Rate", format="₹%.2f"),
+                        "charges": st.column_config.NumberColumn("Charges", format="₹%.2f"),
+                        "amount": st.column_config.NumberColumn("Total Amount", format="₹%.2f"),
+                        "strike_price": st.column_config.NumberColumn("Strike Price", format="₹%.2f"),
+                        "already_imported": st.column_config.CheckboxColumn(
+                            "Already Imported",
+                            help="This trade is already stored and will be skipped"
+                        )
+                    }
+                )
+            self._render_errors(result.errors)
+
+        if import_clicked:
+            progress_bar = st.progress(0.0, text="Importing...")
+
+            def update_progress(fraction, result):
+                progress_bar.progress(fraction, text=f"Imported {result.rows_imported} row(s)...")
+
+            try:
+                uploaded_file.seek(0)
+                result = self.importer.import_file(
+                    uploaded_file, uploaded_file.name, profile, demat_account_id, update_progress
+                )
+            except (ValueError, RuntimeError) as e:
+                st.error(str(e))
+                return
+
+            progress_bar.progress(1.0, text="Import complete")
+            st.success(f"Imported {result.rows_imported} transaction(s)")
+            if result.rows_duplicate:
+                st.info(f"Skipped {result.rows_duplicate} trade(s) that were already imported")
+            self._render_errors(result.errors)
+
+            # Re-evaluate the F&O turnover with the new trades
+            turnover = self.turnover.report([demat_account_id])
+            if not turnover.empty:
+                render_audit_turnover(turnover)
+
+    def _render_errors(self, errors):
+        if errors:
+            st.warning(f"{len(errors)} row(s) could not be imported")
+            st.dataframe(pd.DataFrame(errors), use_container_width=True, hide_index=True)
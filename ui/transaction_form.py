@@ -3,14 +3,30 @@ import pandas as pd
 from datetime import datetime
 from models.database import DatabaseManager, Transaction
 from models.portfolio import PortfolioManager
+import os
 import sqlite3
-from ui.charges import Charges
+from models.charges import ChargesEngine
+from models.symbols import ScripSuggester, SymbolIndex, INSTRUMENT_MASTER_FILE
+
+
+@st.cache_resource
+def load_scrip_suggester(db_name: str, master_file: str, master_mtime: float) -> ScripSuggester:
+    """Build the scrip suggester once per database / master file version, shared by all sessions"""
+    return ScripSuggester(DatabaseManager(db_name), SymbolIndex.from_master_file(master_file))
 
 class TransactionForm:
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
         self.portfolio_manager = PortfolioManager(db_manager)
-        self.charges = Charges(db_manager)
+        self.charges = ChargesEngine(db_manager)
+
+    def get_scrip_suggester(self) -> ScripSuggester:
+        master_mtime = os.path.getmtime(INSTRUMENT_MASTER_FILE) if os.path.exists(INSTRUMENT_MASTER_FILE) else 0.0
+        try:
+            return load_scrip_suggester(self.db_manager.db_name, INSTRUMENT_MASTER_FILE, master_mtime)
+        except ValueError as e:
+            st.warning(str(e))
+            return ScripSuggester(self.db_manager)
     
     def get_current_financial_year(self) -> str:
         """
@@ -64,6 +80,25 @@ class TransactionForm:
             st.session_state.charges_updated = False
             st.rerun()
         
+        # Scrip lookup lives outside the form so suggestions refresh as the search text changes
+        suggested_scrip = ""
+        scrip_search = st.text_input(
+            "Find Scrip",
+            help=f"Type the start of a symbol to search your traded scrips and {INSTRUMENT_MASTER_FILE}"
+        )
+        # The data version is read once per search (while the box is empty) and kept for the
+        # session, so each keystroke is served from the in-memory index
+        if not scrip_search or 'scrip_data_version' not in st.session_state:
+            st.session_state.scrip_data_version = self.db_manager.get_data_version()
+        if scrip_search:
+            suggestions = self.get_scrip_suggester().suggest(
+                scrip_search, demat_account_id, data_version=st.session_state.scrip_data_version
+            )
+            if suggestions:
+                suggested_scrip = st.selectbox("Suggestions", suggestions)
+            else:
+                st.caption("No matching symbols")
+        
         # Create a form for transaction details
         with st.form("transaction_form"):
             # Financial Year - Dynamic generation based on current date
@@ -109,7 +144,11 @@ class TransactionForm:
                 )
             
             # Scrip Name
-            scrip_name = st.text_input("Scrip Name")
+            scrip_name = st.text_input(
+                "Scrip Name",
+                value=suggested_scrip,
+                help="Matched case-insensitively against known instruments; new symbols are added automatically"
+            )
             
             # For F&O transactions, add expiry date and instrument type
             if transaction_category in ["F&O EQUITY", "F&O COMMODITY"]:
@@ -173,24 +212,13 @@ class TransactionForm:
             charges_details = {}
             total_charges = 0
             if transaction_type in ["BUY", "SELL"] or transaction_category == "EQUITY":
-                # Convert transaction category to match charges table format
-                category = transaction_category.replace(" ", "_")
-                
-                # Map CE/PE to OPT for charges calculation
-                if transaction_category in ["F&O EQUITY", "F&O COMMODITY"]:
-                    if instrument_type in ["CE", "PE"]:
-                        charge_instrument_type = "OPT"
-                    else:
-                        charge_instrument_type = "FUT"
-                else:
-                    charge_instrument_type = "EQUITY"
-                
                 charges_details, total_charges = self.charges.calculate_charges(
                     base_amount,
                     transaction_type.split(" ")[0] if " " in transaction_type else transaction_type,
                     exchange,  # Use the selected exchange
-                    category,
-                    charge_instrument_type  # Pass the instrument type for charges calculation
+                    transaction_category,
+                    instrument_type,
+                    transaction_date  # Rates in force on the trade date
                 )
                 
                 # Display charges breakdown
@@ -231,13 +259,10 @@ class TransactionForm:
                     st.error("Please enter a scrip name")
                     return
                 
-                # Get the next serial number for this financial year
-                serial_number = self.db_manager.get_next_serial_number(financial_year)
-                
-                # Create transaction record
+                # Create transaction record (the serial number is allocated when it is saved)
                 transaction = Transaction(
                     financial_year=financial_year,
-                    serial_number=serial_number,
+                    serial_number=None,
                     scrip_name=scrip_name,
                     date=transaction_date,  # Use the selected transaction date
                     num_shares=num_shares,
@@ -255,6 +280,8 @@ class TransactionForm:
                 
                 # Save transaction
                 self.db_manager.save_transaction(transaction)
+                # The new trade's scrip should be suggested on the next search
+                st.session_state.pop('scrip_data_version', None)
                 
                 # Set form submitted flag and success message
                 st.session_state.form_submitted = True
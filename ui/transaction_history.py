@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 from models.database import DatabaseManager
+from models.charges import ChargesEngine
 import sqlite3
 from datetime import datetime
 
@@ -202,7 +203,7 @@ class TransactionHistory:
                 ),
                 "scrip_name": st.column_config.TextColumn(
                     "Scrip Name",
-                    help="Name of the security"
+                    help="Name of the security (matched case-insensitively against known instruments)"
                 ),
                 "num_shares": st.column_config.NumberColumn(
                     "Shares",
@@ -249,7 +250,12 @@ class TransactionHistory:
                 "old_scrip_name": st.column_config.TextColumn(
                     "Old Scrip Name",
                     help="Old scrip name for mergers"
-                )
+                ),
+                # Internal keys, never shown or edited
+                "id": None,
+                "fingerprint": None,
+                "instrument_id": None,
+                "old_instrument_id": None
             }
             
             # Add expiry_date column config only if the column exists and has valid data
@@ -295,7 +301,7 @@ class TransactionHistory:
                         rate_or_shares_changed = False
                         
                         for col in edit_df.columns:
-                            if col not in ['serial_number', 'demat_account_id']:  # Skip read-only columns
+                            if col not in ['id', 'serial_number', 'demat_account_id', 'fingerprint']:  # Skip read-only columns
                                 orig_val = original_row[col]
                                 edit_val = edited_row[col]
                                 
@@ -322,29 +328,15 @@ class TransactionHistory:
                                 exchange = str(edited_row.get('exchange', 'NSE'))
                                 instrument_type = str(edited_row.get('instrument_type', 'EQUITY'))
                                 
-                                # Calculate charges using the existing Charges class
-                                from ui.charges import Charges
-                                charges_calculator = Charges(self.db_manager)
-                                
-                                # Convert category to match charges table format
-                                charge_category = transaction_category.replace(" ", "_")
-                                
-                                # Map CE/PE to OPT for charges calculation
-                                if transaction_category in ["F&O EQUITY", "F&O COMMODITY"]:
-                                    if instrument_type in ["CE", "PE"]:
-                                        charge_instrument_type = "OPT"
-                                    else:
-                                        charge_instrument_type = "FUT"
-                                else:
-                                    charge_instrument_type = "EQUITY"
-                                
                                 # Calculate charges
+                                charges_calculator = ChargesEngine(self.db_manager)
                                 charges_details, total_charges = charges_calculator.calculate_charges(
                                     base_amount,
                                     transaction_type,
                                     exchange,
-                                    charge_category,
-                                    charge_instrument_type
+                                    transaction_category,
+                                    instrument_type,
+                                    edited_row.get('date')
                                 )
                                 
                                 # Calculate total amount including charges
@@ -436,8 +428,8 @@ class TransactionHistory:
             st.subheader("Delete Transactions")
             st.write("Select transactions to delete:")
             
-            # Create a DataFrame for deletion with checkboxes
-            delete_df = display_df.copy()
+            # Create a DataFrame for deletion with checkboxes (carrying the hidden transaction id)
+            delete_df = filtered_df[display_columns + ['id']].copy()
             delete_df['Delete'] = False
             
             # Display the deletion table
@@ -450,64 +442,31 @@ class TransactionHistory:
                         "Delete",
                         help="Select transactions to delete",
                         default=False,
-                    )
+                    ),
+                    "id": None
                 }
             )
 
             # Delete button for selected transactions
             if st.button('Delete Selected Transactions'):
-                selected_indices = edited_df[edited_df['Delete']].index
-                if len(selected_indices) > 0:
+                selected_ids = edited_df.loc[edited_df['Delete'], 'id'].dropna().astype(int).tolist()
+                if selected_ids:
                     if 'confirm_delete' not in st.session_state:
                         st.session_state.confirm_delete = True
                         st.warning("Click 'Delete Selected Transactions' again to confirm deletion.")
                     else:
-                        success = True
-                        for idx in selected_indices:
-                            # Get the row from the edited DataFrame
-                            row = edited_df.loc[idx]
-                            
-                            # Get the values from the row
-                            financial_year = str(row['financial_year'])
-                            scrip_name = str(row['scrip_name'])
-                            date = row['date']
-                            
-                            # Get the serial number from the original filtered DataFrame
-                            matching_row = filtered_df[
-                                (filtered_df['financial_year'] == financial_year) &
-                                (filtered_df['scrip_name'] == scrip_name) &
-                                (filtered_df['date'] == date)
-                            ]
-                            
-                            if matching_row.empty:
-                                st.error(f"Could not find matching transaction for deletion at index {idx}")
-                                success = False
-                                continue
-                                
-                            serial_number = int(matching_row.iloc[0]['serial_number'])
-                            
-                            # Skip if any required field is empty
-                            if pd.isna(financial_year) or pd.isna(serial_number) or pd.isna(scrip_name) or pd.isna(date):
-                                st.error(f"Invalid transaction data at index {idx}. All fields must be non-empty.")
-                                success = False
-                                continue
-                            
-                            delete_result = self.db_manager.delete_transaction(
-                                financial_year,
-                                serial_number,
-                                scrip_name,
-                                date
-                            )
-                            if not delete_result:
-                                success = False
-                                st.error(f"Failed to delete transaction at index {idx}")
+                        # Delete all selected rows in one statement and one transaction
+                        deleted_count = self.db_manager.delete_transactions(selected_ids)
                         
-                        if success:
-                            st.success("Selected transactions deleted successfully!")
+                        if deleted_count == len(selected_ids):
+                            st.success(f"Deleted {deleted_count} transaction(s) successfully!")
                             st.session_state.confirm_delete = False
                             st.rerun()
+                        elif deleted_count >= 0:
+                            st.warning(f"Deleted {deleted_count} of {len(selected_ids)} selected transaction(s); the rest no longer exist")
+                            st.session_state.confirm_delete = False
                         else:
-                            st.error("Failed to delete some transactions")
+                            st.error("Failed to delete the selected transactions. No changes were made.")
                 else:
                     st.warning("Please select at least one transaction to delete")
         else: